@@ -1,7 +1,10 @@
 '''Runs the web server on localhost, port 80'''
-from ipmon import app
+# Los procesos de sondeo en paralelo (spawn) vuelven a ejecutar este archivo
+# como '__mp_main__': ahí no se carga la aplicación
+if __name__ != '__mp_main__':
+    from ipmon import app
 
-app.config["PREFERRED_URL_SCHEME"] = "http"  # o "https" si usas SSL
+    app.config["PREFERRED_URL_SCHEME"] = "http"  # o "https" si usas SSL
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=80, use_reloader=True)
\ No newline at end of file
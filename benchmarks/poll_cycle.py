@@ -0,0 +1,211 @@
+'''Benchmark de ciclos de sondeo completos a distintos tamaños de inventario
+
+Uso:
+    python benchmarks/poll_cycle.py --hosts 1000 10000 50000 --cycles 3 --output resultados.json
+    python benchmarks/poll_cycle.py --hosts 1000 --compare resultados.json
+
+Crea una base SQLite desechable, siembra hosts sintéticos con historial de
+sondeo y ejecuta ciclos completos de ``_poll_hosts_threaded`` contra el
+backend simulado (no envía paquetes). Para cada tamaño informa el tiempo por
+fase (sondeo, carga ORM, estabilidad, inserción de historial, inserción de
+alertas, actualización de hosts y commit), el pico de memoria y las filas
+escritas. Con ``--output`` guarda los resultados en JSON y con ``--compare``
+muestra la variación del tiempo de ciclo respecto a un JSON anterior.
+'''
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+
+
+def _setup_database(path):
+    '''Importa la aplicación apuntando a una base temporal y crea las tablas'''
+    os.environ['IPMON_DATABASE_PATH'] = path
+
+    from ipmon import app, db, log
+    from ipmon.database import AppConfig
+
+    log.setLevel(logging.WARNING)
+    with app.app_context():
+        db.create_all()
+        db.session.add(AppConfig(stable_cycles=3))
+        db.session.commit()
+    return app, db
+
+
+def _seed(db, num_hosts, history_cycles, concurrency):
+    '''Crea hosts sintéticos y ``history_cycles`` filas de historial por host'''
+    from ipmon.database import Hosts, PollHistory, HostAlerts, HostMetrics, HostStatusPeriod, HostRollup, Polling
+    from ipmon.probes import fake_addresses
+
+    HostMetrics.query.delete()
+    HostStatusPeriod.query.delete()
+    HostRollup.query.delete()
+    HostAlerts.query.delete()
+    PollHistory.query.delete()
+    Hosts.query.delete()
+    Polling.query.delete()
+    db.session.add(Polling(poll_interval=60, history_truncate_days=10, max_concurrency=concurrency,
+                           min_poll_interval=10, max_poll_interval=180))
+
+    db.session.bulk_insert_mappings(Hosts, [
+        {'ip_address': address, 'hostname': 'host-{}'.format(i), 'status': 'Up',
+         'last_alert_status': 'Up', 'alerts_enabled': True}
+        for i, address in enumerate(fake_addresses(num_hosts))
+    ])
+    db.session.commit()
+
+    host_ids = [row.id for row in db.session.query(Hosts.id).all()]
+    start = datetime.now() - timedelta(minutes=history_cycles)
+    for cycle in range(history_cycles):
+        poll_time = (start + timedelta(minutes=cycle)).replace(microsecond=0)
+        db.session.bulk_insert_mappings(PollHistory, [
+            {'host_id': host_id, 'poll_time': poll_time, 'poll_status': 'Up', 'date_created': poll_time}
+            for host_id in host_ids
+        ])
+        db.session.commit()
+
+
+def _peak_rss_mb():
+    '''Pico de memoria residente del proceso en MB'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == 'Darwin' else peak / 1024
+
+
+def _run(num_hosts, cycles, history_cycles, concurrency, loss_rate, seed, trace_memory):
+    from ipmon import app, db
+    from ipmon import polling
+    from ipmon.latency import latency_buffer
+    from ipmon.rollups import rollup_buffer
+    from ipmon.probes import SimulatedBackend, set_backend
+    from ipmon.pollstats import poll_monitor
+    from ipmon.registry import host_registry
+    from ipmon.dependencies import dependency_graph
+    from ipmon.history import status_periods
+
+    with app.app_context():
+        _seed(db, num_hosts, history_cycles, concurrency)
+    # El estado residente es el del tamaño anterior: se recarga del inventario nuevo
+    host_registry.invalidate()
+    dependency_graph.invalidate()
+    status_periods.invalidate()
+    set_backend(SimulatedBackend(seed=seed, loss_rate=loss_rate,
+                                 outages=[('10.0.1.0/24', 0, 3600)]))
+    polling.stability_tracker.invalidate()
+
+    runs = []
+    for dummy in range(cycles):
+        # Todos los hosts vencidos en cada ciclo
+        polling.host_scheduler.reset()
+        latency_buffer.drain()
+        rollup_buffer.drain()
+        if trace_memory:
+            tracemalloc.start()
+
+        polling._poll_hosts_threaded()
+
+        stats = poll_monitor.last.as_dict()
+        if trace_memory:
+            stats['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+            tracemalloc.stop()
+        runs.append(stats)
+
+    phases = {name: round(sum(r['phases'][name] for r in runs) / len(runs), 6) for name in runs[0]['phases']}
+    return {
+        'hosts': num_hosts,
+        'cycles': cycles,
+        'cycle_seconds': round(sum(r['duration'] for r in runs) / len(runs), 6),
+        'phases': phases,
+        'rows_written': runs[-1]['rows'],
+        'peak_rss_mb': round(_peak_rss_mb(), 2),
+        'runs': runs
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.realpath(__file__)),
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def _print_results(results, baseline=None):
+    from ipmon.pollstats import PHASES
+
+    previous = {r['hosts']: r for r in (baseline or {}).get('results', [])}
+    header = '{:>8} {:>10} ' + ' '.join('{:>14}' for dummy in PHASES) + ' {:>9} {:>9}'
+    print(header.format('hosts', 'ciclo (s)', *PHASES, 'filas', 'rss (MB)'))
+    for result in results:
+        print(header.format(
+            result['hosts'],
+            '{:.3f}'.format(result['cycle_seconds']),
+            *('{:.3f}'.format(result['phases'][name]) for name in PHASES),
+            sum(result['rows_written'].values()),
+            '{:.1f}'.format(result['peak_rss_mb'])
+        ))
+        if result['hosts'] in previous:
+            before = previous[result['hosts']]['cycle_seconds']
+            print('{:>8} {:>10} ({:+.1f}% respecto a {})'.format(
+                '', '{:.3f}'.format(before),
+                (result['cycle_seconds'] - before) / before * 100 if before else 0,
+                baseline['meta'].get('revision')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hosts', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--history-cycles', type=int, default=5, help='filas de historial previas por host')
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--loss-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--trace-memory', action='store_true', help='mide el pico con tracemalloc (más lento)')
+    parser.add_argument('--output', help='guarda los resultados en este archivo JSON')
+    parser.add_argument('--compare', help='JSON de una ejecución anterior para comparar')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _setup_database(os.path.join(tmp, 'bench.db'))
+        results = [
+            _run(num_hosts, args.cycles, args.history_cycles, args.concurrency,
+                 args.loss_rate, args.seed, args.trace_memory)
+            for num_hosts in args.hosts
+        ]
+
+    report = {
+        'meta': {
+            'revision': _git_revision(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args)
+        },
+        'results': results
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+'''Benchmark de escritura de un ciclo de sondeo (por host vs. por lote)
+
+Uso:
+    python benchmarks/poll_write.py --hosts 1000 5000 --cycles 3
+
+Crea una base SQLite desechable, siembra hosts sintéticos y mide el tiempo
+de guardar los resultados de un ciclo completo con el camino anterior
+(commit por host) y con el camino por lotes de ``_persist_poll_batch``.
+'''
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+from collections import namedtuple
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+
+FakeResult = namedtuple('FakeResult', [
+    'address', 'is_alive', 'avg_rtt', 'min_rtt', 'max_rtt', 'jitter', 'packet_loss'
+])
+
+
+def _setup_database(path):
+    '''Importa la aplicación apuntando a una base temporal y crea las tablas'''
+    os.environ['IPMON_DATABASE_PATH'] = path
+
+    from ipmon import app, db, log
+    from ipmon.database import AppConfig
+
+    log.setLevel(logging.WARNING)
+    with app.app_context():
+        db.create_all()
+        db.session.add(AppConfig(stable_cycles=3))
+        db.session.commit()
+    return app, db
+
+
+def _seed_hosts(db, Hosts, num_hosts):
+    '''Crea hosts sintéticos y devuelve [(id, ip_address)]'''
+    db.session.bulk_insert_mappings(Hosts, [
+        {
+            'ip_address': '10.{}.{}.{}'.format(i // 65536, (i // 256) % 256, i % 256),
+            'hostname': 'host-{}'.format(i),
+            'status': 'Up',
+            'alerts_enabled': True
+        }
+        for i in range(num_hosts)
+    ])
+    db.session.commit()
+    return db.session.query(Hosts.id, Hosts.ip_address).order_by(Hosts.id).all()
+
+
+def _persist_per_host(db, hosts, results, poll_time, required_cycles):
+    '''Reproduce el camino anterior: consulta y commit por cada host'''
+    from ipmon.database import Hosts, PollHistory, HostAlerts
+
+    for result, (host_id, dummy) in zip(results, hosts):
+        status = 'Up' if result.is_alive else 'Down'
+        host = Hosts.query.filter_by(id=host_id).first()
+        host.previous_status = host.status
+        host.status = status
+        host.last_poll = poll_time
+        db.session.add(PollHistory(host_id=host.id, poll_time=poll_time, poll_status=status))
+        db.session.commit()
+
+        history = PollHistory.query.filter_by(host_id=host.id) \
+            .order_by(PollHistory.date_created.desc()) \
+            .limit(required_cycles).all()
+        stable_count = sum(1 for h in history if h.poll_status == status) if len(history) >= required_cycles else 0
+
+        if stable_count >= required_cycles:
+            if host.alerts_enabled and host.last_alert_status != status:
+                db.session.add(HostAlerts(host_id=host.id, hostname=host.hostname,
+                                          ip_address=host.ip_address, host_status=status,
+                                          poll_time=poll_time))
+                host.last_alert_status = status
+                db.session.commit()
+
+
+def _run(mode, num_hosts, cycles, batch_size, seed):
+    from ipmon import app, db
+    from ipmon.database import Hosts, PollHistory, HostAlerts, HostStatusPeriod
+    from ipmon.polling import _persist_poll_batch, stability_tracker
+    from ipmon.registry import host_registry
+    from ipmon.dependencies import dependency_graph
+    from ipmon.history import status_periods
+
+    rng = random.Random(seed)
+    timings = []
+    with app.app_context():
+        HostAlerts.query.delete()
+        PollHistory.query.delete()
+        HostStatusPeriod.query.delete()
+        Hosts.query.delete()
+        db.session.commit()
+        hosts = _seed_hosts(db, Hosts, num_hosts)
+        # El estado residente es el de la corrida anterior: se recarga del inventario nuevo
+        host_registry.invalidate()
+        dependency_graph.invalidate()
+        status_periods.invalidate()
+        stability_tracker.invalidate()
+
+        for dummy in range(cycles):
+            poll_time = datetime.now().replace(microsecond=0)
+            results = []
+            for dummy, ip in hosts:
+                rtt = rng.uniform(0.5, 20.0)
+                results.append(FakeResult(ip, True, rtt, rtt, rtt, 0.0, 0.0) if rng.random() > 0.05
+                               else FakeResult(ip, False, 0.0, 0.0, 0.0, 0.0, 1.0))
+
+            s = time.perf_counter()
+            for i in range(0, len(hosts), batch_size):
+                batch, batch_results = hosts[i:i + batch_size], results[i:i + batch_size]
+                if mode == 'per_host':
+                    _persist_per_host(db, batch, batch_results, poll_time, 3)
+                else:
+                    _persist_poll_batch([h[0] for h in batch], batch_results, poll_time, 3)
+            timings.append(time.perf_counter() - s)
+
+    return sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hosts', type=int, nargs='+', default=[1000, 5000])
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _setup_database(os.path.join(tmp, 'bench.db'))
+
+        print('{:>8} {:>10} {:>12} {:>14}'.format('hosts', 'modo', 'ciclo (s)', 's / 1k hosts'))
+        for num_hosts in args.hosts:
+            for mode in ('per_host', 'batched'):
+                elapsed = _run(mode, num_hosts, args.cycles, args.batch_size, args.seed)
+                print('{:>8} {:>10} {:>12.3f} {:>14.3f}'.format(
+                    num_hosts, mode, elapsed, elapsed / num_hosts * 1000))
+
+
+if __name__ == '__main__':
+    main()
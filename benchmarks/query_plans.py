@@ -0,0 +1,153 @@
+'''Planes de consulta y tiempos de las consultas calientes, sin y con índices secundarios
+
+Uso:
+    python benchmarks/query_plans.py --hosts 5000 --history-cycles 50
+    python benchmarks/query_plans.py --hosts 5000 --output planes.json
+
+Crea una base SQLite desechable con hosts, historial de sondeo, alertas e
+imágenes sintéticas y ejecuta las consultas de la API y del sondeo. Primero
+sin los índices agregados por la migración d81f3a6b2c59 y luego con ellos,
+muestra para cada consulta el plan de SQLite (SCAN = recorrido completo,
+SEARCH = índice) y la mediana de tiempo.
+'''
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+
+# Índices de la migración d81f3a6b2c59: (nombre, tabla, columnas)
+INDEXES = [
+    ('ix_poll_history_host_date', 'poll_history', 'host_id, date_created, poll_status'),
+    ('ix_host_alerts_alert_cleared', 'host_alerts', 'alert_cleared'),
+    ('ix_hosts_status', 'hosts', 'status'),
+    ('ix_images_host_id', 'images', 'host_id'),
+]
+
+
+def _setup_database(path):
+    '''Importa la aplicación apuntando a una base temporal y crea las tablas'''
+    os.environ['IPMON_DATABASE_PATH'] = path
+
+    from ipmon import app, db, log
+    from ipmon.database import AppConfig, Polling
+
+    log.setLevel(logging.WARNING)
+    with app.app_context():
+        db.create_all()
+        db.session.add(AppConfig(stable_cycles=3))
+        db.session.add(Polling(poll_interval=60, history_truncate_days=10))
+        db.session.commit()
+    return app, db
+
+
+def _seed(db, num_hosts, history_cycles):
+    '''Hosts (10 % Down), ``history_cycles`` sondeos por host, alertas casi todas atendidas e imágenes'''
+    from ipmon.database import Hosts, PollHistory, HostAlerts, Images
+    from ipmon.probes import fake_addresses
+
+    db.session.bulk_insert_mappings(Hosts, [
+        {'ip_address': address, 'hostname': 'host-{}'.format(i), 'status': 'Down' if i % 10 == 0 else 'Up',
+         'last_alert_status': 'Up', 'alerts_enabled': True, 'tipo': 'camara'}
+        for i, address in enumerate(fake_addresses(num_hosts))
+    ])
+    db.session.commit()
+
+    host_ids = [row.id for row in db.session.query(Hosts.id).all()]
+    start = datetime.now() - timedelta(minutes=history_cycles)
+    for cycle in range(history_cycles):
+        poll_time = (start + timedelta(minutes=cycle)).replace(microsecond=0)
+        db.session.bulk_insert_mappings(PollHistory, [
+            {'host_id': host_id, 'poll_time': poll_time, 'poll_status': 'Up', 'date_created': poll_time}
+            for host_id in host_ids
+        ])
+    db.session.bulk_insert_mappings(HostAlerts, [
+        {'host_id': host_id, 'hostname': 'host', 'ip_address': '10.0.0.1', 'host_status': 'Down',
+         'poll_time': start, 'alert_cleared': i % 100 != 0}
+        for i, host_id in enumerate(host_ids * 4)
+    ])
+    db.session.bulk_insert_mappings(Images, [
+        {'host_id': host_id, 'file_path': 'static/imagenes/{}.jpg'.format(host_id)} for host_id in host_ids
+    ])
+    db.session.commit()
+    return host_ids
+
+
+def _queries(host_ids):
+    '''Consultas de la API y del sondeo: (nombre, consulta ORM)'''
+    from sqlalchemy import func
+    from ipmon import db
+    from ipmon.database import Hosts, PollHistory, HostAlerts, Images
+
+    host_id = host_ids[len(host_ids) // 2]
+    ranked = db.session.query(
+        PollHistory.host_id, PollHistory.poll_status,
+        func.row_number().over(partition_by=PollHistory.host_id, order_by=PollHistory.date_created.desc()).label('rn')
+    ).subquery()
+    return [
+        ('/pollHistory/<id>', PollHistory.query.filter_by(host_id=host_id).order_by(PollHistory.date_created)),
+        ('estabilidad (reconstrucción)', db.session.query(ranked.c.host_id, ranked.c.poll_status)
+            .filter(ranked.c.rn <= 3).order_by(ranked.c.host_id, ranked.c.rn)),
+        ('alertas pendientes', HostAlerts.query.filter_by(alert_cleared=False)),
+        ('/hostCounts (Down)', db.session.query(func.count(Hosts.id)).filter(Hosts.status == 'Down')),
+        ('imagen de un host', Images.query.filter_by(host_id=host_id).limit(1)),
+        ('borrado de un host', db.session.query(PollHistory.id).filter_by(host_id=host_id)),
+    ]
+
+
+def _measure(db, queries, repeat):
+    results = {}
+    for name, query in queries:
+        sql = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+        plan = [row[3] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql))]
+        timings = []
+        for dummy in range(repeat):
+            s = time.perf_counter()
+            db.session.execute(db.text(sql)).fetchall()
+            timings.append(time.perf_counter() - s)
+        results[name] = {'plan': plan, 'ms': round(statistics.median(timings) * 1000, 3)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hosts', type=int, default=5000)
+    parser.add_argument('--history-cycles', type=int, default=50, help='filas de historial por host')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='guarda los resultados en este archivo JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app, db = _setup_database(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            host_ids = _seed(db, args.hosts, args.history_cycles)
+            queries = _queries(host_ids)
+
+            for name, dummy, dummy in INDEXES:
+                db.session.execute(db.text('DROP INDEX IF EXISTS {}'.format(name)))
+            db.session.execute(db.text('ANALYZE'))
+            before = _measure(db, queries, args.repeat)
+
+            for name, table, columns in INDEXES:
+                db.session.execute(db.text('CREATE INDEX {} ON {} ({})'.format(name, table, columns)))
+            db.session.execute(db.text('ANALYZE'))
+            after = _measure(db, queries, args.repeat)
+
+    print('{:<30} {:>12} {:>12}  plan con índices'.format('consulta', 'sin (ms)', 'con (ms)'))
+    for name, dummy in queries:
+        print('{:<30} {:>12} {:>12}  {}'.format(name, before[name]['ms'], after[name]['ms'], ' / '.join(after[name]['plan'])))
+        print('{:<30} {:>12} {:>12}  antes: {}'.format('', '', '', ' / '.join(before[name]['plan'])))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'before': before, 'after': after}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
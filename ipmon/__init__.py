@@ -1,20 +1,12 @@
 '''Archivo de inicio del paquete'''
 import os
 import logging
-import flask_login
 import tempfile
 import time
-import uuid
-import threading
-
-from password_strength import PasswordPolicy
-from flask_sqlalchemy import SQLAlchemy
-from flask import Flask, render_template
-from flask_migrate import Migrate
-from apscheduler.schedulers.background import BackgroundScheduler
+import multiprocessing
 
 config = {
-    'Database_Path': os.path.join(
+    'Database_Path': os.environ.get('IPMON_DATABASE_PATH') or os.path.join(
         os.path.dirname(os.path.realpath(__file__)),
         'database',
         'ipmon.db'
@@ -31,29 +23,47 @@ config = {
         'Uppercase': 1,
         'Nonletters': 2
     },
-    'Max_Threads': 100
+    # Procesos de sondeo máximos (se limita además al número de CPUs)
+    'Max_Threads': 100,
+    # Inventarios a partir de este tamaño se sondean en varios procesos
+    'Shard_Min_Hosts': 10000,
+    # Backend de sondeo: 'icmplib' o 'simulated' (pruebas de carga, ver probes.py)
+    'Probe_Backend': os.environ.get('IPMON_PROBE_BACKEND', 'icmplib'),
+    'Probe_Simulation': {},
+    # Fracción del plazo de cada ciclo en la que se reparten sus sondeos (0 = sin repartir)
+    'Probe_Spread': 0.5,
+    # PRAGMAs de cada conexión SQLite: con WAL las lecturas (panel, API) no esperan a
+    # las escrituras del sondeo y busy_timeout (ms) hace esperar el lock en vez de fallar
+    'SQLite_Pragmas': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 10000
+    },
+    # Directorio donde archivar (CSV comprimido) el historial vencido antes de borrarlo; None = no archivar
+    'History_Archive_Path': os.environ.get('IPMON_HISTORY_ARCHIVE_PATH'),
+    # Resolución inversa de nombres: hilos, espera máxima del refresco masivo (s), vigencia
+    # en caché de nombres encontrados y no encontrados (s) y cada cuántas horas se refrescan
+    'Reverse_DNS': {
+        'Workers': 32,
+        'Refresh_Timeout': 30,
+        'Positive_TTL': 86400,
+        'Negative_TTL': 3600,
+        'Refresh_Hours': 24
+    },
+    # Canal de eventos en vivo (/events): clientes simultáneos, eventos en cola por
+    # cliente antes de pedirle que se resincronice y segundos entre latidos
+    'Events': {
+        'Max_Clients': 500,
+        'Max_Queued': 256,
+        'Heartbeat': 15
+    },
+    # Ping forzado: segundos durante los que se comparte un resultado y hosts por petición
+    'Force_Ping': {
+        'Window': 5,
+        'Max_Hosts': 1000
+    }
 }
 
-# Aplicación web
-app = Flask(__name__)
-app.secret_key = str(uuid.UUID(int=uuid.getnode()))
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///{}'.format(config['Database_Path'])
-
-# BASE DATOS
-db = SQLAlchemy()
-db.init_app(app)
-
-# Migración de base de datos
-migrate = Migrate(app, db)
-
-# Scheduler
-scheduler = BackgroundScheduler()
-
-# Administrador de autenticación
-login_manager = flask_login.LoginManager()
-login_manager.init_app(app)
-
 # Crear logger
 log = logging.getLogger('IPMON')
 
@@ -74,60 +84,8 @@ if not log.handlers:  #  evita duplicar handlers si ya está configurado
     file_handler.setFormatter(logging.Formatter(logfile_format, '%Y-%m-%d %H:%M:%S'))
     log.addHandler(file_handler)
 
-# Registrar Blueprints ru
-from ipmon.main import main as main_blueprint
-from ipmon.auth import auth as auth_blueprint
-from ipmon.smtp import smtp as smtp_blueprint
-from ipmon.api import api as api_blueprint
-from ipmon.hosts import hosts as hosts_blueprint
-from ipmon.setup import bp as setup_blueprint
-from ipmon.telegramconf import bp as telegramconf_blueprint
-from ipmon.imagenes import imagenes_blueprint
-
-
-app.register_blueprint(main_blueprint)
-app.register_blueprint(auth_blueprint)
-app.register_blueprint(smtp_blueprint)
-app.register_blueprint(api_blueprint)
-app.register_blueprint(hosts_blueprint)
-app.register_blueprint(setup_blueprint)
-app.register_blueprint(telegramconf_blueprint)
-app.register_blueprint(imagenes_blueprint)
-
-from ipmon.main import webapp_init
-with app.app_context():
-    webapp_init()
-
-from ipmon import imagenes
-def esperar_bd_y_iniciar_scheduler():
-    """Espera a que la BD esté creada antes de iniciar el scheduler"""
-    db_path = config['Database_Path']
-
-    # Esperar hasta que exista el archivo físico de la base
-    while not os.path.exists(db_path):
-        log.warning(f"Esperando que se cree la base de datos: {db_path}")
-        time.sleep(2)
-
-    # Opcional: esperar hasta que las tablas estén listas
-    try:
-        from ipmon.database import Hosts  # o cualquier tabla conocida
-        with app.app_context():
-            # Ejecuta una consulta mínima para probar la conexión
-            Hosts.query.first()
-        log.info("Base de datos lista. Iniciando scheduler...")
-    except Exception as e:
-        log.error(f"La base existe pero no está inicializada: {e}")
-        return
-
-    # Ahora sí iniciar el scheduler
-    try:
-        from ipmon.imagenes import init_scheduler
-        init_scheduler()
-        scheduler.start()
-        imagenes.init_scheduler()
-        log.info("Scheduler inicializado correctamente después de crear la BD.")
-    except Exception as e:
-        log.error(f"Error al iniciar scheduler: {e}")
-
-# Ejecutar en un hilo para no bloquear el arranque de Flask
-threading.Thread(target=esperar_bd_y_iniciar_scheduler, daemon=True).start()
\ No newline at end of file
+# Los procesos de sondeo en paralelo (engine.poll_inventory_sharded) arrancan con
+# 'spawn' e importan el paquete solo por el motor: sin aplicación web ni schedulers
+if multiprocessing.current_process().name == 'MainProcess':
+    from ipmon.webapp import app, db, migrate, scheduler, login_manager, start_webapp
+    start_webapp()
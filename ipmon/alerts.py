@@ -5,11 +5,13 @@ import json
 import requests
 import time
 
-from ipmon import db, scheduler, app, log
+from ipmon import scheduler, app, log
 from ipmon.database import Hosts, HostAlerts, AppConfig, Images
 from ipmon.api import get_alerts_enabled, get_smtp_configured, get_smtp_config
 from ipmon.helpers import strip_html, get_alert_status_message
 from ipmon.smtp import send_smtp_message
+from ipmon.metrics import ALERT_DELIVERY_SECONDS, ALERT_DELIVERY_FAILURES, DB_COMMIT_SECONDS
+from ipmon.writer import db_writer
 
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
    
@@ -94,15 +96,21 @@ def _host_status_alerts_threaded():
             # --- Envío por Telegram ---
             for alert in alerts:
                 try:
-                    _send_telegram_alert(alert)
+                    with ALERT_DELIVERY_SECONDS.time(channel='telegram'):
+                        _send_telegram_alert(alert)
                 except Exception as exc:
                     log.error(f' Error enviando alerta a Telegram: {exc}')
                     time.sleep(1.2)  # Pausa de 1.2 segundos entre mensajes
         # Marcar alertas como enviadas
-        for alert in alerts:
-            alert.alert_cleared = True
+        with DB_COMMIT_SECONDS.time(operation='alerts'):
+            db_writer.run(_clear_alerts, [alert.id for alert in alerts])
 
-        db.session.commit()
+
+def _clear_alerts(alert_ids):
+    '''Marca las alertas como enviadas (en el hilo escritor)'''
+    HostAlerts.query.filter(HostAlerts.id.in_(alert_ids)).update(
+        {'alert_cleared': True}, synchronize_session=False
+    )
 
 # ==============================
 # 🔹 Configuración Telegram
@@ -168,9 +176,11 @@ def _send_telegram_alert(alert):
                     time.sleep(5)
                     return _send_telegram_alert(alert)
             else:
+                ALERT_DELIVERY_FAILURES.inc(channel='telegram')
                 log.error(f" Error de Telegram {response.status_code}: {response.text}")
         else:
             log.info(f" Alerta enviada a Telegram para {host.hostname or host.ip_address}")
 
     except Exception as exc:
+        ALERT_DELIVERY_FAILURES.inc(channel='telegram')
         log.error(f" Error enviando alerta con foto a Telegram: {exc}")
@@ -2,11 +2,26 @@
 import os
 import sys
 import json
+from datetime import datetime, timedelta
 
-from flask import Blueprint
+from flask import Blueprint, Response, request, abort
 from ipmon import db
-from ipmon.database import Hosts, Polling, PollHistory, WebThemes, Users, SmtpServer, HostAlerts, AppConfig
+from ipmon.database import Hosts, Polling, PollHistory, WebThemes, Users, SmtpServer, HostAlerts, AppConfig, HostMetrics, HostStatusPeriod, HostRollup, TIME_FORMAT
 from ipmon.schemas import Schemas
+from ipmon.latency import read_latency, latency_buffer
+from ipmon.history import get_history_mode, read_periods, status_at, status_periods
+from ipmon.rollups import availability_series, rollup_buffer
+from ipmon.stability import stability_tracker
+from ipmon.dependencies import dependency_graph
+from ipmon.scheduling import host_scheduler
+from ipmon.reports import GROUP_FIELDS, sla_report
+from ipmon import retention
+from ipmon.pollstats import poll_monitor
+from ipmon.metrics import HOSTS, ALERT_QUEUE_DEPTH, generate_latest
+from ipmon.changes import host_changes
+from ipmon.events import event_broker
+from ipmon.datatables import parse_request, host_page
+from ipmon.registry import host_registry, COUNT_FIELDS
 
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
 api = Blueprint('api', __name__)
@@ -16,8 +31,53 @@ api = Blueprint('api', __name__)
 #####################
 @api.route('/hosts', methods=['GET'])
 def get_all_hosts():
-    '''Obtener todos los hosts'''
-    return json.dumps(Schemas.hosts(many=True).dump(Hosts.query.all()))
+    '''Obtener todos los hosts (ETag = versión de cambios; 304 si no cambió nada)'''
+    # La versión se lee antes que los hosts: un cambio confirmado durante la
+    # consulta tiene una versión mayor y llega en el próximo /hosts/changes
+    version = host_changes.version
+    if request.if_none_match.contains(str(version)):
+        response = Response(status=304)
+    else:
+        response = Response(host_registry.snapshot())
+    response.set_etag(str(version))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@api.route('/hosts/changes', methods=['GET'])
+def get_host_changes():
+    '''Obtener los hosts que cambiaron desde una versión (?since=<versión del ETag o de la respuesta anterior>)
+
+    Los hosts creados, editados o con cambio de estado vienen completos en
+    ``hosts``, los que solo se sondearon en ``polled`` ({id: last_poll}) y
+    los borrados en ``deleted``. Con ``reset`` el cliente debe recargar /hosts.
+    '''
+    try:
+        since = int(request.args['since'])
+    except (KeyError, ValueError):
+        abort(400, 'since debe ser una versión')
+
+    changes = host_changes.since(since)
+    if changes is None:
+        return json.dumps({'version': host_changes.version, 'reset': True})
+
+    version, changed, polled, deleted = changes
+    return json.dumps({
+        'version': version,
+        'reset': False,
+        'hosts': host_registry.hosts(changed) if changed else [],
+        'polled': {host_id: last_poll.strftime(TIME_FORMAT) for host_id, last_poll in polled.items()},
+        'deleted': deleted
+    })
+
+@api.route('/events', methods=['GET'])
+def get_events():
+    '''Flujo SSE: eventos status (cambios de estado), alert (alertas nuevas) y changes (versión de cambios)'''
+    # El flujo no usa la base de datos ni el contexto de la petición
+    client = event_broker.subscribe()
+    if client is None:
+        abort(503, 'Demasiados clientes conectados al canal de eventos')
+    return Response(event_broker.stream(client), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @api.route('/hosts/<id>', methods=['GET'])
 def get_host(_id):
@@ -26,15 +86,20 @@ def get_host(_id):
 
 @api.route('/hostsDataTable', methods=['GET'])
 def get_all_hosts_datatable():
-    '''Obtener todos los hosts'''
+    '''Hosts para DataTables con paginado, orden y filtros del lado del servidor'''
+    params = parse_request(request.args)
+    total, records_filtered, hosts = host_page(params)
     data = {
+        "draw": params['draw'],
+        "recordsTotal": total,
+        "recordsFiltered": records_filtered,
         "columns": [
             { "data": "hostname", "title": "Hostname" },
             { "data": "ip_address", "title": "IP Address" },
             { "data": "last_poll", "title": "Last Poll" },
             { "data": "status", "title": "Status" }
         ],
-        "data": Schemas.hosts(many=True).dump(Hosts.query.all())
+        "data": [host.as_dict() for host in hosts]
     }
     return json.dumps(data)
 
@@ -56,8 +121,91 @@ def get_polling_config():
 @api.route('/pollHistory/<host_id>', methods=['GET'])
 def get_poll_history(host_id):
     '''Obtener el historial de consultas de un solo host'''
+    if get_history_mode() == 'transitions':
+        # Un registro por periodo: poll_time es el inicio del estado
+        return json.dumps(read_periods(int(host_id)))
     return json.dumps(Schemas.poll_history(many=True).dump(PollHistory.query.filter_by(host_id=host_id)))
 
+@api.route('/availability/<host_id>', methods=['GET'])
+def get_availability(host_id):
+    '''Obtener disponibilidad y RTT por hora o por día (?period=hour|day&start=&end=, por defecto últimos 7 días)'''
+    period = request.args.get('period', 'hour')
+    if period not in ('hour', 'day'):
+        abort(400, 'period debe ser hour o day')
+    try:
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.now()
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=7)
+    except ValueError:
+        abort(400, 'Formato de fecha inválido, use AAAA-MM-DD o AAAA-MM-DD HH:MM:SS')
+    return json.dumps(availability_series(int(host_id), start, end, period))
+
+@api.route('/slaReport', methods=['GET'])
+def get_sla_report():
+    '''Obtener disponibilidad, caídas, MTTR y caída más larga (?start=&end=, por defecto últimos 30 días)
+
+    ?host_id= limita el reporte a un host; ?group_by=ciudad,tipo agrupa por
+    columnas descriptivas y ?ciudad=&cto=&tipo=&dispositivo= filtra los hosts.
+    '''
+    try:
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.now()
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=30)
+    except ValueError:
+        abort(400, 'Formato de fecha inválido, use AAAA-MM-DD o AAAA-MM-DD HH:MM:SS')
+    group_by = [field for field in request.args.get('group_by', '').split(',') if field]
+    if any(field not in GROUP_FIELDS for field in group_by):
+        abort(400, f"group_by admite: {', '.join(GROUP_FIELDS)}")
+    filters = {field: request.args[field] for field in GROUP_FIELDS if field in request.args}
+    host_id = int(request.args['host_id']) if request.args.get('host_id') else None
+
+    return json.dumps({
+        'start': start.strftime('%Y-%m-%d %H:%M:%S'),
+        'end': end.strftime('%Y-%m-%d %H:%M:%S'),
+        'group_by': group_by,
+        'groups': sla_report(start, end, group_by, filters, host_id)
+    })
+
+@api.route('/hostStatusAt/<host_id>', methods=['GET'])
+def get_host_status_at(host_id):
+    '''Obtener el estado de un host en un instante (?time=, por defecto ahora)'''
+    try:
+        when = datetime.fromisoformat(request.args['time']) if request.args.get('time') else datetime.now()
+    except ValueError:
+        abort(400, 'Formato de fecha inválido, use AAAA-MM-DD o AAAA-MM-DD HH:MM:SS')
+    period = status_at(int(host_id), when)
+    return json.dumps({
+        'host_id': int(host_id),
+        'time': when.strftime('%Y-%m-%d %H:%M:%S'),
+        'status': period['poll_status'] if period else None,
+        'period': period
+    })
+
+@api.route('/pollMetrics/<host_id>', methods=['GET'])
+def get_poll_metrics(host_id):
+    '''Obtener RTT, jitter y pérdida de un host en un rango (?start=&end=, por defecto últimas 24 h)'''
+    try:
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.now()
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=1)
+    except ValueError:
+        abort(400, 'Formato de fecha inválido, use AAAA-MM-DD o AAAA-MM-DD HH:MM:SS')
+    return json.dumps(read_latency(int(host_id), start, end))
+
+@api.route('/pollingStats', methods=['GET'])
+def get_polling_stats():
+    '''Obtener duración de los ciclos de sondeo, desbordes, ejecuciones omitidas y ritmo de envío de cada ciclo'''
+    return json.dumps(poll_monitor.as_dict())
+
+@api.route('/retentionStats', methods=['GET'])
+def get_retention_stats():
+    '''Obtener el último reporte de retención: filas borradas, lotes y tiempo por tabla'''
+    return json.dumps(retention.last_report)
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    '''Métricas en formato de texto de Prometheus'''
+    HOSTS.replace({(status or 'Desconocido',): count for status, count in host_registry.status_counts().items()})
+    ALERT_QUEUE_DEPTH.set(HostAlerts.query.filter_by(alert_cleared=False).count())
+    return Response(generate_latest(), mimetype='text/plain; version=0.0.4')
+
 # TODO Should check this by user id
 @api.route('/alertsEnabled', methods=['GET'])
 def get_alerts_enabled():
@@ -88,22 +236,49 @@ def get_active_theme():
     '''Obtener el Tema activo'''
     return json.dumps(Schemas.web_themes(many=False).dump(WebThemes.query.filter_by(active=True).first()))
 
+def _counts_dict(counts):
+    return {
+        'total_hosts': sum(counts.values()),
+        'available_hosts': counts.get('Up', 0),
+        'unavailable_hosts': counts.get('Down', 0)
+    }
+
 @api.route('/hostCounts', methods=['GET'])
 def get_host_counts():
     '''Obtener el total de hosts, hosts disponibles y hosts no disponibles'''
-    total = Hosts.query.count()
-    num_up = Hosts.query.filter(Hosts.status == 'Up').count()
-    num_down = Hosts.query.filter(Hosts.status == 'Down').count()
+    return json.dumps(_counts_dict(host_registry.status_counts()))
 
-    return json.dumps({'total_hosts': total, 'available_hosts': num_up, 'unavailable_hosts': num_down})
+@api.route('/hostCounts/by/<field>', methods=['GET'])
+def get_host_counts_by(field):
+    '''Obtener total, disponibles y no disponibles por cada valor de ciudad, cto o tipo'''
+    if field not in COUNT_FIELDS:
+        abort(400, f"Se puede agrupar por: {', '.join(COUNT_FIELDS)}")
+    groups = [dict({field: value}, **_counts_dict(counts))
+              for value, counts in host_registry.group_counts(field).items()]
+    groups.sort(key=lambda group: str(group[field] or ''))
+    return json.dumps({'field': field, 'groups': groups})
 
 @api.route('/hosts/all', methods=['DELETE'])
 def delete_all_hosts():
     '''Eliminar todos los hosts'''
+    host_ids = [host_id for host_id, in db.session.query(Hosts.id)]
     Hosts.query.delete()
     HostAlerts.query.delete()
     PollHistory.query.delete()
+    HostMetrics.query.delete()
+    HostStatusPeriod.query.delete()
+    HostRollup.query.delete()
 
     db.session.commit()
+    host_registry.remove(host_ids)
+    host_changes.deleted(host_ids)
+    # Estado en memoria de los hosts borrados (los ids pueden reutilizarse)
+    for host_id in host_ids:
+        stability_tracker.forget(host_id)
+        dependency_graph.forget(host_id)
+        status_periods.forget(host_id)
+    latency_buffer.forget(host_ids)
+    rollup_buffer.forget(host_ids)
+    host_scheduler.reset()
 
     return json.dumps({'status': 'success'})
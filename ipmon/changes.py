@@ -0,0 +1,88 @@
+'''Versión de cambios del inventario de hosts, para actualizaciones incrementales del panel'''
+import time
+import threading
+
+
+class HostChanges():
+    '''Versión monotónica del inventario y versión del último cambio de cada host.
+
+    Se registra después del commit: los hosts creados o editados y los que
+    cambiaron de estado se devuelven completos, los que solo se sondearon
+    devuelven su ``last_poll`` y los borrados solo su id. La versión parte
+    del reloj al iniciar el proceso, así una versión de antes de un reinicio
+    queda por debajo del piso y el cliente recarga todo. Cada cambio de
+    versión se avisa a ``listeners`` (p. ej. el canal de eventos en vivo).
+    '''
+
+    def __init__(self, max_deleted=10000):
+        self.max_deleted = max_deleted
+        self._lock = threading.Lock()
+        self._version = self._floor = int(time.time() * 1000)
+        self._changed = {}  # host_id -> versión del último cambio de campos o estado
+        self._polled = {}   # host_id -> (versión, last_poll)
+        self._deleted = {}  # host_id -> versión del borrado, en orden de inserción
+        self.listeners = []
+
+    @property
+    def version(self):
+        with self._lock:
+            return self._version
+
+    def changed(self, host_ids):
+        '''Registra hosts creados, editados o con cambio de estado'''
+        with self._lock:
+            self._version += 1
+            for host_id in host_ids:
+                self._changed[host_id] = self._version
+                self._deleted.pop(host_id, None)
+            version = self._version
+        self._notify(version)
+
+    def polled(self, last_polls):
+        '''Registra el último sondeo de hosts sin otros cambios: {host_id: last_poll}'''
+        with self._lock:
+            self._version += 1
+            for host_id, last_poll in last_polls.items():
+                self._polled[host_id] = (self._version, last_poll)
+            version = self._version
+        self._notify(version)
+
+    def deleted(self, host_ids):
+        '''Registra hosts borrados'''
+        with self._lock:
+            self._version += 1
+            for host_id in host_ids:
+                self._changed.pop(host_id, None)
+                self._polled.pop(host_id, None)
+                self._deleted.pop(host_id, None)
+                self._deleted[host_id] = self._version
+
+            # Los borrados más antiguos se olvidan; quien los necesite recarga todo
+            while len(self._deleted) > self.max_deleted:
+                host_id = next(iter(self._deleted))
+                self._floor = self._deleted.pop(host_id)
+            version = self._version
+        self._notify(version)
+
+    def _notify(self, version):
+        for listener in self.listeners:
+            listener(version)
+
+    def since(self, version):
+        '''Cambios posteriores a ``version``
+
+        Devuelve (versión actual, ids cambiados, {host_id: last_poll}, ids
+        borrados), o None si ``version`` es anterior al piso o posterior a la
+        versión actual y hay que recargar el inventario completo.
+        '''
+        with self._lock:
+            if version < self._floor or version > self._version:
+                return None
+            changed = [host_id for host_id, changed_at in self._changed.items() if changed_at > version]
+            polled = {host_id: last_poll for host_id, (polled_at, last_poll) in self._polled.items()
+                      if polled_at > version}
+            deleted = [host_id for host_id, deleted_at in self._deleted.items() if deleted_at > version]
+            return self._version, changed, polled, deleted
+
+
+host_changes = HostChanges()
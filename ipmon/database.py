@@ -7,6 +7,35 @@ from datetime import datetime
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
 from ipmon import db
 
+# Formato de las fechas de sondeo expuestas en la API y en las alertas
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class HostStatus(db.TypeDecorator):
+    '''Estado 'Up'/'Down' guardado como entero pequeño (1/0)
+
+    El código de la aplicación sigue usando las cadenas: la conversión se
+    hace al enlazar parámetros (también en filtros y escrituras masivas) y
+    al leer resultados.
+    '''
+    impl = db.SmallInteger
+    cache_ok = True
+
+    CODES = {'Down': 0, 'Up': 1}
+    NAMES = {code: name for name, code in CODES.items()}
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return self.CODES[value]
+        except KeyError:
+            raise ValueError(f"Estado de host inválido: {value!r}")
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.NAMES[value]
+
+
 ##########################
 # Modelos ###############
 ##########################
@@ -27,18 +56,28 @@ class Users(db.Model):
 class Hosts(db.Model):
     """Tabla de Hosts"""
     __tablename__ = 'hosts'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_hosts_status', 'status'),
+        db.Index('ix_hosts_hostname', 'hostname'),
+        # Filtros de las tablas de hosts, sin distinguir mayúsculas
+        db.Index('ix_hosts_ciudad', db.text('ciudad COLLATE NOCASE')),
+        db.Index('ix_hosts_cto', db.text('cto COLLATE NOCASE')),
+        db.Index('ix_hosts_tipo', db.text('tipo COLLATE NOCASE')),
+        {'extend_existing': True}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     ip_address = db.Column(db.String(15), nullable=False, unique=True)
     hostname = db.Column(db.String(100))
+    hostname_auto = db.Column(db.Boolean, default=False)  # nombre obtenido por DNS inverso (se refresca)
     ciudad = db.Column(db.String(100))
     cto = db.Column(db.String(100))
     dispositivo = db.Column(db.String(100))  
+    parent_id = db.Column(db.Integer, db.ForeignKey('hosts.id'), nullable=True)  # padre explícito; si no, se usa dispositivo
     tipo = db.Column(db.String(100))         
-    status = db.Column(db.String(10))
-    last_poll = db.Column(db.String(20))
-    previous_status = db.Column(db.String(10))
+    status = db.Column(HostStatus)
+    last_poll = db.Column(db.DateTime)
+    previous_status = db.Column(HostStatus)
     alerts_enabled = db.Column(db.Boolean, default=True)
 
     # Puerto RTSP
@@ -80,17 +119,22 @@ class Hosts(db.Model):
         else:
             self.snapshot_url = None
 
-    last_alert_status = db.Column(db.String(10), default=None)
+    last_alert_status = db.Column(HostStatus, default=None)
 
 
 class PollHistory(db.Model):
     """Historial de sondeo de dispositivos"""
     __tablename__ = 'poll_history'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_poll_history_date_created', 'date_created'),  # retención por lotes
+        # Incluye poll_status para que la reconstrucción de estabilidad no lea la tabla
+        db.Index('ix_poll_history_host_date', 'host_id', 'date_created', 'poll_status'),
+        {'extend_existing': True}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    poll_time = db.Column(db.String(20))
-    poll_status = db.Column(db.String(20))
+    poll_time = db.Column(db.DateTime)
+    poll_status = db.Column(HostStatus)
     date_created = db.Column(db.DateTime, default=datetime.now)
     host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'))
 
@@ -98,16 +142,75 @@ class PollHistory(db.Model):
     host = db.relationship("Hosts", back_populates="poll_history")
 
 
+class HostStatusPeriod(db.Model):
+    """Periodos de estado por host: una fila por transición"""
+    __tablename__ = 'host_status_periods'
+    __table_args__ = (
+        db.Index('ix_host_status_periods_host_started', 'host_id', 'started_at'),
+        db.Index('ix_host_status_periods_ended_at', 'ended_at'),  # retención por lotes
+        {'extend_existing': True}
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'), nullable=False)
+    status = db.Column(HostStatus, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    ended_at = db.Column(db.DateTime)  # None = periodo abierto (estado actual)
+    last_seen = db.Column(db.DateTime, nullable=False)  # último latido confirmado del estado
+
+
+class HostRollup(db.Model):
+    """Acumulados de disponibilidad y RTT por host, por hora o por día"""
+    __tablename__ = 'host_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('host_id', 'period', 'period_start'),
+        # La restricción compara el texto; este índice impide dos filas del mismo instante en otro formato
+        db.Index('ux_host_rollups_period_value', 'host_id', 'period', db.text('datetime(period_start)'), unique=True),
+        # Cubre la suma de sondeos de todos los hosts por rango de fechas (reportes de SLA)
+        db.Index('ix_host_rollups_period_start', 'period', 'period_start', 'host_id', 'up_count', 'down_count'),
+        {'extend_existing': True}
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'), nullable=False)
+    period = db.Column(db.String(5), nullable=False)  # 'hour' o 'day'
+    period_start = db.Column(db.DateTime, nullable=False)
+    up_count = db.Column(db.Integer, default=0, nullable=False)
+    down_count = db.Column(db.Integer, default=0, nullable=False)
+    rtt_count = db.Column(db.Integer, default=0, nullable=False)
+    rtt_sum = db.Column(db.Float, default=0.0, nullable=False)
+    rtt_min = db.Column(db.Float)
+    rtt_max = db.Column(db.Float)
+
+
+class HostMetrics(db.Model):
+    """Muestras de latencia empaquetadas por host y por hora"""
+    __tablename__ = 'host_metrics'
+    __table_args__ = (
+        db.UniqueConstraint('host_id', 'period_start'),
+        db.Index('ix_host_metrics_period_start', 'period_start'),  # retención por lotes
+        {'extend_existing': True}
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'), nullable=False)
+    period_start = db.Column(db.DateTime, nullable=False)
+    samples = db.Column(db.LargeBinary, nullable=False)  # ver ipmon.latency.SAMPLE
+
+
 class HostAlerts(db.Model):
     """Alertas por cambio de estado del host"""
     __tablename__ = 'host_alerts'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_host_alerts_alert_cleared', 'alert_cleared'),
+        {'extend_existing': True}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     hostname = db.Column(db.String(100))
     ip_address = db.Column(db.String(15))
-    host_status = db.Column(db.String(20))
-    poll_time = db.Column(db.String(20))
+    host_status = db.Column(HostStatus)
+    poll_time = db.Column(db.DateTime)
     alert_cleared = db.Column(db.Boolean, default=False)
     date_created = db.Column(db.DateTime, default=datetime.now)
     host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'))
@@ -124,6 +227,14 @@ class Polling(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     poll_interval = db.Column(db.Integer, default=60, nullable=False)
     history_truncate_days = db.Column(db.Integer, default=10, nullable=False)
+    max_concurrency = db.Column(db.Integer, default=50, nullable=False)
+    packets_per_second = db.Column(db.Integer, default=0, nullable=False)  # 0 = sin límite
+    subnet_packet_limits = db.Column(db.String(1000), default='', nullable=False)  # "red/prefijo=pps, ..."
+    min_poll_interval = db.Column(db.Integer, default=10, nullable=False)
+    max_poll_interval = db.Column(db.Integer, default=180, nullable=False)
+    history_mode = db.Column(db.String(20), default='full', nullable=False)  # 'full' o 'transitions'
+    heartbeat_interval = db.Column(db.Integer, default=300, nullable=False)  # 0 = en cada sondeo
+    rollup_retention_days = db.Column(db.Integer, default=90, nullable=False)  # acumulados por hora
 
 
 class SmtpServer(db.Model):
@@ -165,7 +276,10 @@ class AppConfig(db.Model):
 class Images(db.Model):
     """Imágenes asociadas a Hosts"""
     __tablename__ = 'images'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_images_host_id', 'host_id'),
+        {'extend_existing': True}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     file_path = db.Column(db.String(255), nullable=False)  # ruta local de la imagen
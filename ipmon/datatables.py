@@ -0,0 +1,135 @@
+'''Paginado, orden y filtros del lado del servidor para tablas de hosts (protocolo de DataTables)'''
+import os
+import sys
+
+from sqlalchemy import func
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import db
+from ipmon.database import Hosts
+from ipmon.registry import host_registry
+
+# Columnas en las que busca la caja de búsqueda (subcadena, sin distinguir mayúsculas en ASCII)
+SEARCH_COLUMNS = (Hosts.hostname, Hosts.ip_address, Hosts.ciudad, Hosts.cto, Hosts.dispositivo, Hosts.tipo)
+
+# Columnas con filtro exacto (indexadas, las de texto sin distinguir mayúsculas):
+# columns[i][search][value] o parámetro con el mismo nombre
+FILTER_COLUMNS = {
+    'ciudad': Hosts.ciudad.collate('NOCASE'),
+    'cto': Hosts.cto.collate('NOCASE'),
+    'tipo': Hosts.tipo.collate('NOCASE'),
+    'status': Hosts.status
+}
+
+# Columnas por las que se puede ordenar; cada una es una lista de expresiones
+ORDER_COLUMNS = {
+    'id': [Hosts.id],
+    'hostname': [Hosts.hostname],
+    'ip_address': [Hosts.ip_address],
+    'ciudad': [Hosts.ciudad],
+    'cto': [Hosts.cto],
+    'dispositivo': [Hosts.dispositivo],
+    'tipo': [Hosts.tipo],
+    'status': [Hosts.status],
+    'last_poll': [Hosts.last_poll]
+}
+
+
+def _int_arg(args, name, default):
+    try:
+        return int(args.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_request(args):
+    '''Parámetros de DataTables de ``args`` (request.args)
+
+    Devuelve un diccionario con draw, start, length (-1 = todas las filas),
+    search, filters {columna: valor} y order [(columna, descendente)]. Sin
+    ``length`` se devuelven todas las filas, como antes de paginar.
+    '''
+    columns = []
+    while 'columns[{}][data]'.format(len(columns)) in args:
+        columns.append(args['columns[{}][data]'.format(len(columns))])
+
+    filters = {}
+    for index, column in enumerate(columns):
+        value = args.get('columns[{}][search][value]'.format(index), '').strip()
+        if value and column in FILTER_COLUMNS:
+            filters[column] = value
+    for column in FILTER_COLUMNS:
+        value = args.get(column, '').strip()
+        if value:
+            filters[column] = value
+
+    order = []
+    while 'order[{}][column]'.format(len(order)) in args:
+        index = _int_arg(args, 'order[{}][column]'.format(len(order)), -1)
+        descending = args.get('order[{}][dir]'.format(len(order))) == 'desc'
+        order.append((columns[index] if 0 <= index < len(columns) else None, descending))
+
+    return {
+        'draw': _int_arg(args, 'draw', 0),
+        'start': max(_int_arg(args, 'start', 0), 0),
+        'length': _int_arg(args, 'length', -1),
+        'search': args.get('search[value]', '').strip(),
+        'filters': filters,
+        'order': [(column, descending) for column, descending in order if column]
+    }
+
+
+def host_page(params, order_columns=None, default_order=('hostname',)):
+    '''Página de hosts según ``params`` (ver parse_request)
+
+    La consulta solo elige los ids de la página: los filtros exactos usan
+    los índices de ciudad, cto, tipo y status, y el orden siempre termina en
+    ``id`` para que el paginado sea estable. Los hosts salen del registro en
+    memoria. ``order_columns`` permite reemplazar las expresiones de orden de
+    alguna columna. Devuelve (total de hosts, hosts filtrados, lista de HostRecord).
+    '''
+    order_columns = dict(ORDER_COLUMNS, **(order_columns or {}))
+    query = db.session.query(Hosts.id)
+    filtered = False
+
+    for column, value in params['filters'].items():
+        if column == 'status':
+            value = value.capitalize()
+            if value not in ('Up', 'Down'):
+                continue
+        query = query.filter(FILTER_COLUMNS[column] == value)
+        filtered = True
+
+    if params['search']:
+        query = query.filter(db.or_(*(column.contains(params['search'], autoescape=True)
+                                      for column in SEARCH_COLUMNS)))
+        filtered = True
+
+    total = len(host_registry)
+    records_filtered = query.with_entities(func.count(Hosts.id)).scalar() if filtered else total
+
+    order = [(column, descending) for column, descending in params['order'] if column in order_columns]
+    if not order:
+        order = [(column, False) for column in default_order]
+    clauses = []
+    for column, descending in order:
+        clauses.extend(expression.desc() if descending else expression.asc()
+                       for expression in order_columns[column])
+    query = query.order_by(*clauses, Hosts.id)
+
+    if params['start']:
+        query = query.offset(params['start'])
+    if params['length'] > 0:
+        query = query.limit(params['length'])
+    host_ids = [host_id for host_id, in query]
+    records = host_registry.get_many(host_ids)
+    return total, records_filtered, [records[host_id] for host_id in host_ids if host_id in records]
+
+
+def host_tipos():
+    '''Tipos de host distintos (no vacíos, sin repetir por mayúsculas), para el filtro de las tablas'''
+    tipos = {}
+    for (tipo,) in db.session.query(Hosts.tipo).distinct():
+        if tipo and tipo.strip():
+            tipos.setdefault(tipo.strip().lower(), tipo.strip())
+    return sorted(tipos.values())
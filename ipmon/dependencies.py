@@ -0,0 +1,161 @@
+'''Grafo de dependencias entre hosts (equipo padre del que depende cada host)'''
+import os
+import sys
+import threading
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import log
+from ipmon.registry import host_registry
+
+
+class DependencyGraph():
+    '''Relación padre/hijo de los hosts, precalculada para consultas O(1) por ciclo.
+
+    El padre de un host es ``parent_id`` si está definido; si no, el host
+    cuyo hostname o IP coincide con ``dispositivo`` ("vinculado a").
+
+    Con el último estado sondeado de cada host se mantienen dos contadores
+    por descendiente: ancestros observados Down (sus alertas Down se agrupan
+    en la del padre) y ancestros Down confirmados (no se sondean y se marcan
+    Down sin enviar paquetes).
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._parent = {}        # host_id -> host_id del padre
+        self._descendants = {}   # host_id -> tupla de descendientes
+        self._down = set()       # hosts con último sondeo Down
+        self._confirmed = set()  # hosts Down confirmados (ciclos estables)
+        self._down_ancestors = defaultdict(int)
+        self._confirmed_ancestors = defaultdict(int)
+
+    def invalidate(self):
+        '''Fuerza la reconstrucción del grafo en el próximo ciclo (hosts agregados, editados o eliminados)'''
+        with self._lock:
+            self._loaded = False
+
+    def forget(self, host_id):
+        '''Elimina el estado de un host borrado'''
+        with self._lock:
+            self._down.discard(host_id)
+            self._confirmed.discard(host_id)
+            self._loaded = False
+
+    def descendants(self, host_id):
+        '''Hosts que dependen directa o indirectamente de ``host_id``'''
+        with self._lock:
+            self._ensure_loaded()
+            return self._descendants.get(host_id, ())
+
+    def unreachable_descendants(self, host_id):
+        '''Descendientes de ``host_id`` sin respuesta: Down en su último sondeo o suprimidos por un ancestro'''
+        with self._lock:
+            self._ensure_loaded()
+            return tuple(d for d in self._descendants.get(host_id, ())
+                         if d in self._down or self._confirmed_ancestors.get(d, 0) > 0)
+
+    def is_suppressed(self, host_id):
+        '''Indica si algún ancestro del host está Down confirmado (no se sondea)'''
+        with self._lock:
+            self._ensure_loaded()
+            return self._confirmed_ancestors.get(host_id, 0) > 0
+
+    def is_folded(self, host_id):
+        '''Indica si algún ancestro del host está Down (su alerta se agrupa en la del padre)'''
+        with self._lock:
+            self._ensure_loaded()
+            return self._down_ancestors.get(host_id, 0) > 0
+
+    def observe(self, host_id, status, confirmed):
+        '''Registra el estado sondeado de un host.
+
+        Devuelve los descendientes que dejan de estar suprimidos porque el
+        host volvió a responder, para sondearlos de inmediato.
+        '''
+        with self._lock:
+            self._ensure_loaded()
+            descendants = self._descendants.get(host_id, ())
+            down = status == 'Down'
+
+            if down != (host_id in self._down):
+                (self._down.add if down else self._down.discard)(host_id)
+                self._count(self._down_ancestors, descendants, 1 if down else -1)
+
+            released = []
+            confirmed = down and confirmed
+            if confirmed != (host_id in self._confirmed):
+                if confirmed:
+                    self._confirmed.add(host_id)
+                    self._count(self._confirmed_ancestors, descendants, 1)
+                else:
+                    self._confirmed.discard(host_id)
+                    self._count(self._confirmed_ancestors, descendants, -1)
+                    released = [d for d in descendants if not self._confirmed_ancestors.get(d)]
+            return released
+
+    @staticmethod
+    def _count(counters, host_ids, delta):
+        for host_id in host_ids:
+            counters[host_id] += delta
+            if counters[host_id] <= 0:
+                del counters[host_id]
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._rebuild()
+
+    def _rebuild(self):
+        '''Construye el grafo con los campos de dependencia del registro de hosts'''
+        rows = host_registry.records()
+
+        ids = {row.id for row in rows}
+        by_name = {}
+        for row in rows:
+            by_name.setdefault(row.ip_address, row.id)
+            if row.hostname:
+                by_name.setdefault(row.hostname.strip().lower(), row.id)
+
+        parent = {}
+        for row in rows:
+            parent_id = row.parent_id
+            if parent_id is None and row.dispositivo:
+                name = row.dispositivo.strip()
+                parent_id = by_name.get(name) or by_name.get(name.lower())
+            if parent_id in ids and parent_id != row.id:
+                parent[row.id] = parent_id
+
+        # Romper ciclos: se descarta el enlace del host desde el que se detecta
+        for host_id in sorted(parent):
+            seen = {host_id}
+            current = parent.get(host_id)
+            while current is not None and current not in seen:
+                seen.add(current)
+                current = parent.get(current)
+            if current == host_id:
+                log.warning(f"Dependencia circular en el host {host_id}, se ignora su padre")
+                del parent[host_id]
+
+        descendants = defaultdict(list)
+        for host_id in parent:
+            current = parent.get(host_id)
+            while current is not None:
+                descendants[current].append(host_id)
+                current = parent.get(current)
+
+        self._parent = parent
+        self._descendants = {host_id: tuple(children) for host_id, children in descendants.items()}
+        self._down &= ids
+        self._confirmed &= ids
+        self._down_ancestors = defaultdict(int)
+        self._confirmed_ancestors = defaultdict(int)
+        for host_id in self._down:
+            self._count(self._down_ancestors, self._descendants.get(host_id, ()), 1)
+        for host_id in self._confirmed:
+            self._count(self._confirmed_ancestors, self._descendants.get(host_id, ()), 1)
+        self._loaded = True
+        log.info(f"Grafo de dependencias reconstruido: {len(parent)} hosts con padre")
+
+
+dependency_graph = DependencyGraph()
@@ -0,0 +1,342 @@
+'''Motor de sondeo asíncrono con la API async de icmplib'''
+import os
+import sys
+import time
+import queue
+import asyncio
+import ipaddress
+import threading
+import multiprocessing
+from collections import namedtuple, Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from icmplib import Host
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import log
+from ipmon.probes import get_backend
+
+_DONE = object()
+
+# Resultado compacto devuelto por los procesos de sondeo; expone los mismos
+# atributos que icmplib.Host que usa el guardado de resultados
+ProbeResult = namedtuple('ProbeResult', [
+    'address', 'is_alive', 'avg_rtt', 'min_rtt', 'max_rtt', 'jitter', 'packet_loss'
+])
+
+_shard_pool = None
+_shard_pool_workers = 0
+_shard_pool_lock = threading.Lock()
+
+
+# Ráfaga admitida por cada cubeta, en segundos de su tasa
+BURST_SECONDS = 0.01
+
+
+def parse_subnet_limits(text):
+    '''Convierte "10.1.0.0/16=50, 10.2.0.0/24=20" en [(red, paquetes por segundo)]
+
+    Lanza ValueError si alguna entrada no es válida.
+    '''
+    limits = []
+    for entry in (text or '').replace(';', ',').replace('\n', ',').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        network, sep, rate = entry.partition('=')
+        if not sep or float(rate) <= 0:
+            raise ValueError(f"límite por subred no válido: '{entry}' (formato red/prefijo=paquetes por segundo)")
+        limits.append((ipaddress.ip_network(network.strip(), strict=False), float(rate)))
+    return limits
+
+
+def pacing_rate(num_targets, count, packets_per_second=0, spread_seconds=None):
+    '''Tasa global de envío: el límite configurado o la que reparte los sondeos en ``spread_seconds``'''
+    rates = [packets_per_second] if packets_per_second else []
+    if spread_seconds and num_targets:
+        rates.append(num_targets * count / spread_seconds)
+    return min(rates) if rates else 0
+
+
+def expected_seconds(num_targets, concurrency=50, packets_per_second=0, subnet_limits=(),
+                     count=1, timeout=1, interval=0.2):
+    '''Peor caso de lo que tarda poll_inventory en sondear ``num_targets`` hosts
+
+    Lo que sea mayor entre las tandas de ``concurrency`` sondeos que no
+    responden y los paquetes al ritmo más lento configurado (todos en la
+    subred más limitada), más un sondeo completo.
+    '''
+    probe = (count - 1) * interval + timeout
+    waves = -(-num_targets // max(1, concurrency)) * probe
+    rates = [rate for rate in [packets_per_second] + [rate for network, rate in subnet_limits] if rate]
+    paced = num_targets * count / min(rates) if rates else 0
+    return max(waves, paced) + probe
+
+
+class TokenBucket():
+    '''Cubeta de fichas: ``rate`` paquetes por segundo con ráfagas de hasta ``burst``.
+
+    Las reservas pueden dejar la cubeta en negativo; la deuda es lo que el
+    envío debe esperar, así los paquetes salen en orden y espaciados.
+    '''
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate * BURST_SECONDS)
+        self._tokens = self.burst
+        self._updated = None
+
+    def reserve(self, packets, now):
+        '''Reserva ``packets`` fichas; devuelve los segundos a esperar antes de enviar'''
+        if self._updated is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= packets
+        return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class _Pacer():
+    '''Reparte los envíos con una cubeta global y cubetas opcionales por subred.
+
+    Primero se espera a la cubeta de la subred más específica del destino
+    y después a la global, de modo que el límite global se cumple siempre.
+    Registra los paquetes enviados por segundo y las esperas impuestas.
+    '''
+
+    def __init__(self, packets_per_second=0, subnet_limits=()):
+        self._global = TokenBucket(packets_per_second) if packets_per_second else None
+        self._subnets = [(network, TokenBucket(rate))
+                         for network, rate in sorted(subnet_limits, key=lambda limit: -limit[0].prefixlen)]
+        self._by_address = {}
+        self.packets = 0
+        self.waited = 0.0
+        self.longest_wait = 0.0
+        self.first = self.last = None
+        self.per_second = Counter()
+
+    def _subnet_bucket(self, address):
+        bucket = self._by_address.get(address, False)
+        if bucket is False:
+            ip = ipaddress.ip_address(address)
+            bucket = next((b for network, b in self._subnets if ip in network), None)
+            self._by_address[address] = bucket
+        return bucket
+
+    async def wait(self, address, packets=1):
+        requested = time.monotonic()
+        for bucket in (self._subnet_bucket(address) if self._subnets else None, self._global):
+            if bucket is not None:
+                delay = bucket.reserve(packets, time.monotonic())
+                if delay:
+                    await asyncio.sleep(delay)
+
+        sent = time.monotonic()
+        waited = sent - requested
+        self.waited += waited
+        self.longest_wait = max(self.longest_wait, waited)
+        self.packets += packets
+        self.first = sent if self.first is None else self.first
+        self.last = sent
+        self.per_second[int(sent)] += packets
+
+    def summary(self, workers):
+        return {
+            'packets': self.packets,
+            'first': self.first,
+            'last': self.last,
+            'per_second': dict(self.per_second),
+            'waited': self.waited,
+            'longest_wait': self.longest_wait,
+            'workers': workers
+        }
+
+
+def pacing_report(parts, target_pps=0):
+    '''Combina los resúmenes de los pacers (uno por proceso) en el ritmo logrado
+
+    ``paced_seconds`` estima cuánto alargaron el ciclo las esperas del pacer
+    (el tiempo de espera promedio por worker o la espera más larga), para no
+    contarlo como costo de sondeo al calcular cuántos hosts caben en el plazo.
+    '''
+    parts = [part for part in parts if part and part['packets']]
+    if not parts:
+        return {'packets': 0, 'target_pps': target_pps or None, 'achieved_pps': None,
+                'peak_pps': None, 'wait_seconds': 0.0, 'paced_seconds': 0.0}
+
+    per_second = Counter()
+    for part in parts:
+        per_second.update(part['per_second'])
+    packets = sum(part['packets'] for part in parts)
+    span = max(part['last'] for part in parts) - min(part['first'] for part in parts)
+    waited = sum(part['waited'] for part in parts)
+    workers = max(1, sum(part['workers'] for part in parts))
+    return {
+        'packets': packets,
+        'target_pps': round(target_pps, 3) if target_pps else None,
+        'achieved_pps': round(packets / span, 3) if span > 0 else None,
+        'peak_pps': max(per_second.values()),
+        'wait_seconds': round(waited, 3),
+        'paced_seconds': round(max(waited / workers, max(part['longest_wait'] for part in parts)), 3)
+    }
+
+
+async def _probe_all(targets, results, concurrency, packets_per_second, count, timeout, interval,
+                     subnet_limits=(), backend=None):
+    '''Mantiene como máximo ``concurrency`` sondeos en vuelo sobre todo el inventario
+
+    Devuelve el resumen del ritmo de envío (ver ``pacing_report``).
+    '''
+    pending = iter(targets)
+    pacer = _Pacer(packets_per_second, subnet_limits)
+    backend = backend or get_backend()
+    workers = max(1, min(concurrency, len(targets)))
+
+    async def worker():
+        for host_id, address in pending:
+            await pacer.wait(address, count)
+            try:
+                host = await backend.async_ping(address, count=count, timeout=timeout, interval=interval)
+            except Exception as e:
+                log.debug(f"Error sondeando {address}: {e}")
+                host = Host(address, count, [])
+            results.put((host_id, host))
+
+    try:
+        await asyncio.gather(*(worker() for dummy in range(workers)))
+    finally:
+        results.put(_DONE)
+    return pacer.summary(workers)
+
+
+def poll_inventory(targets, on_results, concurrency=50, packets_per_second=0,
+                   count=1, timeout=1, interval=0.2, flush_size=200, flush_interval=0.5,
+                   subnet_limits=(), spread_seconds=None):
+    '''Sondea ``targets`` [(host_id, ip_address)] y entrega los resultados a medida que llegan.
+
+    Los sondeos corren en un hilo con su propio bucle asyncio; el hilo que
+    llama agrupa los resultados y llama a ``on_results(host_ids, results)``
+    cada ``flush_size`` resultados o cada ``flush_interval`` segundos, de modo
+    que la escritura en la base de datos se solapa con los sondeos.
+
+    Los envíos se limitan a ``packets_per_second`` y a ``subnet_limits``
+    [(red, paquetes por segundo)]; con ``spread_seconds`` además se reparten
+    parejos en ese lapso. Devuelve el ritmo logrado (ver ``pacing_report``).
+    '''
+    if not targets:
+        return pacing_report([])
+
+    rate = pacing_rate(len(targets), count, packets_per_second, spread_seconds)
+    results = queue.Queue()
+    pacing = []
+    probe_thread = threading.Thread(
+        target=lambda: pacing.append(asyncio.run(_probe_all(
+            targets, results, concurrency, rate, count, timeout, interval, subnet_limits
+        ))),
+        daemon=True
+    )
+    probe_thread.start()
+
+    host_ids, batch = [], []
+    deadline = time.monotonic() + flush_interval
+    done = False
+    while not done:
+        try:
+            item = results.get(timeout=max(0, deadline - time.monotonic()))
+            if item is _DONE:
+                done = True
+            else:
+                host_ids.append(item[0])
+                batch.append(item[1])
+        except queue.Empty:
+            pass
+
+        if batch and (done or len(batch) >= flush_size or time.monotonic() >= deadline):
+            on_results(host_ids, batch)
+            host_ids, batch = [], []
+        if time.monotonic() >= deadline:
+            deadline = time.monotonic() + flush_interval
+
+    probe_thread.join()
+    return pacing_report(pacing, rate)
+
+
+def _probe_shard(targets, concurrency, packets_per_second, count, timeout, interval, subnet_limits=(),
+                 backend=None):
+    '''Sondea un fragmento del inventario en un proceso hijo; devuelve tuplas compactas y el ritmo de envío
+
+    Es el punto de entrada de los procesos de sondeo: importarlo en el hijo
+    carga solo el paquete mínimo (ver ipmon/__init__.py), este módulo y los
+    backends, sin la aplicación web. ``backend`` es el del proceso padre.
+    '''
+    results = queue.Queue()
+    pacing = asyncio.run(_probe_all(targets, results, concurrency, packets_per_second,
+                                    count, timeout, interval, subnet_limits, backend))
+
+    compact = []
+    while True:
+        item = results.get_nowait()
+        if item is _DONE:
+            return compact, pacing
+        host_id, host = item
+        compact.append((host_id, host.address, host.is_alive, host.avg_rtt,
+                        host.min_rtt, host.max_rtt, host.jitter, host.packet_loss))
+
+
+def _get_shard_pool(workers):
+    global _shard_pool, _shard_pool_workers
+    with _shard_pool_lock:
+        if _shard_pool is None or _shard_pool_workers != workers:
+            if _shard_pool is not None:
+                _shard_pool.shutdown(wait=False)
+            # 'spawn' y no 'fork': este proceso tiene hilos (scheduler, escritor, DNS) cuyos
+            # locks un hijo creado con fork podría heredar tomados
+            _shard_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _shard_pool_workers = workers
+        return _shard_pool
+
+
+def _reset_shard_pool():
+    global _shard_pool
+    with _shard_pool_lock:
+        if _shard_pool is not None:
+            _shard_pool.shutdown(wait=False)
+        _shard_pool = None
+
+
+def poll_inventory_sharded(targets, on_results, workers, concurrency=50, packets_per_second=0,
+                           count=1, timeout=1, interval=0.2, shard_size=500,
+                           subnet_limits=(), spread_seconds=None):
+    '''Reparte ``targets`` por id entre ``workers`` procesos de sondeo.
+
+    Cada proceso sondea fragmentos contiguos de ``shard_size`` hosts con el
+    motor asíncrono y devuelve tuplas compactas; este hilo es el único que
+    escribe y recibe cada fragmento con ``on_results`` en cuanto termina.
+    La concurrencia y los límites de paquetes por segundo (global y por
+    subred) se dividen entre los procesos. Devuelve el ritmo logrado.
+    '''
+    if not targets:
+        return pacing_report([])
+
+    targets = sorted(targets)
+    rate = pacing_rate(len(targets), count, packets_per_second, spread_seconds)
+    shard_concurrency = max(1, concurrency // workers)
+    shard_pps = rate / workers if rate else 0
+    shard_limits = [(network, limit / workers) for network, limit in subnet_limits]
+
+    pool = _get_shard_pool(workers)
+    backend = get_backend()
+    pacing = []
+    try:
+        futures = [
+            pool.submit(_probe_shard, targets[i:i + shard_size], shard_concurrency,
+                        shard_pps, count, timeout, interval, shard_limits, backend)
+            for i in range(0, len(targets), shard_size)
+        ]
+        for future in as_completed(futures):
+            compact, shard_pacing = future.result()
+            pacing.append(shard_pacing)
+            on_results([c[0] for c in compact], [ProbeResult(*c[1:]) for c in compact])
+    except Exception:
+        _reset_shard_pool()
+        raise
+    return pacing_report(pacing, rate)
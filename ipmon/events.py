@@ -0,0 +1,115 @@
+'''Canal de eventos en vivo (Server-Sent Events) para el panel'''
+import os
+import sys
+import json
+import threading
+from collections import deque
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import config
+from ipmon.changes import host_changes
+from ipmon.metrics import EVENT_CLIENTS, EVENTS_DROPPED
+
+
+def _format(event, data):
+    return 'event: {}\ndata: {}\n\n'.format(event, json.dumps(data))
+
+
+class _Client():
+    '''Cola acotada de un cliente; la versión de cambios se guarda aparte y solo vale la última'''
+
+    def __init__(self):
+        self.events = deque()
+        self.version = None
+        self.overflowed = False
+        self.ready = threading.Event()
+
+
+class EventBroker():
+    '''Difunde eventos ya serializados a los clientes conectados.
+
+    Publicar no toca la base de datos ni espera a nadie: cada evento se
+    serializa una vez y se agrega a la cola de cada cliente. Si un cliente
+    lento llena su cola se vacía y recibe un evento ``reset`` para que se
+    resincronice con /hosts/changes. Un cliente sin eventos solo ocupa un
+    hilo bloqueado hasta el próximo latido.
+    '''
+
+    def __init__(self, max_clients=500, max_queued=256, heartbeat=15):
+        self.max_clients = max_clients
+        self.max_queued = max_queued
+        self.heartbeat = heartbeat
+        self._lock = threading.Lock()
+        self._clients = set()
+
+    def subscribe(self):
+        '''Registra un cliente; devuelve None si se alcanzó el máximo'''
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                return None
+            client = _Client()
+            self._clients.add(client)
+            EVENT_CLIENTS.set(len(self._clients))
+            return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+            EVENT_CLIENTS.set(len(self._clients))
+
+    def publish(self, event, data):
+        '''Envía ``data`` (serializable a JSON) a todos los clientes como evento ``event``'''
+        payload = _format(event, data)
+        dropped = 0
+        with self._lock:
+            for client in self._clients:
+                if client.overflowed:
+                    continue
+                if len(client.events) >= self.max_queued:
+                    client.events.clear()
+                    client.overflowed = True
+                    dropped += 1
+                else:
+                    client.events.append(payload)
+                client.ready.set()
+        if dropped:
+            EVENTS_DROPPED.inc(dropped)
+
+    def publish_version(self, version):
+        '''Avisa la nueva versión de cambios del inventario (se envía solo la última)'''
+        with self._lock:
+            for client in self._clients:
+                client.version = version
+                client.ready.set()
+
+    def stream(self, client):
+        '''Generador del flujo SSE de un cliente; se desuscribe al desconectarse'''
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                if not client.ready.wait(self.heartbeat):
+                    yield ': ping\n\n'
+                    continue
+
+                with self._lock:
+                    client.ready.clear()
+                    events, client.events = client.events, deque()
+                    version, client.version = client.version, None
+                    overflowed, client.overflowed = client.overflowed, False
+
+                if overflowed:
+                    yield _format('reset', {})
+                for payload in events:
+                    yield payload
+                if version is not None:
+                    yield _format('changes', {'version': version})
+        finally:
+            self.unsubscribe(client)
+
+
+event_broker = EventBroker(
+    max_clients=config['Events']['Max_Clients'],
+    max_queued=config['Events']['Max_Queued'],
+    heartbeat=config['Events']['Heartbeat']
+)
+host_changes.listeners.append(event_broker.publish_version)
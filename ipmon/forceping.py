@@ -0,0 +1,83 @@
+'''Sondeo forzado desde la interfaz, por lotes y con sondeos compartidos'''
+import os
+import sys
+import time
+import threading
+from concurrent.futures import Future
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import config
+from ipmon.polling import force_poll, force_poll_seconds
+from ipmon.registry import host_registry
+
+# Margen para guardar los resultados, además de lo que tarda el sondeo
+WRITE_GRACE_SECONDS = 10
+
+
+class ForcePinger():
+    '''Sondea hosts a pedido con el motor del ciclo de sondeo.
+
+    Si un host ya tiene un sondeo forzado en curso, o terminó hace menos de
+    ``window`` segundos, las peticiones concurrentes esperan y comparten
+    ese resultado en vez de enviar otro sondeo. La espera de un resultado
+    compartido dura lo que puede tardar el lote que lo está sondeando;
+    si se agota, ``ping`` lanza TimeoutError.
+    '''
+
+    def __init__(self, window=5):
+        self.window = window
+        self._lock = threading.Lock()
+        self._recent = {}  # host_id -> [Future, vencimiento del resultado, plazo del sondeo]
+
+    def ping(self, host_ids):
+        '''Devuelve {host_id: resultado o None si el host no existe}'''
+        host_ids = set(host_ids)
+        now = time.monotonic()
+        deadline = now + force_poll_seconds(len(host_ids)) + WRITE_GRACE_SECONDS
+        futures, mine = {}, {}
+        with self._lock:
+            self._recent = {host_id: entry for host_id, entry in self._recent.items() if entry[1] > now}
+            for host_id in host_ids:
+                entry = self._recent.get(host_id)
+                if entry is None:
+                    entry = self._recent[host_id] = [Future(), float('inf'), deadline]
+                    mine[host_id] = entry[0]
+                futures[host_id] = entry
+
+        if mine:
+            self._probe(mine)
+        return {host_id: future.result(timeout=max(0, due - time.monotonic()))
+                for host_id, (future, expires, due) in futures.items()}
+
+    def _probe(self, mine):
+        try:
+            targets = [(record.id, record.ip_address) for record in host_registry.get_many(mine).values()]
+            results = force_poll(targets)
+            addresses = dict(targets)
+            for host_id, future in mine.items():
+                result = results.get(host_id)
+                future.set_result(None if result is None else {
+                    'id': host_id,
+                    'ip_address': addresses[host_id],
+                    'status': 'Up' if result.is_alive else 'Down',
+                    'avg_rtt': round(result.avg_rtt, 3) if result.is_alive else None
+                })
+        except Exception as e:
+            for future in mine.values():
+                if not future.done():
+                    future.set_exception(e)
+            raise
+        finally:
+            expires = time.monotonic() + self.window
+            with self._lock:
+                for host_id, future in mine.items():
+                    entry = self._recent.get(host_id)
+                    if entry is not None and entry[0] is future:
+                        # Un fallo no se comparte: la próxima petición vuelve a sondear
+                        if future.exception() is None:
+                            entry[1] = expires
+                        else:
+                            del self._recent[host_id]
+
+
+force_pinger = ForcePinger(window=config['Force_Ping']['Window'])
@@ -85,6 +85,14 @@ class PollingConfigForm(FlaskForm):
     interval = StringField('Intervalo de consulta')
     retention_days = StringField('Días de almacenamiento')
     stable_cycles = StringField('Número de ciclos')
+    max_concurrency = StringField('Sondeos simultáneos')
+    packets_per_second = StringField('Paquetes por segundo (0 = sin límite)')
+    subnet_packet_limits = StringField('Límites por subred (red/prefijo=pps, ...; 0 = ninguno)')
+    min_interval = StringField('Intervalo mínimo por host')
+    max_interval = StringField('Intervalo máximo por host')
+    history_mode = SelectField('Modo de historial', choices=[('full', 'Cada sondeo'), ('transitions', 'Solo transiciones')])
+    heartbeat_interval = StringField('Latido del historial (segundos)')
+    rollup_retention_days = StringField('Días de acumulados por hora')
     submit = SubmitField('Actualizar')
 
 class TelegramConfigForm(FlaskForm):
@@ -1,10 +1,10 @@
 '''Modulo Funciones auxiliares'''
 import re
 import io
-import socket
 
-from ipmon.database import AppConfig, Hosts
+from ipmon.database import AppConfig, Hosts, TIME_FORMAT
 from ipmon import app
+from ipmon.dependencies import dependency_graph
 from PIL import Image
 
 
@@ -57,14 +57,16 @@ def get_alert_status_message(alert):
             host.cto or "N/A",
             host.dispositivo or "N/A",
             host.status or "Desconocido",
-            host.last_poll or "N/A"
+            host.last_poll.strftime(TIME_FORMAT) if host.last_poll else "N/A"
         )
-        return message
 
-def get_hostname(ip_address):
-    '''Obtiene el FQDN a partir de una dirección IP'''
-    try:
-        hostname = socket.getfqdn(ip_address)
-    except socket.error:
-        hostname = 'Unknown'
-    return hostname
\ No newline at end of file
+        # Alerta agrupada: los dependientes de un padre caído no alertan por separado
+        if alert.host_status == 'Down':
+            dependents = dependency_graph.unreachable_descendants(host.id)
+            if dependents:
+                names = [h.hostname or h.ip_address for h in Hosts.query.with_entities(
+                    Hosts.hostname, Hosts.ip_address).filter(Hosts.id.in_(dependents[:10]))]
+                message += " <b>{} dispositivos dependientes inalcanzables vía este equipo:</b> {}{}".format(
+                    len(dependents), ", ".join(names), "..." if len(dependents) > 10 else ""
+                )
+        return message
@@ -0,0 +1,115 @@
+'''Historial de estado por periodos (solo transiciones)'''
+import os
+import sys
+import threading
+
+from sqlalchemy import bindparam
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import db, log
+from ipmon.database import HostStatusPeriod, Polling, TIME_FORMAT
+
+
+class StatusPeriods():
+    '''Periodo abierto de cada host, residente en memoria.
+
+    Cada sondeo solo escribe si el estado cambió (cierra el periodo y abre
+    otro) o si pasó ``heartbeat`` segundos desde el último latido escrito
+    (actualiza ``last_seen`` del periodo abierto).
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open = {}  # host_id -> [estado, último latido escrito]
+        self._loaded = False
+
+    def observe(self, host_id, status, when, heartbeat, transitions, heartbeats):
+        '''Registra un sondeo; agrega a ``transitions`` o ``heartbeats`` lo que haya que escribir'''
+        with self._lock:
+            if not self._loaded:
+                self._rebuild()
+
+            current = self._open.get(host_id)
+            if current is None or current[0] != status:
+                self._open[host_id] = [status, when]
+                transitions.append({'b_host_id': host_id, 'b_status': status, 'b_when': when})
+            elif (when - current[1]).total_seconds() >= heartbeat:
+                current[1] = when
+                heartbeats.append({'b_host_id': host_id, 'b_when': when})
+
+    def forget(self, host_id):
+        '''Elimina el periodo abierto de un host borrado'''
+        with self._lock:
+            self._open.pop(host_id, None)
+
+    def invalidate(self):
+        '''Fuerza la recarga de los periodos abiertos en el próximo sondeo'''
+        with self._lock:
+            self._loaded = False
+
+    def _rebuild(self):
+        rows = db.session.query(
+            HostStatusPeriod.host_id, HostStatusPeriod.status, HostStatusPeriod.last_seen
+        ).filter(HostStatusPeriod.ended_at.is_(None)).all()
+        self._open = {host_id: [status, last_seen] for host_id, status, last_seen in rows}
+        self._loaded = True
+        log.info(f"Periodos de estado abiertos cargados para {len(self._open)} hosts")
+
+
+status_periods = StatusPeriods()
+
+
+def write_periods(transitions, heartbeats):
+    '''Cierra y abre periodos por cada transición y actualiza los latidos, sin commit'''
+    table = HostStatusPeriod.__table__
+    open_period = (table.c.host_id == bindparam('b_host_id')) & table.c.ended_at.is_(None)
+
+    if transitions:
+        db.session.execute(table.update().where(open_period).values(ended_at=bindparam('b_when')), transitions)
+        db.session.execute(table.insert().values(
+            host_id=bindparam('b_host_id'),
+            status=bindparam('b_status'),
+            started_at=bindparam('b_when'),
+            last_seen=bindparam('b_when')
+        ), transitions)
+    if heartbeats:
+        db.session.execute(table.update().where(open_period).values(last_seen=bindparam('b_when')), heartbeats)
+
+
+def get_history_mode():
+    '''Modo de historial configurado: 'full' (cada sondeo) o 'transitions' (solo cambios)'''
+    mode = db.session.query(Polling.history_mode).filter_by(id=1).scalar()
+    return mode or 'full'
+
+
+def _period_dict(period):
+    return {
+        'id': period.id,
+        'host_id': period.host_id,
+        'poll_time': period.started_at.strftime(TIME_FORMAT),
+        'poll_status': period.status,
+        'until': period.ended_at.strftime(TIME_FORMAT) if period.ended_at else None,
+        'last_seen': period.last_seen.strftime(TIME_FORMAT)
+    }
+
+
+def read_periods(host_id, start=None, end=None):
+    '''Periodos de un host que se solapan con [start, end), del más antiguo al más reciente'''
+    query = HostStatusPeriod.query.filter(HostStatusPeriod.host_id == host_id)
+    if end is not None:
+        query = query.filter(HostStatusPeriod.started_at < end)
+    if start is not None:
+        query = query.filter((HostStatusPeriod.ended_at.is_(None)) | (HostStatusPeriod.ended_at > start))
+    return [_period_dict(period) for period in query.order_by(HostStatusPeriod.started_at)]
+
+
+def status_at(host_id, when):
+    '''Estado de un host en el instante ``when`` (None si no hay datos)'''
+    period = HostStatusPeriod.query.filter(
+        HostStatusPeriod.host_id == host_id,
+        HostStatusPeriod.started_at <= when
+    ).order_by(HostStatusPeriod.started_at.desc()).first()
+
+    if period is None or (period.ended_at is not None and period.ended_at <= when):
+        return None
+    return _period_dict(period)
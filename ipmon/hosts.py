@@ -2,8 +2,6 @@
 import os
 import sys
 import ipaddress
-import platform
-import subprocess
 import json
 import cv2
 from multiprocessing.pool import ThreadPool
@@ -11,11 +9,23 @@ from multiprocessing.pool import ThreadPool
 import flask_login
 from flask import Blueprint, flash, redirect, render_template, request, url_for, jsonify, current_app, copy_current_request_context
 
-from ipmon import db, log
-from ipmon.api import get_all_hosts
-from ipmon.database import HostAlerts, Hosts, PollHistory, Images
+from ipmon import db, log, config
+from ipmon.database import HostAlerts, Hosts, PollHistory, Images, HostMetrics, HostStatusPeriod, HostRollup
 from ipmon.forms import AddHostsForm
 from ipmon.polling import _poll_hosts_threaded, poll_host
+from ipmon.stability import stability_tracker
+from ipmon.dependencies import dependency_graph
+from ipmon.history import status_periods
+from ipmon.latency import latency_buffer
+from ipmon.rollups import rollup_buffer
+from ipmon.metrics import RTSP_CAPTURE_SECONDS, RTSP_CAPTURE_FAILURES
+from ipmon.writer import db_writer
+from ipmon.imagenes import replace_image_record
+from ipmon.resolver import resolve_host_later
+from ipmon.forceping import force_pinger
+from ipmon.changes import host_changes
+from ipmon.datatables import host_tipos
+from ipmon.registry import host_registry
 
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
 
@@ -28,8 +38,8 @@ hosts = Blueprint('hosts', __name__)
 # Listar hosts 
 @hosts.route('/')
 def index():
-    hosts_list = Hosts.query.all()
-    return render_template('index.html', hosts=hosts_list)
+    # La tabla del panel carga los hosts desde /hosts
+    return render_template('index.html')
 
 # Agregar hosts 
 @hosts.route('/addHosts', methods=['GET', 'POST'])
@@ -83,6 +93,7 @@ def add_hosts():
 
             pool.close()
             pool.join()
+            dependency_graph.invalidate()
 
             for thread in threads:
                 try:
@@ -105,10 +116,10 @@ def add_hosts():
 @flask_login.login_required
 def update_hosts():
     if request.method == 'GET':
-        hosts_list = json.loads(get_all_hosts())
-        tipos = sorted({h.get("tipo").strip() for h in hosts_list if h.get("tipo") and h.get("tipo").strip() != ""})
+        # Las filas las pide la tabla a /hostsDataTable, por página
+        tipos = host_tipos()
         log.info(f"Tipos disponibles para filtro: {tipos}")
-        return render_template("updateHosts.html", hosts=hosts_list, tipos=tipos)
+        return render_template("updateHosts.html", has_hosts=len(host_registry) > 0, tipos=tipos)
 
     elif request.method == 'POST':
         results = request.form.to_dict()
@@ -118,13 +129,22 @@ def update_hosts():
             old_ip = host.ip_address
             old_tipo = host.tipo
 
-            host.hostname = results.get('hostname') or host.hostname
+            if results.get('hostname') and results['hostname'] != host.hostname:
+                host.hostname = results['hostname']
+                host.hostname_auto = False
             host.ip_address = results.get('ip_address') or host.ip_address
             host.ciudad = results.get('ciudad') or host.ciudad
             host.cto = results.get('cto') or host.cto
             host.dispositivo = results.get('dispositivo') or host.dispositivo
             host.tipo = results.get('tipo') or host.tipo
 
+            parent_id = results.get('parent_id', '').strip()
+            if parent_id:
+                parent_id = int(parent_id)
+                if parent_id and (parent_id == host.id or not Hosts.query.get(parent_id)):
+                    raise ValueError(f'host padre {parent_id} no válido')
+                host.parent_id = parent_id or None
+
             manual_url = results.get('snapshot_url', '').strip()
             if manual_url:
                 host.snapshot_url = manual_url
@@ -136,6 +156,9 @@ def update_hosts():
                 host.alerts_enabled = results['alerts'] == 'True'
 
             db.session.commit()
+            host_registry.refresh([host.id])
+            host_changes.changed([host.id])
+            dependency_graph.invalidate()
             flash(f'Dispositivo actualizado correctamente: {host.hostname}', 'success')
 
         except Exception as e:
@@ -163,6 +186,10 @@ def _delete_host_with_dependencies(host):
         # Eliminar dependencias en BD
         PollHistory.query.filter_by(host_id=host.id).delete()
         HostAlerts.query.filter_by(host_id=host.id).delete()
+        HostMetrics.query.filter_by(host_id=host.id).delete()
+        HostStatusPeriod.query.filter_by(host_id=host.id).delete()
+        HostRollup.query.filter_by(host_id=host.id).delete()
+        Hosts.query.filter_by(parent_id=host.id).update({'parent_id': None})
         Images.query.filter_by(host_id=host.id).delete()
         Hosts.query.filter_by(id=host.id).delete()
 
@@ -171,6 +198,17 @@ def _delete_host_with_dependencies(host):
         log.error(f"Error eliminando host {host.hostname}: {e}")
         return False
 
+def _forget_deleted_hosts(host_ids):
+    """Quita del estado en memoria los hosts borrados; solo después de un commit exitoso."""
+    host_registry.remove(host_ids)
+    host_changes.deleted(host_ids)
+    for host_id in host_ids:
+        stability_tracker.forget(host_id)
+        dependency_graph.forget(host_id)
+        status_periods.forget(host_id)
+    latency_buffer.forget(host_ids)
+    rollup_buffer.forget(host_ids)
+
 # Eliminar hosts
 @hosts.route('/deleteHost', methods=['POST'])
 @flask_login.login_required
@@ -183,7 +221,14 @@ def delete_host():
         return redirect(url_for('hosts.update_hosts'))
 
     if _delete_host_with_dependencies(host):
-        db.session.commit()
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            log.error(f"Error eliminando host {results['hostname']}: {e}")
+            flash(f"❌ No se pudo eliminar el dispositivo {results['hostname']}", "danger")
+            return redirect(url_for('hosts.update_hosts'))
+        _forget_deleted_hosts([host_id])
         flash(f"✅ Dispositivo eliminado exitosamente: {results['hostname']}", "success")
         cleanup_orphan_images()
     else:
@@ -200,9 +245,11 @@ def delete_all_hosts():
         for host in all_hosts:
             _delete_host_with_dependencies(host)
         db.session.commit()
+        _forget_deleted_hosts([host.id for host in all_hosts])
         flash("✅ Todos los hosts fueron eliminados correctamente.", "success")
         cleanup_orphan_images()
     except Exception as e:
+        db.session.rollback()
         flash(f"❌ Error al eliminar todos los hosts: {e}", "danger")
     return redirect(url_for('hosts.update_hosts'))
 
@@ -222,9 +269,11 @@ def delete_visible_hosts():
                 _delete_host_with_dependencies(host)
 
         db.session.commit()
+        _forget_deleted_hosts([int(host_id) for host_id in ids])
         flash(f"✅ Se eliminaron {len(ids)} hosts visibles.", "success")
         cleanup_orphan_images()
     except Exception as e:
+        db.session.rollback()
         flash(f"❌ Error al eliminar hosts visibles: {e}", "danger")
 
     return redirect(url_for('hosts.update_hosts'))
@@ -232,30 +281,54 @@ def delete_visible_hosts():
 # Forzar ping a host
 @hosts.route('/forzar_ping/<int:host_id>', methods=['GET'])
 def forzar_ping(host_id):
-    host = Hosts.query.get_or_404(host_id)
     try:
-        if platform.system().lower() == 'windows':
-            comando = ['ping', '-n', '1', '-w', '1000', host.ip_address]
-        else:
-            comando = ['ping', '-c', '1', '-W', '1', host.ip_address]
+        result = force_pinger.ping([host_id])[host_id]
+        if result is None:
+            return jsonify({"success": False, "message": f"Host {host_id} no encontrado"}), 404
 
-        response = subprocess.run(comando, capture_output=True, text=True)
-        salida = response.stdout.lower()
-
-        if platform.system().lower() == 'windows':
-            exito = "ttl=" in salida
+        if result['status'] == 'Up':
+            return jsonify({"success": True, "message": f"Ping exitoso a {result['ip_address']}", "result": result}), 200
         else:
-            exito = (response.returncode == 0)
+            return jsonify({"success": False, "message": f"❌ Error al hacer ping a {result['ip_address']}", "result": result}), 400
 
-        if exito:
-            return jsonify({"success": True, "message": f"Ping exitoso a {host.ip_address}"}), 200
-        else:
-            return jsonify({"success": False, "message": f"❌ Error al hacer ping a {host.ip_address}"}), 400
+    except TimeoutError:
+        log.warning(f"forzar_ping para host {host_id}: el sondeo compartido no terminó a tiempo")
+        return jsonify({"success": False, "message": "El sondeo en curso no terminó a tiempo, intente de nuevo"}), 504
+    except Exception as e:
+        log.error(f"Error en forzar_ping para host {host_id}: {e}")
+        return jsonify({"success": False, "message": f"Excepción al hacer ping: {e}"}), 500
 
+# Forzar ping a varios hosts (p. ej. las filas visibles) en una sola petición
+@hosts.route('/forzar_ping', methods=['POST'])
+def forzar_ping_lote():
+    data = request.get_json(silent=True) or {}
+    try:
+        ids = [int(host_id) for host_id in data.get('ids', [])]
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "ids debe ser una lista de ids de host"}), 400
+    if not ids:
+        return jsonify({"success": False, "message": "No se recibieron hosts"}), 400
+    if len(ids) > config['Force_Ping']['Max_Hosts']:
+        return jsonify({"success": False, "message": f"Máximo {config['Force_Ping']['Max_Hosts']} hosts por petición"}), 400
+
+    try:
+        results = force_pinger.ping(ids)
+    except TimeoutError:
+        log.warning(f"forzar_ping para {len(ids)} hosts: el sondeo compartido no terminó a tiempo")
+        return jsonify({"success": False, "message": "El sondeo en curso no terminó a tiempo, intente de nuevo"}), 504
     except Exception as e:
-        log.error(f"Error en forzar_ping para host {host.ip_address}: {e}")
+        log.error(f"Error en forzar_ping para {len(ids)} hosts: {e}")
         return jsonify({"success": False, "message": f"Excepción al hacer ping: {e}"}), 500
 
+    found = [result for result in results.values() if result is not None]
+    return jsonify({
+        "success": True,
+        "up": sum(1 for result in found if result['status'] == 'Up'),
+        "down": sum(1 for result in found if result['status'] == 'Down'),
+        "missing": sorted(host_id for host_id, result in results.items() if result is None),
+        "results": sorted(found, key=lambda result: result['id'])
+    }), 200
+
 
 ######################
 # Funciones Privadas ##
@@ -265,28 +338,33 @@ def _add_hosts_threaded(app, ip_address, hostname, ciudad, cto, dispositivo, tip
     with app.app_context():
         # Obtener estado inicial del host
         status, current_time, resolved_hostname = poll_host(ip_address, new_host=True)
-        hostname = hostname if hostname else resolved_hostname
+        hostname_auto = not hostname
+        hostname = hostname or resolved_hostname or ip_address
 
         # Crear el host
-        new_host = Hosts(
+        host_id, snapshot_url = db_writer.run(_insert_host, dict(
             ip_address=ip_address,
             hostname=hostname,
+            hostname_auto=hostname_auto,
             ciudad=ciudad,
             cto=cto,
             dispositivo=dispositivo,
             tipo=tipo,
             status=status,
             last_poll=current_time
-        )
-        db.session.add(new_host)
-        db.session.commit()
+        ))
+        host_registry.refresh([host_id])
+        host_changes.changed([host_id])
+        if hostname_auto and not resolved_hostname:
+            resolve_host_later(host_id, ip_address)
 
         # Captura snapshot si existe URL
-        if new_host.snapshot_url:
+        if snapshot_url:
             try:
-                cap = cv2.VideoCapture(new_host.snapshot_url)
-                ret, frame = cap.read()
-                cap.release()
+                with RTSP_CAPTURE_SECONDS.time(source='alta'):
+                    cap = cv2.VideoCapture(snapshot_url)
+                    ret, frame = cap.read()
+                    cap.release()
 
                 if ret:
                     safe_hostname = "".join(c for c in hostname if c.isalnum() or c in ("-", "_")).rstrip()
@@ -299,19 +377,26 @@ def _add_hosts_threaded(app, ip_address, hostname, ciudad, cto, dispositivo, tip
                     cv2.imwrite(absolute_file_path, frame)
 
                     relative_path = os.path.join("images", "hosts", file_name).replace("\\", "/")
-                    img_record = Images(file_path=relative_path, host_id=new_host.id)
-                    db.session.add(img_record)
-                    db.session.commit()
+                    db_writer.run(replace_image_record, host_id, relative_path)
 
                     log.info(f"Snapshot capturado para {ip_address}: {relative_path}")
                 else:
+                    RTSP_CAPTURE_FAILURES.inc(source='alta')
                     log.warning(f"No se pudo capturar frame de {ip_address}")
             except Exception as e:
                 log.error(f"Error al capturar snapshot de {ip_address}: {e}")
         else:
             log.warning(f"Host {ip_address} no tiene snapshot_url definido")
 
-        return {"ip_address": new_host.ip_address, "hostname": new_host.hostname}
+        return {"ip_address": ip_address, "hostname": hostname}
+
+
+def _insert_host(fields):
+    '''Crea un host en el hilo escritor; devuelve su id y su snapshot_url'''
+    new_host = Hosts(**fields)
+    db.session.add(new_host)
+    db.session.flush()
+    return new_host.id, new_host.snapshot_url
 
 
 def cleanup_orphan_images():
@@ -1,11 +1,17 @@
 import os
 import cv2
+import json
 import threading
 import schedule
 import time
 from datetime import datetime
+from sqlalchemy import case, exists, func
 from ipmon import db
 from ipmon.database import Hosts, Images, SchedulerConfig
+from ipmon.datatables import parse_request, host_page, host_tipos
+from ipmon.registry import host_registry
+from ipmon.metrics import RTSP_CAPTURE_SECONDS, RTSP_CAPTURE_FAILURES
+from ipmon.writer import db_writer
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from werkzeug.utils import secure_filename
 
@@ -21,9 +27,44 @@ IMAGE_DIR = os.path.join("static", "images", "hosts")
 # Listar hosts e imágenes
 @imagenes_blueprint.route("/")
 def listar_hosts():
-    hosts = Hosts.query.all()
-    tipos = sorted({host.tipo for host in hosts if host.tipo and host.tipo.strip() != ""})
-    return render_template("imagenes.html", hosts=hosts, tipos=tipos)
+    # Las filas las pide la tabla a /imagenes/datatable, por página
+    return render_template("imagenes.html", has_hosts=len(host_registry) > 0, tipos=host_tipos())
+
+# Orden de la tabla: hosts con imagen primero; tipos Camara, SafeCity y NVR antes que el resto
+IMAGE_ORDER_COLUMNS = {
+    'image': [case((exists().where(Images.host_id == Hosts.id), 0), else_=1)],
+    'tipo': [case((Hosts.tipo == 'Camara', 0), (Hosts.tipo == 'SafeCity', 1), (Hosts.tipo == 'NVR', 2), else_=3),
+             func.lower(Hosts.tipo)]
+}
+
+@imagenes_blueprint.route("/datatable")
+def hosts_datatable():
+    '''Hosts con su imagen para DataTables, paginados del lado del servidor'''
+    params = parse_request(request.args)
+    total, records_filtered, hosts = host_page(params, order_columns=IMAGE_ORDER_COLUMNS,
+                                               default_order=('image', 'tipo'))
+
+    # Primera imagen de cada host de la página, en una sola consulta
+    images = {}
+    for host_id, file_path in db.session.query(Images.host_id, Images.file_path).filter(
+            Images.host_id.in_([host.id for host in hosts])).order_by(Images.id):
+        images.setdefault(host_id, url_for('static', filename=file_path))
+
+    return json.dumps({
+        "draw": params['draw'],
+        "recordsTotal": total,
+        "recordsFiltered": records_filtered,
+        "data": [{
+            "id": host.id,
+            "hostname": host.hostname,
+            "ip_address": host.ip_address,
+            "ciudad": host.ciudad,
+            "cto": host.cto,
+            "tipo": host.tipo,
+            "snapshot_url": host.snapshot_url,
+            "image": images.get(host.id)
+        } for host in hosts]
+    })
 
 # Subida manual
 @imagenes_blueprint.route("/<int:host_id>/subir", methods=["POST"])
@@ -76,16 +117,19 @@ def capturar_imagen(host_id):
         return redirect(url_for("imagenes.listar_hosts"))
 
     try:
-        cap = cv2.VideoCapture(host.snapshot_url)
+        with RTSP_CAPTURE_SECONDS.time(source='manual'):
+            cap = cv2.VideoCapture(host.snapshot_url)
 
-        if not cap.isOpened():
-            flash(f"❌ No se pudo abrir la URL RTSP: {host.snapshot_url}", "error")
-            return redirect(url_for("imagenes.listar_hosts"))
+            if not cap.isOpened():
+                RTSP_CAPTURE_FAILURES.inc(source='manual')
+                flash(f"❌ No se pudo abrir la URL RTSP: {host.snapshot_url}", "error")
+                return redirect(url_for("imagenes.listar_hosts"))
 
-        ret, frame = cap.read()
-        cap.release()
+            ret, frame = cap.read()
+            cap.release()
 
         if not ret or frame is None:
+            RTSP_CAPTURE_FAILURES.inc(source='manual')
             flash(f"❌ No se pudo capturar un frame desde RTSP: {host.snapshot_url}", "error")
             return redirect(url_for("imagenes.listar_hosts"))
 
@@ -138,6 +182,12 @@ def eliminar_imagen(host_id):
     return redirect(url_for("imagenes.listar_hosts"))
 
 
+def replace_image_record(host_id, relative_path):
+    '''Reemplaza el registro de imagen de un host (trabajo del hilo escritor, sin commit)'''
+    Images.query.filter_by(host_id=host_id).delete()
+    db.session.add(Images(file_path=relative_path, host_id=host_id))
+
+
 # Captura automática diaria
 def captura_diaria():
     from ipmon import app
@@ -149,14 +199,19 @@ def captura_diaria():
                     print(f"❌ Host {host.hostname or host.ip_address} no tiene snapshot_url")
                     continue
 
-                cap = cv2.VideoCapture(host.snapshot_url)
-                if not cap.isOpened():
+                with RTSP_CAPTURE_SECONDS.time(source='diaria'):
+                    cap = cv2.VideoCapture(host.snapshot_url)
+                    opened = cap.isOpened()
+                    if opened:
+                        ret, frame = cap.read()
+                        cap.release()
+                if not opened:
+                    RTSP_CAPTURE_FAILURES.inc(source='diaria')
                     print(f"❌ No se pudo abrir RTSP de {host.hostname or host.ip_address}")
                     continue
 
-                ret, frame = cap.read()
-                cap.release()
                 if not ret or frame is None:
+                    RTSP_CAPTURE_FAILURES.inc(source='diaria')
                     print(f"❌ No se pudo capturar imagen de {host.hostname or host.ip_address}")
                     continue
 
@@ -173,14 +228,10 @@ def captura_diaria():
                     old_path = os.path.join(current_app.root_path, 'static', existing_img.file_path.replace("/", os.sep))
                     if os.path.exists(old_path):
                         os.remove(old_path)
-                    db.session.delete(existing_img)
-                    db.session.commit()
 
                 cv2.imwrite(absolute_path, frame)
                 relative_path = os.path.join("images", "hosts", file_name).replace("\\", "/")
-                img_record = Images(file_path=relative_path, host_id=host.id)
-                db.session.add(img_record)
-                db.session.commit()
+                db_writer.run(replace_image_record, host.id, relative_path)
 
                 print(f"✅ Imagen capturada para {host.hostname or host.ip_address} a las {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
@@ -0,0 +1,121 @@
+'''Almacenamiento compacto de métricas de latencia (RTT, jitter y pérdida)'''
+import os
+import sys
+import struct
+import threading
+from datetime import timedelta
+
+from sqlalchemy import cast, LargeBinary
+from sqlalchemy.dialects.sqlite import insert
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import db
+from ipmon.database import HostMetrics
+from ipmon.writer import db_writer
+
+# Muestra de ancho fijo: segundo dentro de la hora, RTT promedio, mínimo y
+# máximo, jitter (ms, float32) y pérdida de paquetes (%)
+SAMPLE = struct.Struct('<HffffB')
+
+
+def _hour_of(when):
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+def _unpack(period_start, samples, start, end):
+    '''Desempaqueta las muestras de un bloque dentro de [start, end)'''
+    metrics = []
+    for offset, avg_rtt, min_rtt, max_rtt, jitter, packet_loss in SAMPLE.iter_unpack(samples):
+        sampled_at = period_start + timedelta(seconds=offset)
+        if start <= sampled_at < end:
+            metrics.append({
+                'time': sampled_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'avg_rtt': round(avg_rtt, 3),
+                'min_rtt': round(min_rtt, 3),
+                'max_rtt': round(max_rtt, 3),
+                'jitter': round(jitter, 3),
+                'packet_loss': packet_loss
+            })
+    return metrics
+
+
+class LatencyBuffer():
+    '''Acumula en memoria las muestras aún no guardadas, por host y por hora'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chunks = {}  # (host_id, inicio de la hora) -> bytearray
+
+    def add(self, host_id, result, sampled_at):
+        '''Agrega una muestra a partir de un resultado de icmplib'''
+        period_start = _hour_of(sampled_at)
+        sample = SAMPLE.pack(
+            int((sampled_at - period_start).total_seconds()),
+            result.avg_rtt,
+            result.min_rtt,
+            result.max_rtt,
+            result.jitter,
+            round(result.packet_loss * 100)
+        )
+        with self._lock:
+            self._chunks.setdefault((host_id, period_start), bytearray()).extend(sample)
+
+    def drain(self):
+        '''Devuelve y vacía las muestras pendientes'''
+        with self._lock:
+            chunks, self._chunks = self._chunks, {}
+        return chunks
+
+    def forget(self, host_ids):
+        '''Descarta las muestras pendientes de hosts borrados'''
+        host_ids = set(host_ids)
+        with self._lock:
+            self._chunks = {key: samples for key, samples in self._chunks.items() if key[0] not in host_ids}
+
+    def pending(self, host_id):
+        '''Devuelve [(inicio de la hora, muestras)] pendientes de un host'''
+        with self._lock:
+            return [(period_start, bytes(samples))
+                    for (chunk_host, period_start), samples in self._chunks.items()
+                    if chunk_host == host_id]
+
+
+latency_buffer = LatencyBuffer()
+
+
+def flush_latency_samples():
+    '''Agrega las muestras pendientes al bloque de cada host/hora; devuelve los bloques escritos'''
+    chunks = latency_buffer.drain()
+    if not chunks:
+        return 0
+
+    db_writer.run(_write_samples, chunks)
+    return len(chunks)
+
+
+def _write_samples(chunks):
+    table = HostMetrics.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.host_id, table.c.period_start],
+        set_={'samples': cast(table.c.samples.op('||')(stmt.excluded.samples), LargeBinary)}
+    )
+    db.session.execute(stmt, [
+        {'host_id': host_id, 'period_start': period_start, 'samples': bytes(samples)}
+        for (host_id, period_start), samples in chunks.items()
+    ])
+
+
+def read_latency(host_id, start, end):
+    '''Devuelve las métricas de latencia de un host en [start, end), ordenadas por tiempo'''
+    blocks = db.session.query(HostMetrics.period_start, HostMetrics.samples).filter(
+        HostMetrics.host_id == host_id,
+        HostMetrics.period_start >= _hour_of(start),
+        HostMetrics.period_start < end
+    ).order_by(HostMetrics.period_start).all()
+
+    metrics = []
+    for period_start, samples in list(blocks) + latency_buffer.pending(host_id):
+        metrics.extend(_unpack(period_start, samples, start, end))
+    metrics.sort(key=lambda m: m['time'])
+    return metrics
@@ -2,11 +2,13 @@
 import os
 import sys
 import json
+import time
 import atexit
 
 import flask_login
 from flask import Blueprint, render_template, request, flash, redirect, url_for, send_from_directory
 from werkzeug.exceptions import HTTPException
+from sqlalchemy.exc import OperationalError
 
 from ipmon.imagenes import reload_schedule
 
@@ -15,8 +17,10 @@ from ipmon import db, app, scheduler, config, log
 from ipmon.api import get_web_themes, get_polling_config, get_active_theme
 from ipmon.database import Polling, SchedulerConfig, WebThemes,AppConfig
 from ipmon.forms import PollingConfigForm, UpdatePasswordForm, UpdateEmailForm, TelegramConfigForm
-from ipmon.polling import update_poll_scheduler, add_poll_history_cleanup_cron
+from ipmon.polling import update_poll_scheduler, add_poll_history_cleanup_cron, add_latency_flush_job, _latency_flush_task
 from ipmon.alerts import update_host_status_alert_schedule
+from ipmon.resolver import add_hostname_refresh_job
+from ipmon.engine import parse_subnet_limits
 from wtforms.validators import NumberRange
 
 main = Blueprint('main', __name__)
@@ -29,10 +33,46 @@ def webapp_init():
     for cls in HTTPException.__subclasses__():
         app.register_error_handler(cls, handle_error)
 
-    if not database_configured():
+    if not database_configured() or running_db_command():
         return
 
-    init_schedulers()
+    global _schedulers_pending
+    _schedulers_pending = not _try_init_schedulers()
+
+
+# Jobs sin registrar porque la base todavía no tiene el esquema que lee el código
+_schedulers_pending = False
+
+def running_db_command():
+    '''Indica si la aplicación se importó para ``flask db`` (migraciones)
+
+    Al migrar no se lee la configuración de sondeo ni se inician jobs: la
+    base todavía no tiene las columnas que el código consulta.
+    '''
+    command = sys.argv[0]
+    return sys.argv[1:2] == ['db'] and (
+        os.path.basename(command).startswith('flask') or os.path.basename(os.path.dirname(command)) == 'flask')
+
+def _try_init_schedulers(warn=True):
+    '''Registra los jobs; devuelve False si el esquema de la base está desactualizado'''
+    try:
+        init_schedulers()
+        return True
+    except OperationalError as e:
+        db.session.rollback()
+        if warn:
+            log.warning(f"La base no está al día ({e.orig}); ejecute 'flask db upgrade'. "
+                        "Los jobs se registrarán cuando termine la migración")
+        return False
+
+def init_pending_schedulers(retry_seconds=10):
+    '''Registra los jobs diferidos por un esquema desactualizado, reintentando hasta que la base se migre'''
+    global _schedulers_pending
+    while _schedulers_pending:
+        time.sleep(retry_seconds)
+        with app.app_context():
+            _schedulers_pending = not _try_init_schedulers(warn=False)
+    log.debug('Jobs de sondeo registrados')
 
 #####################
 # Rutas de la App #######
@@ -112,6 +152,7 @@ def configure_polling():
     if request.method == 'GET':
         polling_config = json.loads(get_polling_config())
         app_config = AppConfig.query.first()
+        form.history_mode.data = polling_config['history_mode']
         return render_template(
             'pollingConfig.html',
             polling_config=polling_config,
@@ -131,17 +172,41 @@ def configure_polling():
                     polling_config.history_truncate_days = int(form.retention_days.data)
                 if form.stable_cycles.data:
                     app_config.stable_cycles = int(form.stable_cycles.data)
+                if form.max_concurrency.data:
+                    polling_config.max_concurrency = int(form.max_concurrency.data)
+                if form.packets_per_second.data:
+                    polling_config.packets_per_second = int(form.packets_per_second.data)
+                if form.subnet_packet_limits.data:
+                    limits = form.subnet_packet_limits.data.strip()
+                    if limits == '0':
+                        limits = ''
+                    try:
+                        parse_subnet_limits(limits)
+                    except ValueError as e:
+                        flash(f'Límites por subred no válidos: {e}', 'danger')
+                        return redirect(url_for('main.configure_polling'))
+                    polling_config.subnet_packet_limits = limits
+                if form.min_interval.data:
+                    polling_config.min_poll_interval = int(form.min_interval.data)
+                if form.max_interval.data:
+                    polling_config.max_poll_interval = int(form.max_interval.data)
+                if form.history_mode.data:
+                    polling_config.history_mode = form.history_mode.data
+                if form.heartbeat_interval.data:
+                    polling_config.heartbeat_interval = int(form.heartbeat_interval.data)
+                if form.rollup_retention_days.data:
+                    polling_config.rollup_retention_days = int(form.rollup_retention_days.data)
 
                 db.session.commit()
 
                 # ⚡ Actualizar el scheduler en caliente
                 if form.interval.data:
                     new_interval = int(form.interval.data)
-                    update_poll_scheduler(new_interval)
+                    update_poll_scheduler(new_interval, polling_config.min_poll_interval)
                     log.info(f" Intervalo de sondeo actualizado dinámicamente a {new_interval} segundos.")
                 else:
                     current_interval = polling_config.poll_interval
-                    update_poll_scheduler(current_interval)
+                    update_poll_scheduler(current_interval, polling_config.min_poll_interval)
                     log.info(f" Reprogramado con intervalo actual de {current_interval} segundos (sin cambios).")
 
                 flash('Intervalo de sondeo actualizado correctamente', 'success')
@@ -172,10 +237,14 @@ def handle_error(error):
 
 def init_schedulers():
     # Register scheduler jobs
-    update_poll_scheduler(int(json.loads(get_polling_config())['poll_interval']))
+    polling_config = json.loads(get_polling_config())
+    update_poll_scheduler(int(polling_config['poll_interval']), polling_config['min_poll_interval'])
     update_host_status_alert_schedule(int(json.loads(get_polling_config())['poll_interval']) / 2)
     add_poll_history_cleanup_cron()
+    add_latency_flush_job()
+    add_hostname_refresh_job()
     atexit.register(scheduler.shutdown)
+    atexit.register(_latency_flush_task)
 
 ##########################
 # Custom Jinja Functions #
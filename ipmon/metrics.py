@@ -0,0 +1,180 @@
+'''Métricas en memoria expuestas en formato de texto de Prometheus'''
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Métricas registradas, en orden de exposición
+REGISTRY = []
+
+# Buckets por defecto en segundos
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for dummy, v in pairs)
+    return '{' + ','.join('{}="{}"'.format(name, value) for (name, dummy), value in zip(pairs, escaped)) + '}'
+
+
+class _Metric():
+    '''Base de las métricas: un valor por combinación de etiquetas.
+
+    Cada actualización toma un lock propio sin contención entre métricas,
+    solo para sumar un número; la exposición copia los valores bajo el mismo
+    lock y formatea fuera de él.
+    '''
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {} if self.labelnames or self.kind == 'histogram' else {(): 0}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError('{} requiere las etiquetas {}'.format(self.name, self.labelnames))
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation),
+                 '# TYPE {} {}'.format(self.name, self.kind)]
+        for key, value in sorted(self._samples()):
+            lines.append('{}{} {}'.format(self.name, _format_labels(self.labelnames, key), _format_value(value)))
+        return lines
+
+
+class Counter(_Metric):
+    '''Contador monótono'''
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    '''Valor que sube y baja'''
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def replace(self, values):
+        '''Reemplaza todos los valores: {tupla de etiquetas: valor}'''
+        values = {tuple(str(v) for v in key): value for key, value in values.items()}
+        with self._lock:
+            self._values = values
+
+
+class Histogram(_Metric):
+    '''Distribución de observaciones en buckets acumulados'''
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        '''Observa la duración del bloque en segundos'''
+        s = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - s, **labels)
+
+    def _samples(self):
+        with self._lock:
+            return [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation),
+                 '# TYPE {} histogram'.format(self.name)]
+        for key, (counts, total, count) in sorted(self._samples()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append('{}_bucket{} {}'.format(
+                    self.name, _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))]), cumulative))
+            labels = _format_labels(self.labelnames, key)
+            lines.append('{}_sum{} {}'.format(self.name, labels, _format_value(total)))
+            lines.append('{}_count{} {}'.format(self.name, labels, count))
+        return lines
+
+
+def generate_latest():
+    '''Devuelve todas las métricas en formato de exposición de texto'''
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ==============================
+# Métricas de la aplicación
+# ==============================
+HOSTS = Gauge('ipmon_hosts', 'Hosts por estado', ['status'])
+ALERT_QUEUE_DEPTH = Gauge('ipmon_alert_queue_depth', 'Alertas pendientes de envío')
+
+POLL_CYCLES = Counter('ipmon_poll_cycles_total', 'Ciclos de sondeo completados')
+POLL_OVERRUNS = Counter('ipmon_poll_overruns_total', 'Ciclos de sondeo que superaron su plazo')
+POLL_SKIPPED = Counter('ipmon_poll_skipped_runs_total', 'Ejecuciones de sondeo omitidas por un ciclo en curso')
+POLL_DEFERRED = Counter('ipmon_poll_deferred_hosts_total', 'Hosts vencidos diferidos para cumplir el plazo del ciclo')
+POLL_CYCLE_SECONDS = Histogram('ipmon_poll_cycle_seconds', 'Duración de los ciclos de sondeo')
+POLL_PHASE_SECONDS = Histogram('ipmon_poll_phase_seconds', 'Duración por fase de los ciclos de sondeo', ['phase'])
+PROBES_SENT = Counter('ipmon_probes_sent_total', 'Sondeos ICMP enviados')
+PROBES_LOST = Counter('ipmon_probes_lost_total', 'Sondeos ICMP sin respuesta')
+PROBE_PACING_PPS = Gauge('ipmon_probe_pacing_pps', 'Paquetes por segundo del último ciclo: objetivo, logrado y pico', ['kind'])
+PROBE_PACING_WAIT_SECONDS = Counter('ipmon_probe_pacing_wait_seconds_total', 'Espera acumulada impuesta por el pacer a los sondeos')
+DB_COMMIT_SECONDS = Histogram('ipmon_db_commit_seconds', 'Latencia de los commits de escritura', ['operation'])
+DB_WRITER_QUEUE_DEPTH = Gauge('ipmon_db_writer_queue_depth', 'Escrituras en cola del hilo escritor')
+DB_WRITER_GROUP_JOBS = Histogram('ipmon_db_writer_group_jobs', 'Escrituras confirmadas por commit agrupado',
+                                 buckets=(1, 2, 4, 8, 16, 32, 64))
+
+EVENT_CLIENTS = Gauge('ipmon_event_clients', 'Clientes conectados al canal de eventos en vivo')
+EVENTS_DROPPED = Counter('ipmon_events_dropped_total', 'Colas de clientes de eventos vaciadas por desborde')
+
+ALERT_DELIVERY_SECONDS = Histogram('ipmon_alert_delivery_seconds', 'Latencia de envío de alertas por canal', ['channel'])
+ALERT_DELIVERY_FAILURES = Counter('ipmon_alert_delivery_failures_total', 'Envíos de alertas fallidos por canal', ['channel'])
+
+RTSP_CAPTURE_SECONDS = Histogram('ipmon_rtsp_capture_seconds', 'Duración de las capturas RTSP', ['source'])
+RTSP_CAPTURE_FAILURES = Counter('ipmon_rtsp_capture_failures_total', 'Capturas RTSP fallidas', ['source'])
+
+RETENTION_DELETED_ROWS = Counter('ipmon_retention_deleted_rows_total', 'Filas de historial borradas por retención', ['table'])
@@ -4,41 +4,91 @@ import sys
 import time
 import json
 
-from datetime import date, timedelta
-from icmplib import multiping, ping
-from ipmon import app, db, scheduler, log
-from ipmon.database import Hosts, PollHistory, HostAlerts
-from ipmon.api import get_all_hosts, get_host, get_polling_config, get_poll_history
-from ipmon.helpers import get_stable_cycles, get_hostname 
+from datetime import datetime
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES
+from ipmon import app, db, scheduler, log, config
+from ipmon.database import Hosts, PollHistory, HostAlerts, TIME_FORMAT
+from ipmon.api import get_polling_config
+from ipmon.helpers import get_stable_cycles
+from ipmon.stability import stability_tracker
+from ipmon.engine import poll_inventory, poll_inventory_sharded, parse_subnet_limits, expected_seconds, ProbeResult
+from ipmon.scheduling import host_scheduler
+from ipmon.latency import latency_buffer, flush_latency_samples
+from ipmon.probes import get_backend
+from ipmon.pollstats import PollCycleStats, poll_monitor
+from ipmon.dependencies import dependency_graph
+from ipmon.metrics import PROBES_SENT, PROBES_LOST, DB_COMMIT_SECONDS
+from ipmon.history import status_periods, write_periods
+from ipmon.rollups import rollup_buffer, flush_rollups
+from ipmon.retention import run_retention
+from ipmon.writer import db_writer
+from ipmon.resolver import dns_resolver
+from ipmon.changes import host_changes
+from ipmon.events import event_broker
+from ipmon.registry import host_registry
 
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
 
 # --- FUNCION DE COMPATIBILIDAD (para agregar/verificar un solo host) ---
 def poll_host(host, new_host=False, count=1):
-    """Sondea un host individual usando icmplib"""
+    """Sondea un host individual con el backend de sondeo configurado"""
     hostname = None
     try:
-        res = ping(host, count=count, timeout=1, interval=0.2)
+        res = get_backend().ping(host, count=count, timeout=1, interval=0.2)
         status = 'Up' if res.is_alive else 'Down'
         if new_host:
-            hostname = get_hostname(host)
-        return (status, time.strftime('%Y-%m-%d %T'), hostname)
+            # Sin esperar al DNS: si la búsqueda sigue en curso el nombre se guarda después
+            lookup = dns_resolver.resolve(host)
+            hostname = lookup.result() if lookup.done() else None
+        return (status, datetime.now().replace(microsecond=0), hostname)
     except Exception:
-        return ('Down', time.strftime('%Y-%m-%d %T'), hostname)
+        return ('Down', datetime.now().replace(microsecond=0), hostname)
 
 
-def update_poll_scheduler(poll_interval):
-    '''Actualiza la programación de sondeo de hosts mediante APScheduler'''
+def update_poll_scheduler(poll_interval, min_poll_interval=None):
+    '''Actualiza la programación de sondeo de hosts mediante APScheduler
+
+    El job 'Poll Hosts' ya no sondea todo el inventario en cada ejecución:
+    corre cada ``min_poll_interval`` segundos y sondea solo los hosts cuyo
+    próximo sondeo ya venció.
+    '''
     try:
         scheduler.remove_job('Poll Hosts')
     except Exception:
         pass
 
+    # Con la nueva configuración todos los hosts vuelven a vencer de inmediato
+    host_scheduler.reset()
+
+    # El intervalo del job es el plazo de cada ciclo
+    poll_monitor.interval = max(1, min(int(poll_interval), int(min_poll_interval or poll_interval)))
+
     scheduler.add_job(
         id='Poll Hosts',
         func=_poll_hosts_threaded,
         trigger='interval',
-        seconds=int(poll_interval),
+        seconds=poll_monitor.interval,
+        max_instances=1
+    )
+
+
+def _on_poll_job_skipped(event):
+    '''Cuenta las ejecuciones de 'Poll Hosts' omitidas porque el ciclo anterior no terminó'''
+    if event.job_id == 'Poll Hosts':
+        poll_monitor.skipped()
+        log.warning('Ciclo de sondeo omitido: el ciclo anterior sigue en curso')
+
+
+scheduler.add_listener(_on_poll_job_skipped, EVENT_JOB_MAX_INSTANCES)
+
+
+def add_latency_flush_job(flush_interval=300):
+    '''Agrega el job que guarda las muestras de latencia y los acumulados de disponibilidad en memoria'''
+    scheduler.add_job(
+        id='Latency Flush',
+        func=_latency_flush_task,
+        trigger='interval',
+        seconds=flush_interval,
         max_instances=1
     )
 
@@ -55,96 +105,327 @@ def add_poll_history_cleanup_cron():
 
 
 
-# Diccionario global (puede ir al inicio de polling.py)
-stable_cycles = {}  # clave: host_id, valor: {'status': 'Up'/'Down', 'count': int}
+# Ciclos estables tras los que se duplica el intervalo de un host Up
+STABLE_BACKOFF_CYCLES = 30
 
 def _poll_hosts_threaded():
-    """Sondea hosts por lotes y genera alertas solo cuando el estado se estabiliza."""
-    log.debug('Starting host polling (icmplib)')
+    """Sondea los hosts vencidos y genera alertas solo cuando el estado se estabiliza."""
+    log.debug('Starting host polling (icmplib async)')
     s = time.perf_counter()
+    stats = PollCycleStats()
 
-    import time as t
-
-    REQUIRED_STABLE_CYCLES = get_stable_cycles()
-    MAX_BATCH_SIZE = 200
-    WAIT_BETWEEN_BATCHES = 1
+    with app.app_context():
+        required_cycles = get_stable_cycles()
+        polling_config = json.loads(get_polling_config())
+
+        now = time.monotonic()
+        host_scheduler.sync(host_registry.targets(), now)
+
+        # Si los vencidos no caben en el plazo, primero los hosts pendientes de
+        # confirmar (nuevos o con cambio de estado) y luego los que más esperan
+        targets = host_scheduler.pop_due(
+            now,
+            limit=poll_monitor.budget(),
+            urgent=lambda host_id: stability_tracker.is_pending(host_id, required_cycles)
+        )
+        if not targets:
+            return
+        deferred = host_scheduler.overdue(now)
+        if deferred:
+            log.warning(f"Ciclo limitado a {len(targets)} hosts para cumplir el plazo; {deferred} hosts diferidos")
+
+        # Los hosts detrás de un padre Down confirmado no se sondean
+        suppressed, probed = [], []
+        for target in targets:
+            (suppressed if dependency_graph.is_suppressed(target[0]) else probed).append(target)
+
+        writing = [0.0]
+
+        def persist(host_ids, results):
+            w = time.perf_counter()
+            _persist_and_schedule(host_ids, results, required_cycles, polling_config, stats)
+            writing[0] += time.perf_counter() - w
+
+        if suppressed:
+            persist([host_id for host_id, dummy in suppressed],
+                    [ProbeResult(ip, False, 0.0, 0.0, 0.0, 0.0, 1.0) for dummy, ip in suppressed])
+            log.debug(f"{len(suppressed)} hosts sin sondear por padre caído")
+
+        # Los sondeos se reparten en una fracción del plazo para no enviarlos en ráfaga
+        pacing = dict(
+            concurrency=polling_config['max_concurrency'],
+            packets_per_second=polling_config['packets_per_second'],
+            subnet_limits=_subnet_limits(polling_config),
+            spread_seconds=poll_monitor.interval * config['Probe_Spread'] if poll_monitor.interval else None
+        )
+        probing = time.perf_counter()
+        try:
+            workers = _poll_workers(len(probed))
+            if workers > 1:
+                stats.pacing = poll_inventory_sharded(probed, persist, workers, **pacing)
+            else:
+                stats.pacing = poll_inventory(probed, persist, **pacing)
+        except Exception as e:
+            log.error(f"Error en el sondeo de hosts: {e}")
+        finally:
+            host_scheduler.release(time.monotonic() + polling_config['min_poll_interval'])
+
+        # Los sondeos se solapan con la escritura: la fase de sondeo es el
+        # tiempo que este hilo pasó esperando resultados
+        stats.phases['probe'] = time.perf_counter() - probing - writing[0]
+
+    stats.duration = time.perf_counter() - s
+    poll_monitor.record(stats, deferred)
+    if poll_monitor.interval and stats.duration > poll_monitor.interval:
+        log.warning(f"El ciclo de sondeo duró {stats.duration:.1f}s y superó su plazo de {poll_monitor.interval}s")
+    log.debug("Polled {} of {} hosts in {} seconds.".format(len(targets), len(host_scheduler), stats.duration))
+
+
+def force_poll(targets):
+    '''Sondea ``targets`` [(host_id, ip_address)] de inmediato, fuera del ciclo de sondeo
+
+    Usa el mismo motor y el mismo guardado que el ciclo: el estado, el
+    historial, la estabilidad y las alertas se actualizan igual que en un
+    sondeo programado. Devuelve {host_id: resultado del sondeo}.
+    '''
+    required_cycles = get_stable_cycles()
+    polling_config = json.loads(get_polling_config())
+    probed = {}
+
+    def persist(host_ids, results):
+        _persist_and_schedule(host_ids, results, required_cycles, polling_config, PollCycleStats())
+        probed.update(zip(host_ids, results))
+
+    poll_inventory(
+        targets,
+        persist,
+        concurrency=polling_config['max_concurrency'],
+        packets_per_second=polling_config['packets_per_second'],
+        subnet_limits=_subnet_limits(polling_config)
+    )
+    return probed
 
-    def chunk_list(lst, n):
-        for i in range(0, len(lst), n):
-            yield lst[i:i + n]
 
-    def analizar_historial_estados(host_id, current_status):
-        """Verifica los últimos N ciclos para determinar estabilidad."""
-        history = PollHistory.query.filter_by(host_id=host_id) \
-            .order_by(PollHistory.date_created.desc()) \
-            .limit(REQUIRED_STABLE_CYCLES).all()
-        if len(history) < REQUIRED_STABLE_CYCLES:
-            return 0
-        estados = [h.poll_status for h in history][::-1]
-        stable_count = sum(1 for e in estados if e == current_status)
-        return stable_count
+def force_poll_seconds(num_targets):
+    '''Lo que puede tardar force_poll en sondear ``num_targets`` hosts con la configuración actual'''
+    polling_config = json.loads(get_polling_config())
+    return expected_seconds(
+        num_targets,
+        concurrency=polling_config['max_concurrency'],
+        packets_per_second=polling_config['packets_per_second'],
+        subnet_limits=_subnet_limits(polling_config)
+    )
 
-    with app.app_context():
-        all_hosts = json.loads(get_all_hosts())
-        batches = list(chunk_list(all_hosts, MAX_BATCH_SIZE))
-
-        for i, batch in enumerate(batches):
-            ips = [h['ip_address'] for h in batch]
-
-            try:
-                results = multiping(ips, count=1, timeout=1, interval=0.2, concurrent_tasks=50)
-            except Exception as e:
-                log.error(f"Error en multiping: {e}")
-                continue
-
-            poll_time = time.strftime('%Y-%m-%d %T')
-
-            for host_obj, host_data in zip(results, batch):
-                status = 'Up' if host_obj.is_alive else 'Down'
-                host = Hosts.query.filter_by(id=int(host_data['id'])).first()
-                if not host:
-                    continue
-
-                previous_status = host.status
-                host.previous_status = previous_status
-                host.status = status
-                host.last_poll = poll_time
-
-                # Guardar historial
-                new_poll_history = PollHistory(
-                    host_id=host.id,
-                    poll_time=poll_time,
-                    poll_status=status
-                )
-                db.session.add(new_poll_history)
-                db.session.commit()  # commit temprano para analizar historial
-
-                # Analizar estabilidad
-                stable_count = analizar_historial_estados(host.id, status)
-
-                if stable_count >= REQUIRED_STABLE_CYCLES:
-                    # Alertar solo si el último estado alertado es diferente
-                    if host.alerts_enabled and host.last_alert_status != status:
-                        host_alert = HostAlerts(
-                            host_id=host.id,
-                            hostname=host.hostname,
-                            ip_address=host.ip_address,
-                            host_status=status,
-                            poll_time=poll_time
-                        )
-                        db.session.add(host_alert)
-                        host.last_alert_status = status
-                        db.session.commit()
-                        log.info(f"Alerta enviada para {host.hostname}: {status} ({stable_count}/{REQUIRED_STABLE_CYCLES} ciclos estables)")
-                else:
-                    log.info(f"Cambio descartado para {host.hostname}: {previous_status} -> {status} (solo {stable_count}/{REQUIRED_STABLE_CYCLES} ciclos estables)")
 
-            if i < len(batches) - 1:
-                log.debug(f"Esperando {WAIT_BETWEEN_BATCHES}s antes del siguiente lote...")
-                t.sleep(WAIT_BETWEEN_BATCHES)
+def _subnet_limits(polling_config):
+    '''Límites de paquetes por segundo por subred de la configuración de sondeo'''
+    try:
+        return parse_subnet_limits(polling_config.get('subnet_packet_limits'))
+    except ValueError as e:
+        log.warning(f"Límites por subred ignorados: {e}")
+        return []
 
-    log.debug("Host polling finished in {} seconds.".format(time.perf_counter() - s))
 
+def _persist_and_schedule(host_ids, results, required_cycles, polling_config, stats):
+    '''Guarda un lote de resultados y programa el próximo sondeo de cada host'''
+    observed = _persist_poll_batch(
+        host_ids, results, datetime.now().replace(microsecond=0), required_cycles, stats,
+        history_mode=polling_config['history_mode'], heartbeat=polling_config['heartbeat_interval']
+    )
+    now = time.monotonic()
+    for host_id, status, stable_count in observed:
+        if dependency_graph.is_suppressed(host_id):
+            interval = polling_config['max_poll_interval']
+        else:
+            interval = _next_poll_interval(status, stable_count, required_cycles, polling_config)
+        host_scheduler.schedule(host_id, now + interval)
+
+
+def _poll_workers(num_targets):
+    '''Número de procesos de sondeo para un ciclo (1 = sondeo en este proceso)'''
+    if num_targets < config['Shard_Min_Hosts']:
+        return 1
+    return max(1, min(config['Max_Threads'], os.cpu_count() or 1))
+
+
+def _next_poll_interval(status, stable_count, required_cycles, polling_config):
+    '''Intervalo hasta el próximo sondeo de un host según su estabilidad
+
+    Un host pendiente de confirmar se sondea al intervalo mínimo, un host
+    Down confirmado a la mitad del intervalo base y un host Up estable
+    duplica su intervalo cada STABLE_BACKOFF_CYCLES ciclos hasta el máximo.
+    '''
+    base = polling_config['poll_interval']
+    min_interval = min(polling_config['min_poll_interval'], base)
+    max_interval = max(polling_config['max_poll_interval'], base)
+
+    if stable_count < required_cycles:
+        return min_interval
+    if status == 'Down':
+        return max(min_interval, base // 2)
+
+    backoff = min((stable_count - required_cycles) // STABLE_BACKOFF_CYCLES, 16)
+    return min(max_interval, base * 2 ** backoff)
+
+
+def _persist_poll_batch(host_ids, results, poll_time, required_cycles, stats=None,
+                        history_mode='full', heartbeat=300):
+    """Guarda los resultados de un lote de sondeo en una sola transacción.
+
+    Los hosts del lote se leen del registro en memoria y cada resultado se
+    empareja por dirección IP. El historial y las alertas se insertan en
+    bloque y los hosts se actualizan en bloque en el hilo escritor, con un
+    único commit compartido con las demás escrituras en cola.
+    Devuelve [(host_id, estado, ciclos estables)] de los hosts guardados.
+
+    Los hosts con un ancestro Down no alertan por separado: su caída se
+    agrupa en la alerta del padre, y los que quedan sin sondear por un padre
+    Down confirmado se marcan Down sin muestras de latencia.
+
+    Los periodos de estado (``host_status_periods``) se mantienen siempre;
+    con ``history_mode='transitions'`` no se escribe una fila de
+    ``poll_history`` por sondeo.
+    """
+    stats = stats or PollCycleStats()
+
+    with stats.phase('orm_load'):
+        # Los registros no cambian: ``host.status`` sigue siendo el estado anterior al lote
+        hosts_by_ip = {record.ip_address: record for record in host_registry.get_many(host_ids).values()}
+
+    sampled_at = datetime.now()
+    history, updates, polled = [], [], []
+    transitions, heartbeats = [], []
+    probes_sent = probes_lost = 0
+    for result in results:
+        host = hosts_by_ip.get(result.address)
+        if host is None:
+            continue
+
+        suppressed = dependency_graph.is_suppressed(host.id)
+        if not suppressed:
+            latency_buffer.add(host.id, result, sampled_at)
+            probes_sent += 1
+            probes_lost += not result.is_alive
+        rollup_buffer.add(host.id, result.is_alive, result.avg_rtt if result.is_alive else None, sampled_at)
+
+        status = 'Up' if result.is_alive else 'Down'
+        update = {'id': host.id, 'previous_status': host.status, 'status': status, 'last_poll': poll_time}
+        if history_mode == 'full':
+            history.append({'host_id': host.id, 'poll_time': poll_time, 'poll_status': status})
+        status_periods.observe(host.id, status, sampled_at, heartbeat, transitions, heartbeats)
+        updates.append(update)
+        polled.append((host, status, update, suppressed))
+
+    observed, released, folded = [], [], []
+    try:
+        alerts = []
+        with stats.phase('stability'):
+            for host, status, update, suppressed in polled:
+                stable_count = stability_tracker.observe(host.id, status, required_cycles)
+                observed.append((host.id, status, stable_count))
+                # Un host sin sondear no confirma su caída: sus dependientes siguen al ancestro sondeado
+                confirmed = stable_count >= required_cycles and not suppressed
+                released.extend(dependency_graph.observe(host.id, status, confirmed))
+
+                if stable_count >= required_cycles:
+                    if status == 'Down' and dependency_graph.is_folded(host.id):
+                        log.debug(f"Alerta de {host.hostname} agrupada en la de su padre")
+                    # Alertar solo si el último estado alertado es diferente
+                    elif host.alerts_enabled and host.last_alert_status != status:
+                        if status == 'Down':
+                            folded.extend(dependency_graph.descendants(host.id))
+                        alerts.append({
+                            'host_id': host.id,
+                            'hostname': host.hostname,
+                            'ip_address': host.ip_address,
+                            'host_status': status,
+                            'poll_time': poll_time
+                        })
+                        update['last_alert_status'] = status
+                        log.info(f"Alerta enviada para {host.hostname}: {status} ({stable_count}/{required_cycles} ciclos estables)")
+                else:
+                    log.info(f"Cambio descartado para {host.hostname}: {host.status} -> {status} (solo {stable_count}/{required_cycles} ciclos estables)")
+
+        # El commit (agrupado con otras escrituras) es lo que se espera al
+        # hilo escritor fuera de las fases de inserción y actualización
+        written = sum(stats.phases[name] for name in ('history_insert', 'alert_insert', 'host_update'))
+        w = time.perf_counter()
+        with DB_COMMIT_SECONDS.time(operation='poll_batch'):
+            db_writer.run(_write_poll_batch, history, transitions, heartbeats, alerts, folded, updates, stats)
+        written = sum(stats.phases[name] for name in ('history_insert', 'alert_insert', 'host_update')) - written
+        stats.phases['commit'] += time.perf_counter() - w - written
+    except Exception as e:
+        stability_tracker.invalidate()
+        status_periods.invalidate()
+        log.error(f"Error guardando el lote de sondeo: {e}")
+        return []
+
+    PROBES_SENT.inc(probes_sent)
+    PROBES_LOST.inc(probes_lost)
+
+    host_registry.apply_poll(updates)
+
+    # El panel recibe completos solo los hosts con cambios; del resto, la hora del sondeo
+    changed = [u['id'] for u in updates if u['status'] != u['previous_status'] or 'last_alert_status' in u]
+    if changed:
+        host_changes.changed(changed)
+    host_changes.polled({u['id']: u['last_poll'] for u in updates})
+
+    # Eventos en vivo, con los datos ya en memoria
+    flipped = [{
+        'id': host.id,
+        'hostname': host.hostname,
+        'ip_address': host.ip_address,
+        'status': status,
+        'previous_status': host.status,
+        'last_poll': poll_time.strftime(TIME_FORMAT)
+    } for host, status, dummy, dummy in polled if status != host.status]
+    if flipped:
+        event_broker.publish('status', flipped)
+    if alerts:
+        event_broker.publish('alert', [dict(alert, poll_time=poll_time.strftime(TIME_FORMAT)) for alert in alerts])
+
+    # Los dependientes de un padre recuperado se sondean de inmediato
+    now = time.monotonic()
+    for host_id in released:
+        host_scheduler.schedule(host_id, now)
+
+    stats.hosts_polled += len(updates)
+    stats.rows['poll_history'] += len(history)
+    stats.rows['status_periods'] += len(transitions) + len(heartbeats)
+    stats.rows['host_alerts'] += len(alerts)
+    stats.rows['hosts'] += len(updates)
+    return observed
+
+
+def _write_poll_batch(history, transitions, heartbeats, alerts, folded, updates, stats):
+    '''Escribe un lote de sondeo en el hilo escritor (sin commit)'''
+    with stats.phase('history_insert'):
+        db.session.bulk_insert_mappings(PollHistory, history)
+        write_periods(transitions, heartbeats)
+    with stats.phase('alert_insert'):
+        db.session.bulk_insert_mappings(HostAlerts, alerts)
+        if folded:
+            # Las alertas Down pendientes de los dependientes quedan en la del padre
+            HostAlerts.query.filter(
+                HostAlerts.host_id.in_(folded),
+                HostAlerts.host_status == 'Down',
+                HostAlerts.alert_cleared.is_(False)
+            ).update({'alert_cleared': True}, synchronize_session=False)
+    with stats.phase('host_update'):
+        db.session.bulk_update_mappings(Hosts, updates)
+
+
+def _latency_flush_task():
+    with app.app_context():
+        try:
+            flush_latency_samples()
+        except Exception as e:
+            log.error(f"Error guardando las métricas de latencia: {e}")
+        try:
+            flush_rollups()
+        except Exception as e:
+            log.error(f"Error guardando los acumulados de disponibilidad: {e}")
 
 
 def _poll_history_cleanup_task():
@@ -152,13 +433,11 @@ def _poll_history_cleanup_task():
     s = time.perf_counter()
 
     with app.app_context():
-        retention_days = json.loads(get_polling_config())['history_truncate_days']
-        current_date = date.today()
-
-        PollHistory.query.filter(
-            PollHistory.date_created < (current_date - timedelta(days=retention_days))
-        ).delete()
-
-        db.session.commit()
+        polling_config = json.loads(get_polling_config())
+        try:
+            # Por lotes acotados: los sondeos no esperan más que un lote por el lock
+            run_retention(polling_config['history_truncate_days'], polling_config['rollup_retention_days'])
+        except Exception as e:
+            log.error(f"Error aplicando la retención del historial: {e}")
 
     log.debug("Poll history cleanup finished in {} seconds.".format(time.perf_counter() - s))
\ No newline at end of file
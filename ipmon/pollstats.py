@@ -0,0 +1,139 @@
+'''Estadísticas de los ciclos de sondeo'''
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from ipmon.metrics import (POLL_CYCLES, POLL_OVERRUNS, POLL_SKIPPED, POLL_DEFERRED,
+                           POLL_CYCLE_SECONDS, POLL_PHASE_SECONDS, PROBE_PACING_PPS,
+                           PROBE_PACING_WAIT_SECONDS)
+
+# Fases medidas en cada ciclo de sondeo
+PHASES = ('probe', 'orm_load', 'stability', 'history_insert', 'alert_insert', 'host_update', 'commit')
+
+
+class PollCycleStats():
+    '''Tiempo por fase y filas escritas durante un ciclo de sondeo'''
+
+    def __init__(self):
+        self.started = time.time()
+        self.duration = 0.0
+        self.hosts_polled = 0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.rows = {'poll_history': 0, 'status_periods': 0, 'host_alerts': 0, 'hosts': 0}
+        self.pacing = {}  # ritmo de envío logrado (ver engine.pacing_report)
+
+    @contextmanager
+    def phase(self, name):
+        '''Acumula el tiempo del bloque en la fase ``name``'''
+        s = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - s
+
+    def as_dict(self):
+        return {
+            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+            'duration': round(self.duration, 6),
+            'hosts_polled': self.hosts_polled,
+            'phases': {name: round(value, 6) for name, value in self.phases.items()},
+            'rows': dict(self.rows),
+            'pacing': dict(self.pacing)
+        }
+
+
+class PollMonitor():
+    '''Historial de ciclos de sondeo, desbordes y ejecuciones omitidas.
+
+    Cada ciclo tiene como plazo el intervalo del job 'Poll Hosts'; si lo
+    supera cuenta como desborde. Las ejecuciones que APScheduler omite por
+    ``max_instances=1`` mientras un ciclo sigue corriendo se cuentan aparte.
+    Con el costo por host de los últimos ciclos (tiempo total entre hosts
+    sondeados, para que los ciclos pequeños no pesen de más) estima cuántos
+    hosts caben en el plazo; el tiempo que el pacer espació los envíos a
+    propósito no cuenta como costo.
+    '''
+
+    # Fracción del plazo que se reparte entre los hosts vencidos
+    BUDGET_FRACTION = 0.9
+
+    def __init__(self, history_size=720):
+        self._lock = threading.Lock()
+        self.interval = None
+        self.last = None
+        self.cycles = 0
+        self.overruns = 0
+        self.skipped_runs = 0
+        self.deferred_hosts = 0
+        self._recent = deque(maxlen=20)  # (duración, hosts sondeados)
+        self._history = deque(maxlen=history_size)
+
+    def budget(self):
+        '''Número máximo de hosts que caben en el plazo del ciclo (None = sin límite)'''
+        with self._lock:
+            per_host = self._per_host()
+            if not self.interval or not per_host:
+                return None
+            return max(1, int(self.interval * self.BUDGET_FRACTION / per_host))
+
+    def record(self, stats, deferred=0):
+        '''Registra un ciclo completado'''
+        with self._lock:
+            overrun = bool(self.interval) and stats.duration > self.interval
+            self.cycles += 1
+            self.overruns += overrun
+            self.deferred_hosts += deferred
+            if stats.hosts_polled:
+                paced = stats.pacing.get('paced_seconds') or 0
+                self._recent.append((max(stats.duration - paced, 0), stats.hosts_polled))
+
+            entry = stats.as_dict()
+            entry.update({'deadline': self.interval, 'overrun': overrun, 'deferred': deferred})
+            self._history.append(entry)
+            self.last = stats
+
+        POLL_CYCLES.inc()
+        POLL_CYCLE_SECONDS.observe(stats.duration)
+        for name, value in stats.phases.items():
+            POLL_PHASE_SECONDS.observe(value, phase=name)
+        if stats.pacing.get('packets'):
+            for kind in ('target', 'achieved', 'peak'):
+                PROBE_PACING_PPS.set(stats.pacing[kind + '_pps'] or 0, kind=kind)
+            PROBE_PACING_WAIT_SECONDS.inc(stats.pacing['wait_seconds'])
+        if overrun:
+            POLL_OVERRUNS.inc()
+        if deferred:
+            POLL_DEFERRED.inc(deferred)
+
+    def skipped(self):
+        '''Registra una ejecución omitida porque el ciclo anterior seguía corriendo'''
+        with self._lock:
+            self.skipped_runs += 1
+        POLL_SKIPPED.inc()
+
+    def _per_host(self):
+        hosts = sum(h for dummy, h in self._recent)
+        return sum(d for d, dummy in self._recent) / hosts if hosts else None
+
+    def as_dict(self):
+        with self._lock:
+            durations = sorted(entry['duration'] for entry in self._history)
+            return {
+                'deadline': self.interval,
+                'cycles': self.cycles,
+                'overruns': self.overruns,
+                'skipped_runs': self.skipped_runs,
+                'deferred_hosts': self.deferred_hosts,
+                'seconds_per_host': round(self._per_host() or 0, 6),
+                'duration': {
+                    'min': durations[0] if durations else None,
+                    'p50': durations[len(durations) // 2] if durations else None,
+                    'p95': durations[int(len(durations) * 0.95)] if durations else None,
+                    'max': durations[-1] if durations else None
+                },
+                'history': list(self._history)
+            }
+
+
+poll_monitor = PollMonitor()
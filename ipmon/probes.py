@@ -0,0 +1,186 @@
+'''Backends de sondeo ICMP (icmplib real o simulado)'''
+import os
+import sys
+import math
+import time
+import zlib
+import random
+import asyncio
+import threading
+import ipaddress
+
+from icmplib import ping, async_ping, Host
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import config
+
+
+class ProbeBackend():
+    '''Interfaz de sondeo usada por el poller, poll_host y forzar_ping.
+
+    Ambos métodos devuelven un objeto con los atributos de ``icmplib.Host``
+    (address, is_alive, avg_rtt, min_rtt, max_rtt, jitter, packet_loss).
+    '''
+
+    def ping(self, address, count=1, timeout=1, interval=0.2):
+        raise NotImplementedError
+
+    async def async_ping(self, address, count=1, timeout=1, interval=0.2):
+        raise NotImplementedError
+
+
+class IcmplibBackend(ProbeBackend):
+    '''Sondeo ICMP real con icmplib'''
+
+    def __init__(self, privileged=True):
+        self.privileged = privileged
+
+    def ping(self, address, count=1, timeout=1, interval=0.2):
+        return ping(address, count=count, timeout=timeout, interval=interval, privileged=self.privileged)
+
+    async def async_ping(self, address, count=1, timeout=1, interval=0.2):
+        return await async_ping(address, count=count, timeout=timeout, interval=interval, privileged=self.privileged)
+
+
+class SimulatedBackend(ProbeBackend):
+    '''Backend ICMP simulado y determinista para pruebas de carga.
+
+    No envía paquetes: cada respuesta se deriva de la semilla, la dirección
+    y el número de sondeo de esa dirección, por lo que dos ejecuciones con
+    la misma configuración producen los mismos resultados.
+
+    - ``latency``: distribución de RTT en ms, ``('constant', v)``,
+      ``('uniform', a, b)``, ``('normal', media, desviación)`` o
+      ``('lognormal', mediana, sigma)``.
+    - ``latency_by_network``: ``{red: distribución}`` para redes concretas.
+    - ``loss_rate``: probabilidad de perder cada paquete.
+    - ``outages``: ``[(red, inicio, duración)]`` en segundos desde la
+      creación del backend; las direcciones de la red no responden.
+    - ``flaps``: ``[(red, periodo, fracción caída)]``; cada dirección pasa
+      esa fracción de cada periodo sin responder, con un desfase propio.
+    - ``realtime``: espera el RTT (o el timeout) simulado antes de responder.
+    '''
+
+    def __init__(self, seed=0, latency=('lognormal', 2.0, 0.5), latency_by_network=None,
+                 loss_rate=0.0, outages=(), flaps=(), realtime=False, clock=time.monotonic):
+        self.seed = seed
+        self.latency = latency
+        self.latency_by_network = [(ipaddress.ip_network(net, strict=False), dist)
+                                   for net, dist in (latency_by_network or {}).items()]
+        self.loss_rate = loss_rate
+        self.outages = [(ipaddress.ip_network(net, strict=False), start, start + duration)
+                        for net, start, duration in outages]
+        self.flaps = [(ipaddress.ip_network(net, strict=False), period, down_fraction)
+                      for net, period, down_fraction in flaps]
+        self.realtime = realtime
+        self._clock = clock
+        self._start = clock()
+        self._lock = threading.Lock()
+        self._probes = {}  # address -> sondeos realizados
+
+    def __getstate__(self):
+        # Se envía a los procesos de sondeo en paralelo; el lock no se serializa
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def ping(self, address, count=1, timeout=1, interval=0.2):
+        host, duration = self._simulate(address, count, timeout, interval)
+        if self.realtime:
+            time.sleep(duration)
+        return host
+
+    async def async_ping(self, address, count=1, timeout=1, interval=0.2):
+        host, duration = self._simulate(address, count, timeout, interval)
+        if self.realtime:
+            await asyncio.sleep(duration)
+        return host
+
+    def is_down(self, address, elapsed=None):
+        '''Indica si la dirección está en una caída o en la fase caída de un flap'''
+        if elapsed is None:
+            elapsed = self._clock() - self._start
+        ip = ipaddress.ip_address(address)
+
+        for network, start, end in self.outages:
+            if start <= elapsed < end and ip in network:
+                return True
+        for network, period, down_fraction in self.flaps:
+            if ip in network:
+                phase = (elapsed + zlib.crc32(address.encode()) % period) % period
+                if phase < period * down_fraction:
+                    return True
+        return False
+
+    def _simulate(self, address, count, timeout, interval):
+        with self._lock:
+            sequence = self._probes.get(address, 0)
+            self._probes[address] = sequence + 1
+
+        rng = random.Random(zlib.crc32('{}:{}:{}'.format(self.seed, address, sequence).encode()))
+        rtts = []
+        if not self.is_down(address):
+            distribution = self._distribution_for(address)
+            for dummy in range(count):
+                if rng.random() >= self.loss_rate:
+                    rtts.append(self._sample(rng, distribution))
+
+        lost = len(rtts) < count
+        duration = (count - 1) * interval + (timeout if lost else max(rtts) / 1000)
+        return Host(address, count, rtts), duration
+
+    def _distribution_for(self, address):
+        if self.latency_by_network:
+            ip = ipaddress.ip_address(address)
+            for network, distribution in self.latency_by_network:
+                if ip in network:
+                    return distribution
+        return self.latency
+
+    @staticmethod
+    def _sample(rng, distribution):
+        kind, *params = distribution
+        if kind == 'constant':
+            value = params[0]
+        elif kind == 'uniform':
+            value = rng.uniform(*params)
+        elif kind == 'normal':
+            value = rng.gauss(*params)
+        elif kind == 'lognormal':
+            value = rng.lognormvariate(math.log(params[0]), params[1])
+        else:
+            raise ValueError('Distribución de latencia desconocida: {}'.format(kind))
+        return max(0.01, value)
+
+
+def fake_addresses(count, network='10.0.0.0/8'):
+    '''Genera ``count`` direcciones consecutivas de ``network`` para pruebas'''
+    hosts = ipaddress.ip_network(network).hosts()
+    return [str(next(hosts)) for dummy in range(count)]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    '''Devuelve el backend configurado en config['Probe_Backend']'''
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if config['Probe_Backend'] == 'simulated':
+                _backend = SimulatedBackend(**config['Probe_Simulation'])
+            else:
+                _backend = IcmplibBackend()
+        return _backend
+
+
+def set_backend(backend):
+    '''Reemplaza el backend de sondeo (pruebas de carga y benchmarks)'''
+    global _backend
+    with _backend_lock:
+        _backend = backend
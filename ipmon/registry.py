@@ -0,0 +1,219 @@
+'''Registro residente de hosts: estado en memoria para las lecturas de la API y del sondeo'''
+import os
+import sys
+import json
+import threading
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import db
+from ipmon.database import Hosts, TIME_FORMAT
+
+# Campos de cada host, en el orden en que los serializa HostsSchema
+FIELDS = (
+    'id', 'ip_address', 'hostname', 'hostname_auto', 'ciudad', 'cto', 'dispositivo', 'parent_id',
+    'tipo', 'snapshot_url', 'status', 'last_poll', 'previous_status', 'alerts_enabled', 'last_alert_status'
+)
+_BOOL_FIELDS = ('hostname_auto', 'alerts_enabled')
+
+# Campos descriptivos con conteo de estados por valor
+COUNT_FIELDS = ('ciudad', 'cto', 'tipo')
+
+
+class HostRecord():
+    '''Host en memoria; no se modifica una vez publicado (cada cambio crea un registro nuevo)'''
+    __slots__ = FIELDS
+
+    def __init__(self, row):
+        for field in FIELDS:
+            setattr(self, field, getattr(row, field))
+
+    def replace(self, **changes):
+        '''Copia del registro con ``changes`` aplicados'''
+        record = HostRecord(self)
+        for field, value in changes.items():
+            setattr(record, field, value)
+        return record
+
+    def as_dict(self):
+        '''Diccionario con el mismo formato que Schemas.hosts().dump()'''
+        data = {field: getattr(self, field) for field in FIELDS}
+        for field in _BOOL_FIELDS:
+            if data[field] is not None:
+                data[field] = bool(data[field])
+        if self.last_poll is not None:
+            data['last_poll'] = self.last_poll.strftime(TIME_FORMAT)
+        return data
+
+
+class HostRegistry():
+    '''Inventario de hosts residente en memoria.
+
+    Se carga de la base con una sola consulta la primera vez que se usa y
+    después lo actualizan, tras cada commit, el sondeo (``apply_poll``), las
+    rutas de alta, edición y borrado (``refresh``/``remove``) y el DNS
+    inverso (``rename``). Los registros se reemplazan en vez de modificarse,
+    así quien tiene uno en mano conserva los valores que leyó. El JSON
+    completo del inventario se regenera solo si algo cambió desde la última
+    vez que se pidió.
+
+    Los hosts por estado, en total y por cada valor de COUNT_FIELDS, se
+    ajustan en cada reemplazo de registro: leerlos no recorre el inventario.
+    '''
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._records = None  # host_id -> HostRecord; None = sin cargar
+        self._snapshot = None
+        self._counts = Counter()  # estado -> hosts
+        self._groups = {}         # campo -> {valor: Counter de estados}
+
+    def _ensure_loaded(self):
+        '''Carga el inventario si hace falta (requiere contexto de la aplicación)'''
+        with self._lock:
+            if self._records is None:
+                rows = db.session.query(*(getattr(Hosts, field) for field in FIELDS)).all()
+                self._records = {}
+                self._counts = Counter()
+                self._groups = {field: {} for field in COUNT_FIELDS}
+                for row in rows:
+                    self._put(HostRecord(row))
+                self._snapshot = None
+            return self._records
+
+    def _tally(self, record, delta):
+        self._counts[record.status] += delta
+        for field in COUNT_FIELDS:
+            value = getattr(record, field)
+            group = self._groups[field].setdefault(value, Counter())
+            group[record.status] += delta
+            if not any(group.values()):
+                del self._groups[field][value]
+
+    def _put(self, record):
+        '''Agrega o reemplaza un registro ajustando los conteos'''
+        old = self._records.get(record.id)
+        self._records[record.id] = record
+        if old is not None:
+            if old.status == record.status and all(
+                    getattr(old, field) == getattr(record, field) for field in COUNT_FIELDS):
+                return
+            self._tally(old, -1)
+        self._tally(record, 1)
+
+    def _drop(self, host_id):
+        record = self._records.pop(host_id, None)
+        if record is not None:
+            self._tally(record, -1)
+
+    def invalidate(self):
+        '''Descarta el inventario; se vuelve a cargar en el próximo uso'''
+        with self._lock:
+            self._records = None
+            self._snapshot = None
+
+    def __len__(self):
+        return len(self._ensure_loaded())
+
+    def get(self, host_id):
+        return self._ensure_loaded().get(host_id)
+
+    def get_many(self, host_ids):
+        '''Devuelve {host_id: registro} de los ``host_ids`` que existen'''
+        with self._lock:
+            records = self._ensure_loaded()
+            return {host_id: records[host_id] for host_id in host_ids if host_id in records}
+
+    def records(self):
+        '''Lista de todos los registros'''
+        with self._lock:
+            return list(self._ensure_loaded().values())
+
+    def targets(self):
+        '''[(host_id, ip_address)] de todo el inventario, para el sondeo'''
+        with self._lock:
+            return [(record.id, record.ip_address) for record in self._ensure_loaded().values()]
+
+    def hosts(self, host_ids=None):
+        '''Hosts como lista de diccionarios (todos o los de ``host_ids``)'''
+        if host_ids is None:
+            return [record.as_dict() for record in self.records()]
+        return [record.as_dict() for record in self.get_many(host_ids).values()]
+
+    def snapshot(self):
+        '''JSON de todo el inventario, regenerado solo si hubo cambios'''
+        with self._lock:
+            records = self._ensure_loaded()
+            if self._snapshot is None:
+                self._snapshot = json.dumps([record.as_dict() for record in records.values()])
+            return self._snapshot
+
+    def status_counts(self):
+        '''Hosts por estado: {'Up': n, 'Down': n, None: n sin sondear}'''
+        with self._lock:
+            self._ensure_loaded()
+            return {status: count for status, count in self._counts.items() if count}
+
+    def group_counts(self, field):
+        '''Hosts por estado para cada valor de ``field`` (uno de COUNT_FIELDS): {valor: {estado: n}}'''
+        with self._lock:
+            self._ensure_loaded()
+            return {value: {status: count for status, count in group.items() if count}
+                    for value, group in self._groups[field].items()}
+
+    def refresh(self, host_ids):
+        '''Vuelve a leer de la base los ``host_ids`` creados o editados (los que no existen se quitan)'''
+        with self._lock:
+            if self._records is None:
+                return
+            rows = db.session.query(*(getattr(Hosts, field) for field in FIELDS)).filter(
+                Hosts.id.in_(list(host_ids))).all()
+            found = {row.id: HostRecord(row) for row in rows}
+            for host_id in host_ids:
+                if host_id in found:
+                    self._put(found[host_id])
+                else:
+                    self._drop(host_id)
+            self._snapshot = None
+
+    def apply_poll(self, updates):
+        '''Aplica las actualizaciones ya guardadas de un lote de sondeo
+
+        Cada actualización es {'id', 'status', 'previous_status', 'last_poll'}
+        y opcionalmente 'last_alert_status', como las escribe el sondeo.
+        '''
+        with self._lock:
+            if self._records is None:
+                return
+            for update in updates:
+                record = self._records.get(update['id'])
+                if record is not None:
+                    self._put(record.replace(**{field: value for field, value in update.items() if field != 'id'}))
+            self._snapshot = None
+
+    def rename(self, names):
+        '''Aplica {host_id: hostname} resueltos por DNS a los hosts que siguen con nombre automático'''
+        with self._lock:
+            if self._records is None:
+                return
+            for host_id, hostname in names.items():
+                record = self._records.get(host_id)
+                if record is not None and record.hostname_auto:
+                    self._put(record.replace(hostname=hostname))
+            self._snapshot = None
+
+    def remove(self, host_ids):
+        '''Quita hosts borrados; sus hijos explícitos quedan sin padre, como en la base'''
+        with self._lock:
+            if self._records is None:
+                return
+            removed = set(host_ids)
+            for host_id in removed:
+                self._drop(host_id)
+            for record in list(self._records.values()):
+                if record.parent_id in removed:
+                    self._put(record.replace(parent_id=None))
+            self._snapshot = None
+
+
+host_registry = HostRegistry()
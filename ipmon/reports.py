@@ -0,0 +1,111 @@
+'''Reportes de SLA: disponibilidad, caídas, MTTR y caída más larga por host o por grupo'''
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import or_
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import db
+from ipmon.database import Hosts, HostStatusPeriod
+from ipmon.rollups import host_totals
+
+# Columnas descriptivas de Hosts por las que se puede agrupar o filtrar
+GROUP_FIELDS = ('ciudad', 'cto', 'tipo', 'dispositivo')
+
+
+def _epoch(values):
+    return np.array(values, dtype='datetime64[s]').astype(np.int64)
+
+
+def _outages(host_ids, start, end):
+    '''Periodos Down que se solapan con [start, end) como arreglos (host, inicio, fin, resuelto)'''
+    query = db.session.query(
+        HostStatusPeriod.host_id, HostStatusPeriod.started_at, HostStatusPeriod.ended_at
+    ).filter(
+        HostStatusPeriod.status == 'Down',
+        HostStatusPeriod.started_at < end,
+        or_(HostStatusPeriod.ended_at.is_(None), HostStatusPeriod.ended_at > start)
+    )
+    if host_ids is not None:
+        query = query.filter(HostStatusPeriod.host_id.in_(host_ids))
+    rows = query.all()
+
+    # Las caídas abiertas se cuentan hasta el fin de la ventana o hasta ahora
+    open_until = min(end, datetime.now())
+    hosts = np.array([row.host_id for row in rows], dtype=np.int64)
+    started = _epoch([row.started_at for row in rows])
+    ended = _epoch([row.ended_at or open_until for row in rows])
+    resolved = np.array([row.ended_at is not None and row.ended_at <= end for row in rows], dtype=bool)
+    return hosts, started, ended, resolved
+
+
+def sla_report(start, end, group_by=(), filters=None, host_id=None):
+    '''Reporte de SLA en [start, end) para un host, o para los hosts filtrados agrupados por ``group_by``
+
+    La disponibilidad sale de los acumulados por hora/día (sondeos Up sobre
+    sondeos totales) y las caídas de los periodos de estado Down: cantidad,
+    tiempo caído dentro de la ventana, MTTR (duración media de las caídas
+    resueltas) y caída más larga. Todo se agrega por grupo con numpy.
+    '''
+    query = db.session.query(Hosts.id, *(getattr(Hosts, field) for field in group_by))
+    if host_id is not None:
+        query = query.filter(Hosts.id == host_id)
+    for field, value in (filters or {}).items():
+        query = query.filter(getattr(Hosts, field) == value)
+    hosts = query.order_by(Hosts.id).all()
+
+    # Índice de grupo por host, en el orden de ids
+    ids = np.array([row[0] for row in hosts], dtype=np.int64)
+    groups = {}
+    host_group = np.array([groups.setdefault(tuple(row[1:]), len(groups)) for row in hosts], dtype=np.int64)
+    num_groups = len(groups)
+    subset = [host_id] if host_id is not None else None
+
+    def group_of(values):
+        '''Grupo de cada host_id de ``values``; -1 si el host quedó fuera del filtro'''
+        if not len(ids):
+            return np.full(len(values), -1, dtype=np.int64)
+        position = np.minimum(np.searchsorted(ids, values), len(ids) - 1)
+        return np.where(ids[position] == values, host_group[position], -1)
+
+    totals = host_totals(start, end, subset)
+    total_ids = np.fromiter(totals.keys(), dtype=np.int64, count=len(totals))
+    counts = np.array(list(totals.values()), dtype=np.int64).reshape(-1, 2)
+    selected = group_of(total_ids)
+    keep = selected >= 0
+    up = np.bincount(selected[keep], weights=counts[keep, 0], minlength=num_groups)
+    down = np.bincount(selected[keep], weights=counts[keep, 1], minlength=num_groups)
+
+    outage_hosts, started, ended, resolved = _outages(subset, start, end)
+    selected = group_of(outage_hosts)
+    keep = selected >= 0
+    selected, started, ended, resolved = selected[keep], started[keep], ended[keep], resolved[keep]
+    window_start, window_end = _epoch([start, end])
+    in_window = np.clip(ended, window_start, window_end) - np.clip(started, window_start, window_end)
+
+    outages = np.bincount(selected, minlength=num_groups)
+    downtime = np.bincount(selected, weights=in_window, minlength=num_groups)
+    repaired = np.bincount(selected[resolved], minlength=num_groups)
+    repair_time = np.bincount(selected[resolved], weights=(ended - started)[resolved], minlength=num_groups)
+    longest = np.zeros(num_groups)
+    np.maximum.at(longest, selected, in_window)
+    members = np.bincount(host_group, minlength=num_groups)
+
+    report = []
+    for key, index in groups.items():
+        polls = int(up[index] + down[index])
+        row = dict(zip(group_by, key))
+        row.update({
+            'hosts': int(members[index]),
+            'polls': polls,
+            'availability': round(float(up[index]) / polls * 100, 3) if polls else None,
+            'outages': int(outages[index]),
+            'downtime_seconds': int(downtime[index]),
+            'mttr_seconds': round(float(repair_time[index]) / repaired[index], 1) if repaired[index] else None,
+            'longest_outage_seconds': int(longest[index])
+        })
+        report.append(row)
+    report.sort(key=lambda row: tuple(str(row[field] or '') for field in group_by))
+    return report
@@ -0,0 +1,153 @@
+'''Resolución inversa (PTR) asíncrona con caché de resultados'''
+import os
+import sys
+import time
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+
+from sqlalchemy import bindparam
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import app, db, scheduler, log, config
+from ipmon.database import Hosts
+from ipmon.writer import db_writer
+from ipmon.dependencies import dependency_graph
+from ipmon.changes import host_changes
+from ipmon.registry import host_registry
+
+
+class ReverseResolver():
+    '''Resuelve nombres de IPs en un pool de hilos, con caché positiva y negativa.
+
+    ``gethostbyaddr`` no admite timeout, así que el límite se aplica a la
+    espera de cada búsqueda: quien pide un nombre espera a lo sumo
+    ``timeout`` segundos y la respuesta tardía igual queda en caché. Las
+    búsquedas en curso de una misma IP se comparten.
+    '''
+
+    def __init__(self, workers=32, positive_ttl=86400, negative_ttl=3600):
+        self.workers = workers
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._executor = None
+        self._cache = {}    # ip -> (nombre o None, vencimiento)
+        self._pending = {}  # ip -> Future de la búsqueda en curso
+
+    def cached(self, ip_address):
+        '''Devuelve (encontrado, nombre) según la caché, sin consultar DNS'''
+        with self._lock:
+            entry = self._cache.get(ip_address)
+            if entry is None or entry[1] <= time.monotonic():
+                return False, None
+            return True, entry[0]
+
+    def resolve(self, ip_address):
+        '''Inicia (o reutiliza) la búsqueda de ``ip_address``; devuelve un Future con el nombre o None'''
+        with self._lock:
+            entry = self._cache.get(ip_address)
+            if entry is not None and entry[1] > time.monotonic():
+                future = Future()
+                future.set_result(entry[0])
+                return future
+
+            future = self._pending.get(ip_address)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ipmon-dns')
+                future = self._pending[ip_address] = self._executor.submit(self._query, ip_address)
+            return future
+
+    def resolve_many(self, ip_addresses, timeout):
+        '''Resuelve varias IPs en paralelo; devuelve {ip: nombre o None} de las que terminaron a tiempo'''
+        futures = {ip_address: self.resolve(ip_address) for ip_address in set(ip_addresses)}
+        wait(futures.values(), timeout=timeout)
+        return {ip_address: future.result() for ip_address, future in futures.items() if future.done()}
+
+    def purge(self):
+        '''Descarta de la caché las entradas vencidas'''
+        now = time.monotonic()
+        with self._lock:
+            self._cache = {ip: entry for ip, entry in self._cache.items() if entry[1] > now}
+
+    def _query(self, ip_address):
+        try:
+            name = socket.gethostbyaddr(ip_address)[0]
+        except (socket.herror, socket.gaierror, OSError):
+            name = None
+        ttl = self.positive_ttl if name else self.negative_ttl
+        with self._lock:
+            self._cache[ip_address] = (name, time.monotonic() + ttl)
+            self._pending.pop(ip_address, None)
+        return name
+
+
+dns_resolver = ReverseResolver(
+    workers=config['Reverse_DNS']['Workers'],
+    positive_ttl=config['Reverse_DNS']['Positive_TTL'],
+    negative_ttl=config['Reverse_DNS']['Negative_TTL']
+)
+
+
+def resolve_host_later(host_id, ip_address):
+    '''Resuelve el nombre de un host recién creado en segundo plano y lo guarda al llegar'''
+    def _saved(written, name):
+        if written.exception() is None:
+            host_registry.rename({host_id: name})
+            host_changes.changed([host_id])
+            dependency_graph.invalidate()
+
+    def _done(future):
+        name = future.result()
+        if name:
+            written = db_writer.submit(_write_hostnames, [{'b_id': host_id, 'b_hostname': name}])
+            written.add_done_callback(lambda written: _saved(written, name))
+
+    dns_resolver.resolve(ip_address).add_done_callback(_done)
+
+
+def _write_hostnames(names):
+    '''Actualiza el hostname de los hosts que siguen con nombre automático, sin commit'''
+    table = Hosts.__table__
+    db.session.execute(table.update().where(
+        (table.c.id == bindparam('b_id')) & table.c.hostname_auto.is_(True)
+    ).values(hostname=bindparam('b_hostname')), names)
+
+
+def refresh_hostnames():
+    '''Vuelve a resolver los hosts con nombre automático y guarda los que cambiaron'''
+    hosts = [record for record in host_registry.records() if record.hostname_auto]
+    if not hosts:
+        return 0
+
+    dns_resolver.purge()
+    names = dns_resolver.resolve_many([host.ip_address for host in hosts], config['Reverse_DNS']['Refresh_Timeout'])
+    changed = [{'b_id': host.id, 'b_hostname': names[host.ip_address]} for host in hosts
+               if names.get(host.ip_address) and names[host.ip_address] != host.hostname]
+    if changed:
+        db_writer.run(_write_hostnames, changed)
+        host_registry.rename({entry['b_id']: entry['b_hostname'] for entry in changed})
+        host_changes.changed([entry['b_id'] for entry in changed])
+        dependency_graph.invalidate()
+    log.info(f"Nombres DNS actualizados: {len(changed)} de {len(hosts)} hosts con nombre automático")
+    return len(changed)
+
+
+def _hostname_refresh_task():
+    with app.app_context():
+        try:
+            refresh_hostnames()
+        except Exception as e:
+            log.error(f"Error actualizando los nombres DNS: {e}")
+
+
+def add_hostname_refresh_job():
+    '''Agrega el job que actualiza los nombres resueltos por DNS'''
+    scheduler.add_job(
+        id='Hostname Refresh',
+        func=_hostname_refresh_task,
+        trigger='interval',
+        hours=config['Reverse_DNS']['Refresh_Hours'],
+        max_instances=1
+    )
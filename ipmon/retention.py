@@ -0,0 +1,153 @@
+'''Retención del historial: borrado por lotes acotados sin bloquear los sondeos'''
+import os
+import sys
+import csv
+import gzip
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import db, log, config
+from ipmon.database import PollHistory, HostMetrics, HostStatusPeriod, HostRollup
+from ipmon.metrics import RETENTION_DELETED_ROWS
+from ipmon.writer import db_writer
+
+# Tiempo máximo que un lote retiene el lock de escritura (lo que puede esperar un sondeo)
+CHUNK_TARGET_SECONDS = 0.02
+# Pausa entre lotes para que los sondeos y la interfaz escriban
+CHUNK_PAUSE_SECONDS = 0.05
+MIN_CHUNK_SIZE = 100
+MAX_CHUNK_SIZE = 20000
+
+# Último reporte de retención, expuesto en /retentionStats
+last_report = None
+
+
+class _Archive():
+    '''CSV comprimido con las filas vencidas de una tabla, abierto al primer lote'''
+
+    def __init__(self, directory, table_name, stamp):
+        self.path = os.path.join(directory, f'{table_name}-{stamp}.csv.gz')
+        self._file = None
+        self._writer = None
+
+    def write(self, columns, rows):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = gzip.open(self.path, 'at', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(columns)
+        self._writer.writerows(
+            [value.hex() if isinstance(value, bytes) else value for value in row] for row in rows
+        )
+        # Lo archivado debe estar en disco antes de confirmar el borrado
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def purge(model, condition, order_by, archive_dir=None, stamp=None):
+    '''Borra por lotes las filas de ``model`` que cumplen ``condition``.
+
+    Cada lote busca los ids por un índice sobre ``order_by`` y los borra por
+    clave primaria en el hilo escritor; el tamaño del lote se ajusta para
+    que el borrado y el commit no superen ``CHUNK_TARGET_SECONDS`` y entre
+    lotes se cede el escritor. Con ``archive_dir`` las filas se copian antes
+    a un CSV comprimido. Devuelve filas borradas, lotes, segundos y archivo.
+    '''
+    table = model.__table__
+    archive = _Archive(archive_dir, table.name, stamp) if archive_dir else None
+    columns = list(table.columns) if archive else [table.c.id]
+    chunk_size = 1000
+    deleted = chunks = 0
+    longest_lock = 0.0
+    s = time.perf_counter()
+
+    try:
+        while True:
+            rows = db.session.execute(
+                select(*columns).where(condition).order_by(order_by).limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            if archive:
+                archive.write(table.columns.keys(), rows)
+
+            locked = time.perf_counter()
+            db_writer.run(_delete_rows, table, [row.id for row in rows])
+            locked = time.perf_counter() - locked
+
+            deleted += len(rows)
+            chunks += 1
+            longest_lock = max(longest_lock, locked)
+            if len(rows) < chunk_size:
+                break
+            if locked > CHUNK_TARGET_SECONDS:
+                chunk_size = max(MIN_CHUNK_SIZE, chunk_size // 2)
+            elif locked < CHUNK_TARGET_SECONDS / 2:
+                chunk_size = min(MAX_CHUNK_SIZE, chunk_size * 2)
+            time.sleep(CHUNK_PAUSE_SECONDS)
+    finally:
+        if archive:
+            archive.close()
+
+    RETENTION_DELETED_ROWS.inc(deleted, table=table.name)
+    return {
+        'rows': deleted,
+        'chunks': chunks,
+        'seconds': round(time.perf_counter() - s, 3),
+        'longest_lock_seconds': round(longest_lock, 4),
+        'archive': archive.path if archive and deleted else None
+    }
+
+
+def _delete_rows(table, ids):
+    db.session.execute(table.delete().where(table.c.id.in_(ids)))
+
+
+def run_retention(retention_days, rollup_retention_days, now=None):
+    '''Aplica la retención a todas las tablas de historial y guarda el reporte
+
+    Los periodos de estado alimentan las caídas y el MTTR de /slaReport, que
+    toma la disponibilidad de los acumulados: se conservan al menos tanto
+    como los acumulados por hora para que el reporte no pierda las caídas.
+    '''
+    global last_report
+
+    now = now or datetime.now()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = midnight - timedelta(days=retention_days)
+    rollup_cutoff = midnight - timedelta(days=rollup_retention_days)
+    period_cutoff = min(cutoff, rollup_cutoff)
+    archive_dir = config['History_Archive_Path']
+    stamp = now.strftime('%Y%m%d-%H%M%S')
+
+    s = time.perf_counter()
+    tables = {}
+    for name, model, condition, order_by, archived in (
+        ('poll_history', PollHistory, PollHistory.date_created < cutoff, PollHistory.date_created, True),
+        ('host_metrics', HostMetrics, HostMetrics.period_start < cutoff, HostMetrics.period_start, True),
+        # Solo periodos cerrados: el periodo abierto es el estado actual del host
+        ('host_status_periods', HostStatusPeriod, HostStatusPeriod.ended_at < period_cutoff,
+         HostStatusPeriod.ended_at, True),
+        # Los acumulados diarios se conservan; los por hora tienen su propia retención
+        ('host_rollups', HostRollup, (HostRollup.period == 'hour') & (HostRollup.period_start < rollup_cutoff),
+         HostRollup.period_start, False),
+    ):
+        tables[name] = purge(model, condition, order_by, archive_dir if archived else None, stamp)
+
+    last_report = {
+        'started': now.strftime('%Y-%m-%d %H:%M:%S'),
+        'seconds': round(time.perf_counter() - s, 3),
+        'rows': sum(table['rows'] for table in tables.values()),
+        'tables': tables
+    }
+    log.info("Retención: {} filas borradas en {} segundos ({})".format(
+        last_report['rows'], last_report['seconds'],
+        ', '.join(f"{name}: {table['rows']}" for name, table in tables.items())
+    ))
+    return last_report
@@ -0,0 +1,204 @@
+'''Acumulados de disponibilidad por host, por hora y por día'''
+import os
+import sys
+import threading
+from datetime import timedelta
+
+from sqlalchemy import func, and_, or_
+from sqlalchemy.dialects.sqlite import insert
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import db
+from ipmon.database import HostRollup
+from ipmon.writer import db_writer
+
+PERIODS = ('hour', 'day')
+
+
+def period_start(when, period):
+    '''Inicio de la hora o del día que contiene ``when``'''
+    if period == 'day':
+        return when.replace(hour=0, minute=0, second=0, microsecond=0)
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+class RollupBuffer():
+    '''Acumula en memoria los sondeos aún no guardados, por host, periodo e inicio.
+
+    Cada entrada es [sondeos Up, sondeos Down, RTT medidos, suma, mínimo,
+    máximo]; el guardado las suma a la fila existente con un upsert.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # (host_id, periodo, inicio) -> acumulado
+
+    def add(self, host_id, is_up, rtt, when):
+        '''Agrega un sondeo; ``rtt`` es None si no hubo respuesta o no se sondeó'''
+        with self._lock:
+            for period in PERIODS:
+                key = (host_id, period, period_start(when, period))
+                entry = self._pending.get(key)
+                if entry is None:
+                    entry = self._pending[key] = [0, 0, 0, 0.0, None, None]
+                entry[0 if is_up else 1] += 1
+                if rtt is not None:
+                    entry[2] += 1
+                    entry[3] += rtt
+                    entry[4] = rtt if entry[4] is None else min(entry[4], rtt)
+                    entry[5] = rtt if entry[5] is None else max(entry[5], rtt)
+
+    def drain(self):
+        '''Devuelve y vacía los acumulados pendientes'''
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def forget(self, host_ids):
+        '''Descarta los acumulados pendientes de hosts borrados'''
+        host_ids = set(host_ids)
+        with self._lock:
+            self._pending = {key: entry for key, entry in self._pending.items() if key[0] not in host_ids}
+
+    def pending(self, host_ids, period):
+        '''Devuelve {(host_id, inicio): acumulado} pendientes de ``host_ids`` (None = todos)'''
+        with self._lock:
+            return {(host_id, start): list(entry)
+                    for (host_id, entry_period, start), entry in self._pending.items()
+                    if entry_period == period and (host_ids is None or host_id in host_ids)}
+
+
+rollup_buffer = RollupBuffer()
+
+
+def flush_rollups():
+    '''Suma los acumulados pendientes a sus filas; devuelve las filas escritas'''
+    pending = rollup_buffer.drain()
+    if not pending:
+        return 0
+
+    db_writer.run(_write_rollups, pending)
+    return len(pending)
+
+
+def _write_rollups(pending):
+    table = HostRollup.__table__
+    stmt = insert(table)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.host_id, table.c.period, table.c.period_start],
+        set_={
+            'up_count': table.c.up_count + excluded.up_count,
+            'down_count': table.c.down_count + excluded.down_count,
+            'rtt_count': table.c.rtt_count + excluded.rtt_count,
+            'rtt_sum': table.c.rtt_sum + excluded.rtt_sum,
+            # min()/max() escalares de SQLite devuelven NULL si algún argumento es NULL
+            'rtt_min': func.min(func.coalesce(table.c.rtt_min, excluded.rtt_min),
+                                func.coalesce(excluded.rtt_min, table.c.rtt_min)),
+            'rtt_max': func.max(func.coalesce(table.c.rtt_max, excluded.rtt_max),
+                                func.coalesce(excluded.rtt_max, table.c.rtt_max))
+        }
+    )
+    db.session.execute(stmt, [
+        {'host_id': host_id, 'period': period, 'period_start': start,
+         'up_count': up, 'down_count': down, 'rtt_count': rtt_count,
+         'rtt_sum': rtt_sum, 'rtt_min': rtt_min, 'rtt_max': rtt_max}
+        for (host_id, period, start), (up, down, rtt_count, rtt_sum, rtt_min, rtt_max) in pending.items()
+    ])
+
+
+def _merge(rows, pending):
+    '''Combina las filas guardadas con los acumulados pendientes por (host_id, inicio)'''
+    merged = {(row.host_id, row.period_start): [row.up_count, row.down_count, row.rtt_count,
+                                                row.rtt_sum, row.rtt_min, row.rtt_max] for row in rows}
+    for key, (up, down, rtt_count, rtt_sum, rtt_min, rtt_max) in pending.items():
+        entry = merged.get(key)
+        if entry is None:
+            merged[key] = [up, down, rtt_count, rtt_sum, rtt_min, rtt_max]
+            continue
+        entry[0] += up
+        entry[1] += down
+        entry[2] += rtt_count
+        entry[3] += rtt_sum
+        entry[4] = min(v for v in (entry[4], rtt_min) if v is not None) if rtt_count else entry[4]
+        entry[5] = max(v for v in (entry[5], rtt_max) if v is not None) if rtt_count else entry[5]
+    return merged
+
+
+def read_rollups(host_ids, start, end, period='hour'):
+    '''Acumulados de ``host_ids`` (None = todos) en [start, end), incluidos los pendientes
+
+    Devuelve {(host_id, inicio del periodo): [up, down, rtt medidos, suma, mínimo, máximo]}.
+    '''
+    query = db.session.query(
+        HostRollup.host_id, HostRollup.period_start, HostRollup.up_count, HostRollup.down_count,
+        HostRollup.rtt_count, HostRollup.rtt_sum, HostRollup.rtt_min, HostRollup.rtt_max
+    ).filter(
+        HostRollup.period == period,
+        HostRollup.period_start >= period_start(start, period),
+        HostRollup.period_start < end
+    )
+    if host_ids is not None:
+        query = query.filter(HostRollup.host_id.in_(host_ids))
+
+    pending = {key: entry for key, entry in rollup_buffer.pending(
+        set(host_ids) if host_ids is not None else None, period).items()
+        if period_start(start, period) <= key[1] < end}
+    return _merge(query.all(), pending)
+
+
+def availability_series(host_id, start, end, period='hour'):
+    '''Serie de disponibilidad de un host, ordenada por periodo'''
+    series = []
+    for (dummy, started), (up, down, rtt_count, rtt_sum, rtt_min, rtt_max) in sorted(
+            read_rollups([host_id], start, end, period).items(), key=lambda item: item[0][1]):
+        total = up + down
+        series.append({
+            'period_start': started.strftime('%Y-%m-%d %H:%M:%S'),
+            'up': up,
+            'down': down,
+            'availability': round(up / total * 100, 3) if total else None,
+            'avg_rtt': round(rtt_sum / rtt_count, 3) if rtt_count else None,
+            'min_rtt': round(rtt_min, 3) if rtt_min is not None else None,
+            'max_rtt': round(rtt_max, 3) if rtt_max is not None else None
+        })
+    return series
+
+
+def _ranges(start, end):
+    '''Divide [start, end) en días completos (acumulados diarios) y bordes por hora'''
+    first_day = period_start(start, 'day')
+    if first_day < start:
+        first_day += timedelta(days=1)
+    last_day = period_start(end, 'day')
+    if first_day >= last_day:
+        return [('hour', period_start(start, 'hour'), end)]
+    return [('hour', period_start(start, 'hour'), first_day), ('day', first_day, last_day), ('hour', last_day, end)]
+
+
+def host_totals(start, end, host_ids=None):
+    '''Sondeos Up y Down por host en [start, end), incluidos los pendientes
+
+    Usa los acumulados diarios para los días completos y los horarios para
+    los bordes, así una ventana de 30 días lee ~30 filas por host.
+    Devuelve {host_id: [up, down]}.
+    '''
+    ranges = [r for r in _ranges(start, end) if r[1] < r[2]]
+    query = db.session.query(
+        HostRollup.host_id, func.sum(HostRollup.up_count), func.sum(HostRollup.down_count)
+    ).filter(or_(*(
+        and_(HostRollup.period == period, HostRollup.period_start >= low, HostRollup.period_start < high)
+        for period, low, high in ranges
+    )))
+    if host_ids is not None:
+        query = query.filter(HostRollup.host_id.in_(host_ids))
+    totals = {host_id: [up or 0, down or 0] for host_id, up, down in query.group_by(HostRollup.host_id)}
+
+    wanted = set(host_ids) if host_ids is not None else None
+    for period, low, high in ranges:
+        for (host_id, started), entry in rollup_buffer.pending(wanted, period).items():
+            if low <= started < high:
+                total = totals.setdefault(host_id, [0, 0])
+                total[0] += entry[0]
+                total[1] += entry[1]
+    return totals
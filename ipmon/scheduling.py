@@ -0,0 +1,104 @@
+'''Planificador de sondeo por host con intervalos adaptativos'''
+import heapq
+import threading
+
+
+class AdaptiveScheduler():
+    '''Heap de hosts ordenado por el instante de su próximo sondeo.
+
+    Cada host tiene su propio vencimiento; el job 'Poll Hosts' solo saca los
+    que ya vencieron y, al recibir el resultado, los vuelve a programar con
+    el intervalo que corresponda a su estado.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap = []         # (vencimiento, host_id), con entradas obsoletas perezosas
+        self._due = {}          # host_id -> vencimiento vigente
+        self._addresses = {}    # host_id -> ip_address
+        self._in_flight = set()
+
+    def sync(self, hosts, now):
+        '''Sincroniza con el inventario [(host_id, ip_address)]; los hosts nuevos vencen de inmediato'''
+        with self._lock:
+            current = dict(hosts)
+            for host_id in self._addresses.keys() - current.keys():
+                self._due.pop(host_id, None)
+                self._in_flight.discard(host_id)
+            for host_id in current.keys() - self._addresses.keys():
+                self._push(host_id, now)
+            self._addresses = current
+
+    def pop_due(self, now, limit=None, urgent=None):
+        '''Devuelve [(host_id, ip_address)] vencidos y los marca en vuelo
+
+        Con ``limit`` solo saca esa cantidad: primero los hosts para los que
+        ``urgent(host_id)`` es verdadero y luego los que más tiempo llevan
+        vencidos. Los demás siguen vencidos con su vencimiento original.
+        '''
+        due_hosts = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, host_id = heapq.heappop(self._heap)
+                if self._due.get(host_id) != due:
+                    continue
+                del self._due[host_id]
+                due_hosts.append((due, host_id))
+
+            if limit is not None and len(due_hosts) > limit:
+                if urgent is not None:
+                    # sort estable: dentro de cada grupo se mantiene el orden de vencimiento
+                    due_hosts.sort(key=lambda entry: not urgent(entry[1]))
+                for due, host_id in due_hosts[limit:]:
+                    self._push(host_id, due)
+                due_hosts = due_hosts[:limit]
+
+            targets = []
+            for due, host_id in due_hosts:
+                self._in_flight.add(host_id)
+                targets.append((host_id, self._addresses[host_id]))
+        return targets
+
+    def overdue(self, now):
+        '''Número de hosts vencidos que esperan sondeo'''
+        with self._lock:
+            return sum(1 for due in self._due.values() if due <= now)
+
+    def schedule(self, host_id, due):
+        '''Programa el próximo sondeo de un host'''
+        with self._lock:
+            if host_id not in self._addresses:
+                return
+            self._in_flight.discard(host_id)
+            self._push(host_id, due)
+
+    def release(self, due):
+        '''Reprograma los hosts que quedaron en vuelo sin resultado'''
+        with self._lock:
+            for host_id in self._in_flight:
+                self._push(host_id, due)
+            self._in_flight.clear()
+
+    def reset(self):
+        '''Olvida todos los vencimientos; en la próxima sincronización todo vence de inmediato'''
+        with self._lock:
+            self._heap = []
+            self._due = {}
+            self._addresses = {}
+            self._in_flight = set()
+
+    def __len__(self):
+        return len(self._addresses)
+
+    def _push(self, host_id, due):
+        self._due[host_id] = due
+        heapq.heappush(self._heap, (due, host_id))
+
+        # Compactar cuando las entradas obsoletas dominan el heap
+        if len(self._heap) > 2 * len(self._due) + 1024:
+            self._heap = [(d, h) for h, d in self._due.items()]
+            heapq.heapify(self._heap)
+
+
+# Próximo sondeo por host, residente en memoria
+host_scheduler = AdaptiveScheduler()
@@ -1,5 +1,6 @@
 '''Esquemas utilizados para APIs'''
 from marshmallow import Schema, fields, pre_dump
+from ipmon.database import TIME_FORMAT
 
 class UsersSchema(Schema):
     '''Esquema de usuarios'''
@@ -15,13 +16,15 @@ class HostsSchema(Schema):
     id = fields.Int(dump_only=True)
     ip_address = fields.Str(required=True)
     hostname = fields.Str()
+    hostname_auto = fields.Bool(dump_only=True)
     ciudad = fields.Str()
     cto = fields.Str()
     dispositivo = fields.Str()
+    parent_id = fields.Int(allow_none=True)
     tipo = fields.Str()
     snapshot_url = fields.Url(allow_none=True)
     status = fields.Str(dump_only=True)
-    last_poll = fields.Str(dump_only=True)
+    last_poll = fields.DateTime(format=TIME_FORMAT, dump_only=True)
     status_change_alert = fields.Bool(load_default=False)  
     previous_status = fields.Str(dump_only=True)
     alerts_enabled = fields.Bool(load_default=True)  
@@ -31,7 +34,7 @@ class PollHistorySchema(Schema):
     '''Esquema del historial de sondeos'''
     id = fields.Int(dump_only=True)
     host_id = fields.Int(required=True)
-    poll_time = fields.Str(required=True)
+    poll_time = fields.DateTime(format=TIME_FORMAT, required=True)
     poll_status = fields.Str(required=True)
     date_created = fields.DateTime(dump_only=True)
 
@@ -41,7 +44,7 @@ class HostAlertsSchema(Schema):
     hostname = fields.Str(required=True)
     ip_address = fields.Str(required=True)
     host_status = fields.Str(required=True)
-    poll_time = fields.Str(required=True)
+    poll_time = fields.DateTime(format=TIME_FORMAT, required=True)
     alert_cleared = fields.Bool(load_default=False)  # ← Cambiado
     date_created = fields.DateTime(dump_only=True)
     host_id = fields.Int(required=True)
@@ -51,6 +54,14 @@ class PollingConfigSchema(Schema):
     id = fields.Int(dump_only=True)
     poll_interval = fields.Int(required=True)
     history_truncate_days = fields.Int(required=True)
+    max_concurrency = fields.Int(load_default=50)
+    packets_per_second = fields.Int(load_default=0)
+    subnet_packet_limits = fields.Str(load_default='')
+    min_poll_interval = fields.Int(load_default=10)
+    max_poll_interval = fields.Int(load_default=180)
+    history_mode = fields.Str(load_default='full')
+    heartbeat_interval = fields.Int(load_default=300)
+    rollup_retention_days = fields.Int(load_default=90)
 
 class SmtpConfigSchema(Schema):
     '''Esquema SMTP'''
@@ -45,10 +45,7 @@ def setup():
 
         # Crear base de datos
         database_file = app.config['SQLALCHEMY_DATABASE_URI']
-        database_directory = os.path.join(
-            os.path.dirname(os.path.realpath(__file__)),
-            'database'
-        )
+        database_directory = os.path.dirname(config['Database_Path'])
         if not os.path.exists(database_directory):
             os.makedirs(database_directory)
         engine = create_engine(database_file, echo=True)
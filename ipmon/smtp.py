@@ -14,6 +14,7 @@ from ipmon.database import SmtpServer
 from ipmon.api import get_smtp_configured, get_smtp_config
 from ipmon.forms import SmtpConfigForm
 from ipmon.helpers import procesar_imagen_para_email
+from ipmon.metrics import ALERT_DELIVERY_SECONDS, ALERT_DELIVERY_FAILURES
 from email.mime.image import MIMEImage
 from email.mime.multipart import MIMEMultipart
 
@@ -183,7 +184,8 @@ def send_smtp_message(recipients, subject, message, images=None):
 
     # Envío
     try:
-        with smtplib.SMTP(smtp_conf["smtp_server"], int(smtp_conf["smtp_port"]), timeout=10) as server:
+        with ALERT_DELIVERY_SECONDS.time(channel='smtp'), \
+                smtplib.SMTP(smtp_conf["smtp_server"], int(smtp_conf["smtp_port"]), timeout=10) as server:
             server.ehlo()
             server.starttls()
             server.ehlo()
@@ -197,6 +199,7 @@ def send_smtp_message(recipients, subject, message, images=None):
             server.sendmail(msg["From"], recipients, msg.as_string())
             log.info(f"Correo SMTP enviado correctamente a {recipients}")
     except Exception as e:
+        ALERT_DELIVERY_FAILURES.inc(channel='smtp')
         log.error(f"Error al enviar correo SMTP: {e}")
         print(f"[SMTP] ❌ Error durante el envío: {e}")
         raise
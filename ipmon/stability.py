@@ -0,0 +1,109 @@
+'''Seguimiento en memoria de la estabilidad del estado de los hosts'''
+import os
+import sys
+import threading
+
+from sqlalchemy import func
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import db, log
+from ipmon.database import PollHistory, HostStatusPeriod, Polling
+
+
+class StabilityTracker():
+    '''Cuenta los ciclos consecutivos con el mismo estado para cada host.
+
+    Se reconstruye una sola vez desde ``poll_history`` y a partir de ahí
+    decide en O(1) por host, sin consultar el historial en cada ciclo.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}  # clave: host_id, valor: [estado, ciclos consecutivos]
+        self._loaded = False
+
+    def observe(self, host_id, status, window):
+        '''Registra el estado sondeado y devuelve los ciclos consecutivos en ese estado'''
+        with self._lock:
+            if not self._loaded:
+                self._rebuild(window)
+
+            state = self._states.get(host_id)
+            if state is not None and state[0] == status:
+                state[1] += 1
+            else:
+                state = self._states[host_id] = [status, 1]
+            return state[1]
+
+    def is_pending(self, host_id, window):
+        '''Indica si el host aún no confirmó su estado actual (nuevo o con cambio reciente)'''
+        with self._lock:
+            state = self._states.get(host_id)
+            return state is None or state[1] < window
+
+    def forget(self, host_id):
+        '''Elimina el estado de un host borrado'''
+        with self._lock:
+            self._states.pop(host_id, None)
+
+    def invalidate(self):
+        '''Fuerza la reconstrucción desde la base de datos en el próximo ciclo'''
+        with self._lock:
+            self._loaded = False
+
+    def _rebuild(self, window):
+        '''Carga los últimos ``window`` estados de cada host con una sola consulta'''
+        if db.session.query(Polling.history_mode).filter_by(id=1).scalar() == 'transitions':
+            return self._rebuild_from_periods(window)
+
+        ranked = db.session.query(
+            PollHistory.host_id,
+            PollHistory.poll_status,
+            func.row_number().over(
+                partition_by=PollHistory.host_id,
+                order_by=PollHistory.date_created.desc()
+            ).label('rn')
+        ).subquery()
+
+        rows = db.session.query(ranked.c.host_id, ranked.c.poll_status) \
+            .filter(ranked.c.rn <= window) \
+            .order_by(ranked.c.host_id, ranked.c.rn).all()
+
+        # Las filas llegan de la más reciente a la más antigua por host; se
+        # cuenta hasta encontrar el primer estado distinto.
+        states, broken = {}, set()
+        for host_id, status in rows:
+            state = states.get(host_id)
+            if state is None:
+                states[host_id] = [status, 1]
+            elif host_id not in broken and state[0] == status:
+                state[1] += 1
+            else:
+                broken.add(host_id)
+
+        self._states = states
+        self._loaded = True
+        log.info(f"Estado de estabilidad reconstruido para {len(states)} hosts")
+
+    def _rebuild_from_periods(self, window):
+        '''Reconstruye desde los periodos abiertos (modo solo transiciones)
+
+        Sin una fila por sondeo no se conocen los ciclos exactos: un periodo
+        con latidos posteriores a su inicio se considera confirmado y uno
+        recién abierto, pendiente.
+        '''
+        rows = db.session.query(
+            HostStatusPeriod.host_id, HostStatusPeriod.status,
+            HostStatusPeriod.started_at, HostStatusPeriod.last_seen
+        ).filter(HostStatusPeriod.ended_at.is_(None)).all()
+
+        self._states = {
+            host_id: [status, window if last_seen > started_at else 1]
+            for host_id, status, started_at, last_seen in rows
+        }
+        self._loaded = True
+        log.info(f"Estado de estabilidad reconstruido desde periodos para {len(self._states)} hosts")
+
+
+# Ciclos consecutivos por host, residente en memoria
+stability_tracker = StabilityTracker()
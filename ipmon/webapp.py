@@ -0,0 +1,119 @@
+'''Aplicación web: Flask, base de datos, scheduler, blueprints y arranque de los jobs'''
+import os
+import sys
+import time
+import uuid
+import sqlite3
+import threading
+import flask_login
+
+from flask_sqlalchemy import SQLAlchemy
+from flask import Flask
+from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from apscheduler.schedulers.background import BackgroundScheduler
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import config, log
+
+# Aplicación web
+app = Flask('ipmon')
+app.secret_key = str(uuid.UUID(int=uuid.getnode()))
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///{}'.format(config['Database_Path'])
+
+# BASE DATOS
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    '''Aplica config['SQLite_Pragmas'] a cada conexión nueva'''
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, value in config['SQLite_Pragmas'].items():
+        cursor.execute(f'PRAGMA {pragma}={value}')
+    cursor.close()
+
+
+db = SQLAlchemy()
+db.init_app(app)
+
+# Migración de base de datos
+migrate = Migrate(app, db)
+
+# Scheduler
+scheduler = BackgroundScheduler()
+
+# Administrador de autenticación
+login_manager = flask_login.LoginManager()
+login_manager.init_app(app)
+
+
+def start_webapp():
+    '''Registra los blueprints, prepara los jobs e inicia el scheduler en segundo plano'''
+    # Registrar Blueprints
+    from ipmon.main import main as main_blueprint
+    from ipmon.auth import auth as auth_blueprint
+    from ipmon.smtp import smtp as smtp_blueprint
+    from ipmon.api import api as api_blueprint
+    from ipmon.hosts import hosts as hosts_blueprint
+    from ipmon.setup import bp as setup_blueprint
+    from ipmon.telegramconf import bp as telegramconf_blueprint
+    from ipmon.imagenes import imagenes_blueprint
+
+    app.register_blueprint(main_blueprint)
+    app.register_blueprint(auth_blueprint)
+    app.register_blueprint(smtp_blueprint)
+    app.register_blueprint(api_blueprint)
+    app.register_blueprint(hosts_blueprint)
+    app.register_blueprint(setup_blueprint)
+    app.register_blueprint(telegramconf_blueprint)
+    app.register_blueprint(imagenes_blueprint)
+
+    from ipmon.main import webapp_init
+    with app.app_context():
+        webapp_init()
+
+    # Ejecutar en un hilo para no bloquear el arranque de Flask
+    threading.Thread(target=esperar_bd_y_iniciar_scheduler, daemon=True).start()
+
+
+def esperar_bd_y_iniciar_scheduler():
+    """Espera a que la BD esté creada antes de iniciar el scheduler"""
+    from ipmon import imagenes
+    from ipmon.main import init_pending_schedulers, running_db_command
+
+    # 'flask db upgrade' solo migra: no hay jobs que iniciar
+    if running_db_command():
+        return
+
+    db_path = config['Database_Path']
+
+    # Esperar hasta que exista el archivo físico de la base
+    while not os.path.exists(db_path):
+        log.warning(f"Esperando que se cree la base de datos: {db_path}")
+        time.sleep(2)
+
+    # Si el esquema estaba desactualizado al arrancar, esperar a que se migre
+    init_pending_schedulers()
+
+    # Opcional: esperar hasta que las tablas estén listas
+    try:
+        from ipmon.database import Hosts  # o cualquier tabla conocida
+        with app.app_context():
+            # Ejecuta una consulta mínima para probar la conexión
+            Hosts.query.first()
+        log.info("Base de datos lista. Iniciando scheduler...")
+    except Exception as e:
+        log.error(f"La base existe pero no está inicializada: {e}")
+        return
+
+    # Ahora sí iniciar el scheduler
+    try:
+        from ipmon.imagenes import init_scheduler
+        init_scheduler()
+        scheduler.start()
+        imagenes.init_scheduler()
+        log.info("Scheduler inicializado correctamente después de crear la BD.")
+    except Exception as e:
+        log.error(f"Error al iniciar scheduler: {e}")
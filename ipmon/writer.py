@@ -0,0 +1,95 @@
+'''Hilo único de escritura en SQLite con commit agrupado'''
+import os
+import sys
+import queue
+import threading
+from concurrent.futures import Future
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from ipmon import app, db, log
+from ipmon.metrics import DB_COMMIT_SECONDS, DB_WRITER_QUEUE_DEPTH, DB_WRITER_GROUP_JOBS
+
+
+class DatabaseWriter():
+    '''Ejecuta en un solo hilo las escrituras de los procesos en segundo plano.
+
+    Cada trabajo es una función que escribe con ``db.session`` sin hacer
+    commit. El hilo toma todos los trabajos encolados (hasta ``max_group``),
+    los ejecuta en orden y confirma el grupo con un único commit, así las
+    escrituras de sondeo, alertas, métricas y retención no compiten por el
+    lock de SQLite. Si el grupo falla se deshace y cada trabajo se reintenta
+    con su propio commit, para que el error quede solo en el que lo causó;
+    por eso los trabajos deben limitarse a escribir en la base.
+    '''
+
+    def __init__(self, max_group=64):
+        self.max_group = max_group
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, func, *args, **kwargs):
+        '''Encola un trabajo; devuelve un Future con su resultado tras el commit'''
+        future = Future()
+        if threading.current_thread() is self._thread:
+            # Un trabajo que encola otro: se ejecuta dentro del mismo grupo
+            future.set_result(func(*args, **kwargs))
+            return future
+
+        self._ensure_started()
+        self._queue.put((func, args, kwargs, future))
+        DB_WRITER_QUEUE_DEPTH.set(self._queue.qsize())
+        return future
+
+    def run(self, func, *args, **kwargs):
+        '''Ejecuta un trabajo en el hilo escritor y espera su commit'''
+        return self.submit(func, *args, **kwargs).result()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        with app.app_context():
+            while True:
+                group = [self._queue.get()]
+                while len(group) < self.max_group:
+                    try:
+                        group.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                DB_WRITER_QUEUE_DEPTH.set(self._queue.qsize())
+                DB_WRITER_GROUP_JOBS.observe(len(group))
+                self._commit_group(group)
+
+    def _commit_group(self, group):
+        group = [job for job in group if job[3].set_running_or_notify_cancel()]
+        results = []
+        try:
+            for func, args, kwargs, dummy in group:
+                results.append(func(*args, **kwargs))
+            with DB_COMMIT_SECONDS.time(operation='writer'):
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(group) > 1:
+                log.warning(f"Falló el commit agrupado de {len(group)} escrituras, se reintentan por separado: {e}")
+            for func, args, kwargs, future in group:
+                try:
+                    result = func(*args, **kwargs)
+                    db.session.commit()
+                except Exception as exc:
+                    db.session.rollback()
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+            return
+
+        for (dummy, dummy, dummy, future), result in zip(group, results):
+            future.set_result(result)
+
+
+# Escritor compartido por los jobs en segundo plano
+db_writer = DatabaseWriter()
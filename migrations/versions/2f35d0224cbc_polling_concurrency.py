@@ -0,0 +1,28 @@
+"""polling concurrency and packets per second
+
+Revision ID: 2f35d0224cbc
+Revises: b47144cc888e
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f35d0224cbc'
+down_revision = 'b47144cc888e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('polling') as batch_op:
+        batch_op.add_column(sa.Column('max_concurrency', sa.Integer(), nullable=False, server_default='50'))
+        batch_op.add_column(sa.Column('packets_per_second', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('polling') as batch_op:
+        batch_op.drop_column('packets_per_second')
+        batch_op.drop_column('max_concurrency')
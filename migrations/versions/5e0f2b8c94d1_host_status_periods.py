@@ -0,0 +1,71 @@
+"""transition-only status history and compaction of poll_history
+
+Revision ID: 5e0f2b8c94d1
+Revises: c3d91e0b7a42
+Create Date: 2026-10-18 11:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0f2b8c94d1'
+down_revision = 'c3d91e0b7a42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'host_status_periods',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('host_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('ended_at', sa.DateTime(), nullable=True),
+        sa.Column('last_seen', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['host_id'], ['hosts.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_host_status_periods_host_started', 'host_status_periods', ['host_id', 'started_at'])
+
+    with op.batch_alter_table('polling') as batch_op:
+        batch_op.add_column(sa.Column('history_mode', sa.String(length=20), nullable=False, server_default='full'))
+        batch_op.add_column(sa.Column('heartbeat_interval', sa.Integer(), nullable=False, server_default='300'))
+
+    # Compactar el historial existente: cada racha de sondeos con el mismo
+    # estado (detectada con LAG) se convierte en un periodo; el fin de un
+    # periodo es el inicio del siguiente (LEAD) y el último queda abierto.
+    op.execute("""
+        INSERT INTO host_status_periods (host_id, status, started_at, ended_at, last_seen)
+        SELECT host_id, poll_status, started_at,
+               LEAD(started_at) OVER (PARTITION BY host_id ORDER BY started_at),
+               last_seen
+        FROM (
+            SELECT host_id, poll_status, MIN(date_created) AS started_at, MAX(date_created) AS last_seen
+            FROM (
+                SELECT host_id, poll_status, date_created,
+                       SUM(changed) OVER (PARTITION BY host_id ORDER BY date_created, id
+                                          ROWS UNBOUNDED PRECEDING) AS run
+                FROM (
+                    SELECT id, host_id, poll_status, date_created,
+                           CASE WHEN LAG(poll_status) OVER (PARTITION BY host_id ORDER BY date_created, id)
+                                     = poll_status THEN 0 ELSE 1 END AS changed
+                    FROM poll_history
+                    WHERE host_id IS NOT NULL AND date_created IS NOT NULL
+                      AND host_id IN (SELECT id FROM hosts)
+                )
+            )
+            GROUP BY host_id, run, poll_status
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('polling') as batch_op:
+        batch_op.drop_column('heartbeat_interval')
+        batch_op.drop_column('history_mode')
+
+    op.drop_index('ix_host_status_periods_host_started', table_name='host_status_periods')
+    op.drop_table('host_status_periods')
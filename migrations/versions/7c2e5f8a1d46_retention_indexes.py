@@ -0,0 +1,27 @@
+"""indexes backing chunked history retention
+
+Revision ID: 7c2e5f8a1d46
+Revises: e4a7c9d2b815
+Create Date: 2026-10-18 15:30:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e5f8a1d46'
+down_revision = 'e4a7c9d2b815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_poll_history_date_created', 'poll_history', ['date_created'])
+    op.create_index('ix_host_metrics_period_start', 'host_metrics', ['period_start'])
+    op.create_index('ix_host_status_periods_ended_at', 'host_status_periods', ['ended_at'])
+
+
+def downgrade():
+    op.drop_index('ix_host_status_periods_ended_at', table_name='host_status_periods')
+    op.drop_index('ix_host_metrics_period_start', table_name='host_metrics')
+    op.drop_index('ix_poll_history_date_created', table_name='poll_history')
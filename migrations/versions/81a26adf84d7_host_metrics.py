@@ -0,0 +1,33 @@
+"""host latency metrics packed per host and hour
+
+Revision ID: 81a26adf84d7
+Revises: aa15ed6fe47c
+Create Date: 2026-10-18 10:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '81a26adf84d7'
+down_revision = 'aa15ed6fe47c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'host_metrics',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('host_id', sa.Integer(), nullable=False),
+        sa.Column('period_start', sa.DateTime(), nullable=False),
+        sa.Column('samples', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['host_id'], ['hosts.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('host_id', 'period_start')
+    )
+
+
+def downgrade():
+    op.drop_table('host_metrics')
@@ -0,0 +1,58 @@
+"""hourly and daily availability rollups per host
+
+Revision ID: 9b6d4a1f3c27
+Revises: 5e0f2b8c94d1
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b6d4a1f3c27'
+down_revision = '5e0f2b8c94d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'host_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('host_id', sa.Integer(), nullable=False),
+        sa.Column('period', sa.String(length=5), nullable=False),
+        sa.Column('period_start', sa.DateTime(), nullable=False),
+        sa.Column('up_count', sa.Integer(), nullable=False),
+        sa.Column('down_count', sa.Integer(), nullable=False),
+        sa.Column('rtt_count', sa.Integer(), nullable=False),
+        sa.Column('rtt_sum', sa.Float(), nullable=False),
+        sa.Column('rtt_min', sa.Float(), nullable=True),
+        sa.Column('rtt_max', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['host_id'], ['hosts.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('host_id', 'period', 'period_start')
+    )
+
+    with op.batch_alter_table('polling') as batch_op:
+        batch_op.add_column(sa.Column('rollup_retention_days', sa.Integer(), nullable=False, server_default='90'))
+
+    # Acumular el historial existente (sin RTT: poll_history no lo guarda). El
+    # inicio se escribe en el formato DateTime de SQLAlchemy, con microsegundos,
+    # para que coincida con los inicios que enlaza el guardado en vivo
+    for period, fmt in (('hour', '%Y-%m-%d %H:00:00'), ('day', '%Y-%m-%d 00:00:00')):
+        op.execute(f"""
+            INSERT INTO host_rollups (host_id, period, period_start, up_count, down_count, rtt_count, rtt_sum)
+            SELECT host_id, '{period}', strftime('{fmt}', date_created) || '.000000',
+                   SUM(poll_status = 'Up'), SUM(poll_status != 'Up'), 0, 0.0
+            FROM poll_history
+            WHERE host_id IN (SELECT id FROM hosts) AND date_created IS NOT NULL
+            GROUP BY host_id, strftime('{fmt}', date_created)
+        """)
+
+
+def downgrade():
+    with op.batch_alter_table('polling') as batch_op:
+        batch_op.drop_column('rollup_retention_days')
+
+    op.drop_table('host_rollups')
@@ -0,0 +1,29 @@
+"""flag hosts whose hostname comes from reverse DNS
+
+Revision ID: a3f6c1e8b742
+Revises: d81f3a6b2c59
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f6c1e8b742'
+down_revision = 'd81f3a6b2c59'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('hosts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('hostname_auto', sa.Boolean(), nullable=True))
+
+    # Los hosts cuyo nombre es su IP (alta sin nombre ni PTR) pasan a resolverse automáticamente
+    op.execute("UPDATE hosts SET hostname_auto = (hostname IS NULL OR hostname = '' OR hostname = ip_address)")
+
+
+def downgrade():
+    with op.batch_alter_table('hosts', schema=None) as batch_op:
+        batch_op.drop_column('hostname_auto')
@@ -0,0 +1,28 @@
+"""adaptive per-host poll interval bounds
+
+Revision ID: aa15ed6fe47c
+Revises: 2f35d0224cbc
+Create Date: 2026-10-18 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'aa15ed6fe47c'
+down_revision = '2f35d0224cbc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('polling') as batch_op:
+        batch_op.add_column(sa.Column('min_poll_interval', sa.Integer(), nullable=False, server_default='10'))
+        batch_op.add_column(sa.Column('max_poll_interval', sa.Integer(), nullable=False, server_default='180'))
+
+
+def downgrade():
+    with op.batch_alter_table('polling') as batch_op:
+        batch_op.drop_column('max_poll_interval')
+        batch_op.drop_column('min_poll_interval')
@@ -0,0 +1,30 @@
+"""indexes for server-side host tables (filters and default order)
+
+Revision ID: b5e2d7a9c614
+Revises: f2b8d4c6e913
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e2d7a9c614'
+down_revision = 'f2b8d4c6e913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_hosts_hostname', 'hosts', ['hostname'])
+    op.create_index('ix_hosts_ciudad', 'hosts', [sa.text('ciudad COLLATE NOCASE')])
+    op.create_index('ix_hosts_cto', 'hosts', [sa.text('cto COLLATE NOCASE')])
+    op.create_index('ix_hosts_tipo', 'hosts', [sa.text('tipo COLLATE NOCASE')])
+
+
+def downgrade():
+    op.drop_index('ix_hosts_tipo', table_name='hosts')
+    op.drop_index('ix_hosts_cto', table_name='hosts')
+    op.drop_index('ix_hosts_ciudad', table_name='hosts')
+    op.drop_index('ix_hosts_hostname', table_name='hosts')
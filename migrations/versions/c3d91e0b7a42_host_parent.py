@@ -0,0 +1,28 @@
+"""explicit parent host for dependency-aware polling
+
+Revision ID: c3d91e0b7a42
+Revises: 81a26adf84d7
+Create Date: 2026-10-18 11:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d91e0b7a42'
+down_revision = '81a26adf84d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('hosts') as batch_op:
+        batch_op.add_column(sa.Column('parent_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_hosts_parent_id_hosts', 'hosts', ['parent_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('hosts') as batch_op:
+        batch_op.drop_constraint('fk_hosts_parent_id_hosts', type_='foreignkey')
+        batch_op.drop_column('parent_id')
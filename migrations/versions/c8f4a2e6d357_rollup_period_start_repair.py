@@ -0,0 +1,55 @@
+"""normalize backfilled rollup period starts and enforce one row per period value
+
+Revision ID: c8f4a2e6d357
+Revises: b5e2d7a9c614
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f4a2e6d357'
+down_revision = 'b5e2d7a9c614'
+branch_labels = None
+depends_on = None
+
+# Fila cargada por 9b6d4a1f3c27 sin microsegundos con el mismo periodo que la fila de host_rollups
+SHORT_TWIN = """
+    FROM host_rollups AS short
+    WHERE short.host_id = host_rollups.host_id AND short.period = host_rollups.period
+      AND length(short.period_start) = 19 AND short.period_start || '.000000' = host_rollups.period_start
+"""
+
+
+def upgrade():
+    # Sumar a la fila del guardado en vivo la fila cargada sin microsegundos del mismo periodo
+    op.execute(f"""
+        UPDATE host_rollups SET
+            up_count = up_count + (SELECT short.up_count {SHORT_TWIN}),
+            down_count = down_count + (SELECT short.down_count {SHORT_TWIN}),
+            rtt_count = rtt_count + (SELECT short.rtt_count {SHORT_TWIN}),
+            rtt_sum = rtt_sum + (SELECT short.rtt_sum {SHORT_TWIN}),
+            rtt_min = coalesce(min(rtt_min, (SELECT short.rtt_min {SHORT_TWIN})), rtt_min,
+                               (SELECT short.rtt_min {SHORT_TWIN})),
+            rtt_max = coalesce(max(rtt_max, (SELECT short.rtt_max {SHORT_TWIN})), rtt_max,
+                               (SELECT short.rtt_max {SHORT_TWIN}))
+        WHERE EXISTS (SELECT 1 {SHORT_TWIN})
+    """)
+    op.execute("""
+        DELETE FROM host_rollups
+        WHERE length(period_start) = 19 AND EXISTS (
+            SELECT 1 FROM host_rollups AS live
+            WHERE live.host_id = host_rollups.host_id AND live.period = host_rollups.period
+              AND live.period_start = host_rollups.period_start || '.000000')
+    """)
+    op.execute("UPDATE host_rollups SET period_start = period_start || '.000000' WHERE length(period_start) = 19")
+
+    # La restricción única compara texto: este índice compara el instante, sin importar el formato
+    op.create_index('ux_host_rollups_period_value', 'host_rollups',
+                    ['host_id', 'period', sa.text('datetime(period_start)')], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_host_rollups_period_value', table_name='host_rollups')
@@ -0,0 +1,53 @@
+"""compact poll_history rows already covered by status periods and rollups
+
+Revision ID: d1a7c3e5f902
+Revises: c8f4a2e6d357
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1a7c3e5f902'
+down_revision = 'c8f4a2e6d357'
+branch_labels = None
+depends_on = None
+
+# Filas más recientes por host que se conservan siempre (como mínimo)
+RECENT_ROWS_KEPT = 10
+
+
+def upgrade():
+    # 5e0f2b8c94d1 copió el historial a host_status_periods y 9b6d4a1f3c27 a
+    # host_rollups. De cada racha de sondeos con el mismo estado solo hacen
+    # falta la primera y la última fila: el estado en cualquier instante (la
+    # fila más reciente anterior) no cambia. Se conservan además las últimas
+    # filas de cada host para que la estabilidad se reconstruya igual en modo
+    # 'full'.
+    bind = op.get_bind()
+    keep_recent = RECENT_ROWS_KEPT
+    if 'app_config' in sa.inspect(bind).get_table_names():
+        stable_cycles = bind.execute(sa.text('SELECT MAX(stable_cycles) FROM app_config')).scalar()
+        keep_recent = max(keep_recent, stable_cycles or 0)
+
+    bind.execute(sa.text("""
+        DELETE FROM poll_history WHERE id IN (
+            SELECT id FROM (
+                SELECT id, poll_status,
+                       LAG(poll_status) OVER run_order AS previous_status,
+                       LEAD(poll_status) OVER run_order AS next_status,
+                       ROW_NUMBER() OVER (PARTITION BY host_id ORDER BY date_created DESC, id DESC) AS recent
+                FROM poll_history
+                WHERE host_id IS NOT NULL AND date_created IS NOT NULL
+                WINDOW run_order AS (PARTITION BY host_id ORDER BY date_created, id)
+            )
+            WHERE previous_status = poll_status AND next_status = poll_status AND recent > :keep_recent
+        )
+    """), {'keep_recent': keep_recent})
+
+
+def downgrade():
+    # Las filas borradas no se pueden reconstruir: quedan en los periodos y acumulados
+    pass
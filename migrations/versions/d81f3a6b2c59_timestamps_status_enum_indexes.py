@@ -0,0 +1,77 @@
+"""real timestamps for poll_time/last_poll, compact status codes and hot-path indexes
+
+Revision ID: d81f3a6b2c59
+Revises: 7c2e5f8a1d46
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f3a6b2c59'
+down_revision = '7c2e5f8a1d46'
+branch_labels = None
+depends_on = None
+
+# (tabla, columna) convertidas de texto a DateTime y de 'Up'/'Down' a 1/0
+TIMESTAMP_COLUMNS = [('hosts', 'last_poll'), ('poll_history', 'poll_time'), ('host_alerts', 'poll_time')]
+STATUS_COLUMNS = [
+    ('hosts', 'status', True), ('hosts', 'previous_status', True), ('hosts', 'last_alert_status', True),
+    ('poll_history', 'poll_status', True), ('host_alerts', 'host_status', True),
+    ('host_status_periods', 'status', False)
+]
+INDEXES = [
+    ('ix_poll_history_host_date', 'poll_history', ['host_id', 'date_created', 'poll_status']),
+    ('ix_host_alerts_alert_cleared', 'host_alerts', ['alert_cleared']),
+    ('ix_hosts_status', 'hosts', ['status']),
+    ('ix_images_host_id', 'images', ['host_id']),
+]
+
+
+def upgrade():
+    # Una columna nueva por fecha: el cambio de tipo en batch haría CAST(... AS DATETIME),
+    # que en SQLite convierte el texto en número. 'AAAA-MM-DD HH:MM:SS' pasa al formato
+    # DateTime de SQLite; lo que no sea fecha queda NULL
+    for table, column in TIMESTAMP_COLUMNS:
+        op.add_column(table, sa.Column(f'{column}_ts', sa.DateTime(), nullable=True))
+        op.execute(f"""
+            UPDATE {table} SET {column}_ts = CASE
+                WHEN {column} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]:[0-9][0-9]'
+                THEN {column} || '.000000' ELSE NULL END
+        """)
+    for table, column, dummy in STATUS_COLUMNS:
+        op.execute(f"UPDATE {table} SET {column} = CASE {column} WHEN 'Up' THEN 1 WHEN 'Down' THEN 0 ELSE NULL END")
+
+    for table in ('hosts', 'poll_history', 'host_alerts', 'host_status_periods'):
+        with op.batch_alter_table(table) as batch_op:
+            for timestamp_table, column in TIMESTAMP_COLUMNS:
+                if timestamp_table == table:
+                    batch_op.drop_column(column)
+                    batch_op.alter_column(f'{column}_ts', new_column_name=column)
+            for status_table, column, nullable in STATUS_COLUMNS:
+                if status_table == table:
+                    batch_op.alter_column(column, type_=sa.SmallInteger(), existing_nullable=nullable)
+
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, dummy in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+
+    for table in ('hosts', 'poll_history', 'host_alerts', 'host_status_periods'):
+        with op.batch_alter_table(table) as batch_op:
+            for timestamp_table, column in TIMESTAMP_COLUMNS:
+                if timestamp_table == table:
+                    batch_op.alter_column(column, type_=sa.String(length=20), existing_nullable=True)
+            for status_table, column, nullable in STATUS_COLUMNS:
+                if status_table == table:
+                    batch_op.alter_column(column, type_=sa.String(length=20), existing_nullable=nullable)
+
+    for table, column in TIMESTAMP_COLUMNS:
+        op.execute(f"UPDATE {table} SET {column} = substr({column}, 1, 19)")
+    for table, column, dummy in STATUS_COLUMNS:
+        op.execute(f"UPDATE {table} SET {column} = CASE CAST({column} AS INTEGER) WHEN 1 THEN 'Up' WHEN 0 THEN 'Down' ELSE NULL END")
@@ -0,0 +1,23 @@
+"""covering index on host_rollups for fleet-wide SLA reports
+
+Revision ID: e4a7c9d2b815
+Revises: 9b6d4a1f3c27
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c9d2b815'
+down_revision = '9b6d4a1f3c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_host_rollups_period_start', 'host_rollups', ['period', 'period_start', 'host_id', 'up_count', 'down_count'])
+
+
+def downgrade():
+    op.drop_index('ix_host_rollups_period_start', table_name='host_rollups')
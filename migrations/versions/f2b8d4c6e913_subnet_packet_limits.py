@@ -0,0 +1,26 @@
+"""per-subnet packets-per-second limits for probe pacing
+
+Revision ID: f2b8d4c6e913
+Revises: a3f6c1e8b742
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d4c6e913'
+down_revision = 'a3f6c1e8b742'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('polling', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('subnet_packet_limits', sa.String(length=1000), nullable=False, server_default=''))
+
+
+def downgrade():
+    with op.batch_alter_table('polling', schema=None) as batch_op:
+        batch_op.drop_column('subnet_packet_limits')